@@ -0,0 +1,133 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Ad, ArchivedAd, ArchivedProposal, ExchangeProposal
+
+RESOLVED = ('accepted', 'rejected')
+
+
+class ArchiveResult(NamedTuple):
+    proposals: int
+    ads: int
+
+
+def get_options():
+    return {
+        'proposal_days': getattr(settings, 'ADS_ARCHIVE_PROPOSALS_AFTER_DAYS', 90),
+        'ad_days': getattr(settings, 'ADS_ARCHIVE_ADS_AFTER_DAYS', 365),
+        'batch_size': getattr(settings, 'ADS_ARCHIVE_BATCH_SIZE', 1000),
+    }
+
+
+def resolved_proposals(cutoff, using='default'):
+    # resolved_at не раньше created_at: условие на created_at ничего не
+    # отсекает, но позволяет идти по proposal_status_created_idx.
+    return (ExchangeProposal.objects.using(using)
+            .filter(status__in=RESOLVED, created_at__lt=cutoff)
+            .filter(Q(resolved_at__isnull=True) | Q(resolved_at__lt=cutoff)))
+
+
+def inactive_ads(cutoff, using='default'):
+    """Не менялись с cutoff, без ожидающих и без новых предложений."""
+    proposals = ExchangeProposal.objects.using(using)
+    busy = Q(status='waiting') | Q(created_at__gte=cutoff)
+    return (Ad.objects.using(using).filter(updated_at__lt=cutoff)
+            .exclude(Exists(proposals.filter(busy, ad_sender=OuterRef('pk'))))
+            .exclude(Exists(proposals.filter(busy, ad_receiver=OuterRef('pk')))))
+
+
+def move_proposals(queryset, now, counts, using='default'):
+    rows = list(queryset.select_related('ad_sender', 'ad_receiver'))
+    ArchivedProposal.objects.using(using).bulk_create([
+        ArchivedProposal(
+            id=row.pk, ad_sender=row.ad_sender_id, ad_receiver=row.ad_receiver_id,
+            ad_sender_title=row.ad_sender.title,
+            ad_receiver_title=row.ad_receiver.title,
+            sender_user_id=row.ad_sender.user_id,
+            receiver_user_id=row.ad_receiver.user_id,
+            comment=row.comment, status=row.status, created_at=row.created_at,
+            resolved_at=row.resolved_at, archived_at=now)
+        for row in rows
+    ])
+    ExchangeProposal.objects.using(using).filter(
+        pk__in=[row.pk for row in rows]).delete()
+    counts['proposals'] += len(rows)
+
+
+def move_resolved(ids, now, counts, using='default'):
+    move_proposals(ExchangeProposal.objects.using(using).filter(pk__in=ids),
+                   now, counts, using)
+
+
+def move_ads(ids, now, counts, using='default'):
+    """
+    Объявления блокируются, и ожидающие предложения проверяются ещё раз:
+    предложение могло появиться после выборки. Закрытые предложения
+    уходят в архив вместе с объявлением, иначе их удалил бы CASCADE.
+    """
+    ads = list(Ad.objects.using(using).select_for_update()
+               .filter(pk__in=ids).order_by('pk'))
+    waiting = (ExchangeProposal.objects.using(using).filter(status='waiting')
+               .filter(Q(ad_sender__in=ids) | Q(ad_receiver__in=ids))
+               .values_list('ad_sender_id', 'ad_receiver_id'))
+    busy = {pk for pair in waiting for pk in pair}
+    ads = [ad for ad in ads if ad.pk not in busy]
+    if not ads:
+        return
+    ids = [ad.pk for ad in ads]
+    move_proposals(ExchangeProposal.objects.using(using)
+                   .filter(Q(ad_sender__in=ids) | Q(ad_receiver__in=ids)),
+                   now, counts, using)
+    ArchivedAd.objects.using(using).bulk_create([
+        ArchivedAd(
+            id=ad.pk, user_id=ad.user_id, title=ad.title,
+            description=ad.description, image_url=ad.image_url,
+            category=ad.category, condition=ad.condition,
+            created_at=ad.created_at, updated_at=ad.updated_at, archived_at=now)
+        for ad in ads
+    ])
+    # Через ORM, а не сырым DELETE: сигналы уберут объявления из поиска и
+    # фасетов и сменят версии кэша страниц.
+    Ad.objects.using(using).filter(pk__in=ids).delete()
+    counts['ads'] += len(ads)
+
+
+def in_batches(select, move, counts, batch_size, pause, using):
+    """
+    Каждая пачка — отдельная короткая транзакция: блокировки держатся не
+    дольше одной пачки, а между пачками успевают пройти обычные записи.
+    """
+    while True:
+        with transaction.atomic(using=using):
+            ids = list(select().order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            move(ids, timezone.now(), counts, using)
+        if pause:
+            time.sleep(pause)
+
+
+def archive(proposal_days=None, ad_days=None, batch_size=None, pause=0,
+            using='default'):
+    """Перенести закрытые предложения, затем неактивные объявления."""
+    options = get_options()
+    proposal_days = options['proposal_days'] if proposal_days is None else proposal_days
+    ad_days = options['ad_days'] if ad_days is None else ad_days
+    batch_size = batch_size or options['batch_size']
+    now = timezone.now()
+    counts = Counter()
+
+    proposal_cutoff = now - timedelta(days=proposal_days)
+    in_batches(lambda: resolved_proposals(proposal_cutoff, using), move_resolved,
+               counts, batch_size, pause, using)
+    ad_cutoff = now - timedelta(days=ad_days)
+    in_batches(lambda: inactive_ads(ad_cutoff, using), move_ads,
+               counts, batch_size, pause, using)
+    return ArchiveResult(counts['proposals'], counts['ads'])
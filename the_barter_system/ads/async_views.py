@@ -0,0 +1,228 @@
+"""
+Асинхронные JSON-версии горячих read-endpoint'ов для ASGI и поток
+событий по предложениям (SSE и long-poll).
+
+Ответ собирается из values() без сериализаторов DRF, а к базе идёт один
+асинхронный вызов ORM на страницу. Весь стек middleware async-capable,
+поэтому под ASGI запрос не переходит в поток целиком.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.utils.urls import replace_query_param
+
+from .events import get_broker, stream_available
+from .models import Ad, ExchangeProposal
+from .pagination import (
+    DEFAULT_KEYSET_ORDERING, InvalidCursor, KeysetPaginator, match_keyset_ordering
+)
+from .search import search_ads
+from .throttling import SEARCH, client_ident, consume, throttled_response
+
+PAGE_SIZE = 10
+AD_FIELDS = ('id', 'title', 'description', 'image_url', 'category',
+             'condition', 'created_at', 'updated_at')
+PROPOSAL_FIELDS = ('id', 'ad_sender', 'ad_receiver', 'comment', 'status',
+                   'created_at')
+
+
+def read_replica(view):
+    view.use_read_replica = True
+    return view
+
+
+def ad_values(queryset):
+    return queryset.values(*AD_FIELDS, 'user__username')
+
+
+def ad_row(row):
+    # Имя ключа как у AdSerializer; values(user=F(...)) конфликтует с полем.
+    row['user'] = row.pop('user__username')
+    return row
+
+
+def link(request, param, value):
+    return replace_query_param(request.build_absolute_uri(), param, value)
+
+
+async def keyset_page(request, queryset):
+    """{next, previous, results} как у KeysetPagination; иначе по ?page=."""
+    ordering = match_keyset_ordering(queryset.query.order_by,
+                                     DEFAULT_KEYSET_ORDERING)
+    if ordering is None:
+        return await offset_page(request, queryset)
+    paginator = KeysetPaginator(queryset, PAGE_SIZE, ordering)
+    cursor = request.GET.get('cursor')
+    try:
+        qs, reverse = paginator.page_queryset(cursor)
+    except InvalidCursor:
+        return None
+    page = paginator.build_page([row async for row in qs], cursor, reverse)
+    return {
+        'next': page.next_cursor and link(request, 'cursor', page.next_cursor),
+        'previous': (page.previous_cursor
+                     and link(request, 'cursor', page.previous_cursor)),
+        'results': page.object_list,
+    }
+
+
+async def offset_page(request, queryset):
+    try:
+        number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return None
+    start = (number - 1) * PAGE_SIZE
+    rows = [row async for row in queryset[start:start + PAGE_SIZE + 1]]
+    return {
+        'next': link(request, 'page', number + 1) if len(rows) > PAGE_SIZE else None,
+        'previous': link(request, 'page', number - 1) if number > 1 else None,
+        'results': rows[:PAGE_SIZE],
+    }
+
+
+def not_found(message='Не найдено.'):
+    return JsonResponse({'detail': message}, status=404)
+
+
+@read_replica
+async def ad_list(request):
+    qs = Ad.objects.order_by(*DEFAULT_KEYSET_ORDERING)
+    if q := request.GET.get('q'):
+        # Тот же лимит, что у поиска в /ads/ и /api/ads/.
+        ident = client_ident(request, await request.auser())
+        if wait := await sync_to_async(consume)(SEARCH, ident):
+            return throttled_response(wait)
+        qs = search_ads(qs, q)
+    if category := request.GET.get('category'):
+        qs = qs.filter(category=category)
+    if condition := request.GET.get('condition'):
+        qs = qs.filter(condition=condition)
+    page = await keyset_page(request, ad_values(qs))
+    if page is None:
+        return not_found('Неверный курсор.')
+    page['results'] = [ad_row(row) for row in page['results']]
+    return JsonResponse(page)
+
+
+@read_replica
+async def ad_detail(request, pk):
+    try:
+        ad = await ad_values(Ad.objects.all()).aget(pk=pk)
+    except Ad.DoesNotExist:
+        return not_found()
+    return JsonResponse(ad_row(ad))
+
+
+@read_replica
+async def my_proposals(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Учетные данные не были предоставлены.'}, status=403)
+
+    view_type = request.GET.get('type', 'all')
+    if view_type == 'sent':
+        qs = ExchangeProposal.objects.filter(ad_sender__user=user)
+    elif view_type == 'received':
+        qs = ExchangeProposal.objects.filter(ad_receiver__user=user)
+    else:
+        qs = ExchangeProposal.objects.filter(
+            Q(ad_sender__user=user) | Q(ad_receiver__user=user))
+    status = request.GET.get('status')
+    if status in dict(ExchangeProposal.STATUS_CHOICES):
+        qs = qs.filter(status=status)
+
+    page = await keyset_page(
+        request, qs.order_by(*DEFAULT_KEYSET_ORDERING).values(*PROPOSAL_FIELDS))
+    if page is None:
+        return not_found('Неверный курсор.')
+    # Предложений у одного пользователя немного: COUNT здесь дешёвый.
+    page['count'] = await qs.acount()
+    return JsonResponse(page)
+
+
+def forbidden():
+    return JsonResponse(
+        {'detail': 'Учетные данные не были предоставлены.'}, status=403)
+
+
+def event_id(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+async def proposal_events(request):
+    """
+    SSE-поток событий по предложениям текущего пользователя. Ожидание
+    идёт в брокере, база не опрашивается. Поток закрывается через
+    ADS_EVENTS_STREAM_SECONDS, EventSource переподключается с
+    Last-Event-ID и получает пропущенное из буфера брокера.
+    Только под ASGI (см. stream_available); иначе 400 — нужен long-poll.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return forbidden()
+    if not stream_available(request):
+        return JsonResponse(
+            {'detail': 'Поток событий недоступен, используйте long-poll.'}, status=400)
+    broker = get_broker()
+    last_id = event_id(request.headers.get('Last-Event-ID')
+                       or request.GET.get('last_event_id'))
+    if last_id is None:
+        last_id = broker.last_id()
+    heartbeat = getattr(settings, 'ADS_EVENTS_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + getattr(settings, 'ADS_EVENTS_STREAM_SECONDS', 300)
+
+    async def stream(last_id):
+        yield 'retry: 3000\n\n'
+        while (remaining := deadline - time.monotonic()) > 0:
+            events, complete = await broker.wait(user.pk, last_id,
+                                                 min(heartbeat, remaining))
+            if not complete:
+                # Буфер переполнился: клиенту нужно перечитать список.
+                yield f'id: {broker.last_id()}\nevent: resync\ndata: {{}}\n\n'
+            for event in events:
+                yield (f"id: {event['id']}\nevent: {event['type']}\n"
+                       f"data: {json.dumps(event)}\n\n")
+            if events:
+                last_id = events[-1]['id']
+            elif not complete:
+                last_id = broker.last_id()
+            else:
+                yield ': keepalive\n\n'
+
+    response = StreamingHttpResponse(stream(last_id),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def proposal_events_poll(request):
+    """
+    Long-poll: ?since=<id>&timeout=<с>. Отвечает сразу, если есть события
+    новее since, иначе ждёт их до timeout. Без since отдаёт текущий id.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return forbidden()
+    broker = get_broker()
+    since = event_id(request.GET.get('since'))
+    if since is None:
+        return JsonResponse({'events': [], 'last_event_id': broker.last_id(),
+                             'complete': True})
+    limit = getattr(settings, 'ADS_EVENTS_POLL_SECONDS', 25)
+    try:
+        timeout = min(limit, max(0.0, float(request.GET.get('timeout', limit))))
+    except ValueError:
+        timeout = limit
+    events, complete = await broker.wait(user.pk, since, timeout)
+    last_id = events[-1]['id'] if events else (since if complete else broker.last_id())
+    return JsonResponse({'events': events, 'last_event_id': last_id,
+                         'complete': complete})
@@ -0,0 +1,62 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+
+WORDS = (
+    'велосипед', 'диван', 'книга', 'телефон', 'куртка', 'стол', 'лампа',
+    'гитара', 'ноутбук', 'самокат', 'кресло', 'часы', 'рюкзак', 'палатка',
+    'коляска', 'наушники', 'плеер', 'фотоаппарат', 'мяч', 'ботинки',
+    'новый', 'старый', 'красный', 'синий', 'большой', 'маленький',
+    'детский', 'спортивный', 'кожаный', 'деревянный', 'рабочий', 'отличный',
+)
+CATEGORIES = (
+    'Электроника', 'Одежда', 'Книги', 'Мебель', 'Спорт', 'Детям',
+    'Инструменты', 'Музыка', 'Туризм', 'Дом',
+)
+
+
+def random_text(rng, n_words):
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def zipf_cum_weights(n, skew=1.2):
+    """Накопленные веса Ципфа для rng.choices(..., cum_weights=...)."""
+    return list(accumulate(1 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def skewed_choice(rng, values, skew=1.2):
+    """Выбор с распределением Ципфа: первые значения встречаются чаще."""
+    return rng.choices(values, cum_weights=zipf_cum_weights(len(values), skew))[0]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summary(samples):
+    return {
+        'runs': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def make_rng(seed):
+    return random.Random(seed)
@@ -0,0 +1,172 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import connections
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .metrics import PAGE_CACHE
+from .models import SimilarAd
+
+GLOBAL = 'global'
+# Списки похожих объявлений после полного пересчёта.
+SIMILAR = 'similar'
+
+
+def get_cache():
+    return caches[getattr(settings, 'ADS_CACHE_ALIAS', 'default')]
+
+
+def category_scope(category):
+    # Категория — произвольный текст, а ключи memcached не допускают пробелов.
+    return 'category:' + hashlib.md5(category.encode()).hexdigest()
+
+
+def ad_scope(pk):
+    return f'ad:{pk}'
+
+
+def _version_key(scope):
+    return f'ads:version:{scope}'
+
+
+def _fresh_version():
+    # Вытесненный счётчик не должен вернуться к значению, под которым
+    # ещё лежат старые страницы, поэтому начальное значение — от времени.
+    return time.time_ns() // 1000
+
+
+def get_versions(scopes):
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def invalidate(ad_ids=(), categories=(), using='default'):
+    """
+    Сменить версии затронутых страниц: общий список, категории, объявления.
+    Внутри транзакции версии меняются и сразу, и после COMMIT, чтобы
+    страница, прочитанная до COMMIT, не осталась под новой версией.
+    """
+    bump_on_commit([GLOBAL, *map(category_scope, set(categories)),
+                    *map(ad_scope, set(ad_ids))], using)
+
+
+# Поля, которые выводятся в списках похожих на чужих страницах.
+LISTED_FIELDS = {'title', 'category', 'condition'}
+
+
+def neighbour_scopes(ad_ids, using='default'):
+    """Страницы объявлений, в чьих списках похожих выводятся ad_ids."""
+    listed = (SimilarAd.objects.using(using).filter(similar__in=list(ad_ids))
+              .values_list('ad_id', flat=True).distinct())
+    return [ad_scope(pk) for pk in listed]
+
+
+def bump_on_commit(scopes, using='default'):
+    """bump сейчас и, внутри транзакции, ещё раз после COMMIT."""
+    bump(scopes)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: bump(scopes), using=using)
+
+
+def page_key(prefix, scopes, query, extra=()):
+    """Ключ страницы: версии областей и нормализованные параметры запроса."""
+    params = sorted((name, value) for name in query
+                    for value in query.getlist(name) if value)
+    raw = repr((get_versions(scopes), params, tuple(extra)))
+    return f'ads:page:{prefix}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+class AnonymousCacheMixin:
+    """
+    Кэш готовых ответов для анонимных GET. Ключ строится из версий
+    областей get_cache_scopes() и параметров cache_query_params (None —
+    все параметры); запись в объявления меняет версии (см. invalidate),
+    поэтому устаревшие ключи просто перестают запрашиваться.
+    """
+    cache_prefix = None
+    cache_query_params = None
+
+    def get_cache_scopes(self):
+        """Области, от которых зависит ответ, или None — не кэшировать."""
+        return [GLOBAL]
+
+    def get_cache_extra(self):
+        return ()
+
+    def is_cacheable(self, request):
+        return (request.method in ('GET', 'HEAD')
+                and not request.user.is_authenticated
+                and 'HTTP_AUTHORIZATION' not in request.META
+                # len() не помечает сообщения прочитанными.
+                and not len(get_messages(request)))
+
+    def get_cache_key(self, request):
+        scopes = self.get_cache_scopes()
+        if scopes is None:
+            return None
+        query = request.GET
+        if self.cache_query_params is not None:
+            query = query.copy()
+            for name in list(query):
+                if name not in self.cache_query_params:
+                    del query[name]
+        return page_key(self.cache_prefix or type(self).__name__,
+                        scopes, query, self.get_cache_extra())
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_cache_key(request) if self.is_cacheable(request) else None
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        cached = cache.get(key)
+        prefix = self.cache_prefix or type(self).__name__
+        PAGE_CACHE.labels(prefix, 'miss' if cached is None else 'hit').inc()
+        if cached is not None:
+            return self._cached_response(request, *cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if request.method != 'GET':
+            return response
+
+        def store(response):
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, list(response.items())),
+                          getattr(settings, 'ADS_CACHE_TIMEOUT', 300))
+
+        if callable(getattr(response, 'render', None)) and not response.is_rendered:
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def _cached_response(self, request, content, headers):
+        response = HttpResponse(content)
+        for name, value in headers:
+            response[name] = value
+        return get_conditional_response(
+            request, etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+            response=response)
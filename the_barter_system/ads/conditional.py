@@ -0,0 +1,98 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def ad_version(ad):
+    """Всё, от чего зависит представление объявления."""
+    # Счётчики предложений меняются без updated_at.
+    return (ad.pk, ad.updated_at.isoformat(), ad.user_id, ad.user.username,
+            ad.proposals_received_count, ad.proposals_waiting_count,
+            ad.proposals_sent_count)
+
+
+def conditional_response(request, etag, last_modified, render):
+    """
+    304 (или 412) по If-None-Match / If-Modified-Since без вызова render;
+    иначе ответ render() с валидаторами ETag и Last-Modified.
+    If-None-Match приоритетнее: точность Last-Modified — одна секунда.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=timestamp)
+    if response is None:
+        response = render()
+    response.headers['ETag'] = etag
+    if timestamp is not None:
+        response.headers['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для retrieve/list ViewSet'а. Для списка ETag —
+    отпечаток строк страницы и ссылок пагинации: при совпадении ответ 304
+    отдаётся без сериализатора.
+    """
+
+    def get_object_version(self, obj):
+        return ad_version(obj)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # Путь с параметрами: ?fields= меняет представление.
+        etag = make_etag(request.accepted_media_type, request.get_full_path(),
+                         self.get_object_version(instance))
+        return conditional_response(
+            request, etag, instance.updated_at,
+            lambda: Response(self.get_serializer(instance).data))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        state = (self.paginator.get_validator_state()
+                 if page is not None else ())
+        etag = make_etag(request.accepted_media_type, request.get_full_path(),
+                         state, [self.get_object_version(obj) for obj in rows])
+        last_modified = max((obj.updated_at for obj in rows), default=None)
+
+        def render():
+            data = self.get_serializer(rows, many=True).data
+            if page is None:
+                return Response(data)
+            return self.get_paginated_response(data)
+
+        return conditional_response(request, etag, last_modified, render)
+
+
+class ConditionalDetailMixin:
+    """
+    То же для HTML DetailView. Страница зависит от пользователя, поэтому
+    он входит в ETag; при непрочитанных flash-сообщениях 304 не отдаётся.
+    """
+
+    def get_object_version(self, obj):
+        return ad_version(obj)
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        def render():
+            context = self.get_context_data(object=self.object)
+            return self.render_to_response(context)
+
+        # len() не помечает сообщения прочитанными.
+        if len(get_messages(request)):
+            return render()
+        etag = make_etag('html', request.user.pk,
+                         self.get_object_version(self.object))
+        return conditional_response(request, etag, self.object.updated_at, render)
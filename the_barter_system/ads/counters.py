@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from . import cache
+from .models import Ad, ArchivedProposal, ExchangeProposal
+
+RECEIVED = 'proposals_received_count'
+WAITING = 'proposals_waiting_count'
+SENT = 'proposals_sent_count'
+FIELDS = (RECEIVED, WAITING, SENT)
+
+
+def for_proposals(rows, sign=1):
+    """Изменения счётчиков от появления (или удаления) строк (sender, receiver, status)."""
+    deltas = defaultdict(Counter)
+    for sender, receiver, status in rows:
+        deltas[sender][SENT] += sign
+        deltas[receiver][RECEIVED] += sign
+        if status == 'waiting':
+            deltas[receiver][WAITING] += sign
+    return deltas
+
+
+def for_resolved(receivers):
+    """Ожидавшие предложения к объявлениям receivers приняты или отклонены."""
+    deltas = defaultdict(Counter)
+    for receiver in receivers:
+        deltas[receiver][WAITING] -= 1
+    return deltas
+
+
+def apply_deltas(deltas, using='default'):
+    """
+    {ad_id: {поле: n}} одним атомарным UPDATE ... SET поле = поле + CASE ...;
+    объявления с одинаковыми изменениями попадают в одну ветку CASE.
+    updated_at не меняется, поэтому сменить версию кэша нужно здесь —
+    только у самих объявлений: общая версия на каждое предложение сбрасывала
+    бы все списки, и счётчики в кэшированных списках отстают до
+    ADS_CACHE_TIMEOUT.
+    """
+    groups = defaultdict(list)
+    for ad_id, changes in deltas.items():
+        key = tuple(sorted((field, n) for field, n in changes.items() if n))
+        if key:
+            groups[key].append(ad_id)
+    if not groups:
+        return
+    updates = {}
+    for field in FIELDS:
+        steps = [(dict(key).get(field, 0), ids) for key, ids in groups.items()]
+        whens = [When(pk__in=ids, then=Value(n)) for n, ids in steps if n]
+        if not whens:
+            continue
+        value = F(field) + Case(*whens, default=Value(0))
+        # Уже разошедшийся счётчик не должен упереться в CHECK >= 0 и
+        # откатить саму операцию с предложением.
+        if any(n < 0 for n, _ in steps):
+            value = Greatest(value, Value(0))
+        updates[field] = value
+    ids = [pk for ids in groups.values() for pk in ids]
+    Ad.all_objects.using(using).filter(pk__in=ids).update(**updates)
+    cache.bump_on_commit([cache.ad_scope(pk) for pk in ids], using)
+
+
+def expected_counts(ids, using='default'):
+    """Счётчики объявлений ids по самим предложениям, с архивом."""
+    counts = defaultdict(Counter)
+    # Предложения удалённых объявлений вычтены ещё delete_ads.
+    hot = ExchangeProposal.objects.using(using).order_by()
+    archived = ArchivedProposal.objects.using(using).order_by()
+    received = (hot.filter(ad_receiver__in=ids).values('ad_receiver')
+                .annotate(n=Count('pk'), waiting=Count('pk', filter=Q(status='waiting')))
+                .values_list('ad_receiver', 'n', 'waiting'))
+    for ad, n, waiting in received:
+        counts[ad][RECEIVED] += n
+        counts[ad][WAITING] += waiting
+    for ad, n in (hot.filter(ad_sender__in=ids).values('ad_sender')
+                  .annotate(n=Count('pk')).values_list('ad_sender', 'n')):
+        counts[ad][SENT] += n
+    for field, counter in (('ad_receiver', RECEIVED), ('ad_sender', SENT)):
+        for ad, n in (archived.filter(**{field + '__in': ids}).values(field)
+                      .annotate(n=Count('pk')).values_list(field, 'n')):
+            counts[ad][counter] += n
+    return counts
+
+
+def reconcile(batch_size=1000, using='default'):
+    """
+    Пересчитать счётчики пачками объявлений по pk; возвращает число
+    исправленных. Объявления пачки заблокированы от подсчёта до записи:
+    F() параллельных операций ждёт и ложится поверх нового значения.
+    Удалённые объявления пропускаются: их счётчики уже не нужны.
+    """
+    fixed, last = 0, 0
+    while True:
+        with transaction.atomic(using=using):
+            ads = list(Ad.objects.using(using).select_for_update()
+                       .filter(pk__gt=last).order_by('pk')
+                       .only('pk', *FIELDS)[:batch_size])
+            if not ads:
+                return fixed
+            counts = expected_counts([ad.pk for ad in ads], using)
+            drifted = []
+            for ad in ads:
+                if any(getattr(ad, field) != counts[ad.pk][field] for field in FIELDS):
+                    for field in FIELDS:
+                        setattr(ad, field, counts[ad.pk][field])
+                    drifted.append(ad)
+            if drifted:
+                Ad.all_objects.using(using).bulk_update(drifted, FIELDS)
+                cache.bump_on_commit([cache.ad_scope(ad.pk) for ad in drifted], using)
+            fixed += len(drifted)
+            last = ads[-1].pk
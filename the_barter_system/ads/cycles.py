@@ -0,0 +1,238 @@
+"""
+Поиск циклов обмена A→B→C→A среди ожидающих предложений.
+
+Ребро графа — ожидающее предложение ad_sender → ad_receiver: владелец
+ad_sender готов отдать его за ad_receiver. В цикле каждый участник
+получает то, что просил, поэтому цикл можно провести целиком
+(services.execute_cycle).
+
+Граф держится в памяти процесса и обновляется по событиям предложений;
+предложения, созданные в других процессах, подтягиваются по pk, а
+закрытые там отсеиваются сверкой найденных циклов с базой.
+"""
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .events import proposal_changed
+from .models import ExchangeProposal
+
+# Предложения с соседними pk могут зафиксироваться не по порядку:
+# догрузка перечитывает хвост такой длины.
+REFRESH_OVERLAP = 1000
+
+
+class Cycle(NamedTuple):
+    ads: tuple
+    proposals: tuple
+
+
+class CycleGraph:
+    """
+    Ориентированный граф объявлений: succ[a][b] и pred[b][a] — id
+    предложения a→b (или список id, если предложений по паре несколько).
+    """
+
+    def __init__(self):
+        self.succ = {}
+        self.pred = {}
+        self.edge_count = 0
+
+    @staticmethod
+    def _link(index, a, b, proposal_id):
+        targets = index.setdefault(a, {})
+        current = targets.get(b)
+        if current is None:
+            targets[b] = proposal_id
+        elif isinstance(current, list):
+            if proposal_id in current:
+                return False
+            current.append(proposal_id)
+        elif current == proposal_id:
+            return False
+        else:
+            targets[b] = [current, proposal_id]
+        return True
+
+    @staticmethod
+    def _unlink(index, a, b, proposal_id):
+        targets = index.get(a)
+        current = targets.get(b) if targets else None
+        if isinstance(current, list):
+            if proposal_id not in current:
+                return False
+            current.remove(proposal_id)
+            if len(current) == 1:
+                targets[b] = current[0]
+        elif current == proposal_id:
+            del targets[b]
+            if not targets:
+                del index[a]
+        else:
+            return False
+        return True
+
+    def add(self, proposal_id, sender, receiver):
+        if self._link(self.succ, sender, receiver, proposal_id):
+            self._link(self.pred, receiver, sender, proposal_id)
+            self.edge_count += 1
+
+    def discard(self, proposal_id, sender, receiver):
+        if self._unlink(self.succ, sender, receiver, proposal_id):
+            self._unlink(self.pred, receiver, sender, proposal_id)
+            self.edge_count -= 1
+
+    def proposal(self, sender, receiver):
+        value = self.succ[sender][receiver]
+        return value[0] if isinstance(value, list) else value
+
+    def distances_to(self, target, max_depth, budget):
+        """Длина кратчайшего пути v ⇝ target (BFS по pred, не глубже max_depth)."""
+        dist = {target: 0}
+        queue = deque([target])
+        while queue and len(dist) < budget:
+            node = queue.popleft()
+            depth = dist[node]
+            if depth == max_depth:
+                continue
+            for prev in self.pred.get(node, ()):
+                if prev not in dist:
+                    dist[prev] = depth + 1
+                    queue.append(prev)
+        return dist
+
+    def cycles_through(self, sender, receiver, max_length, min_length=3,
+                       limit=10, budget=50000):
+        """
+        Простые циклы длиной min_length..max_length объявлений через ребро
+        sender→receiver. Встречный поиск: BFS назад от sender на половину
+        длины, DFS вперёд от receiver; вершина отсекается, если sender из
+        неё недостижим за оставшееся число шагов.
+        """
+        if receiver not in self.succ.get(sender, ()):
+            return []
+        horizon = max(1, (max_length - 1) // 2)
+        dist = self.distances_to(sender, horizon, budget)
+
+        def reachable(node, steps):
+            # Вне dist кратчайший путь длиннее horizon.
+            return dist[node] <= steps if node in dist else steps > horizon
+
+        if not reachable(receiver, max_length - 1):
+            return []
+        found = []
+        path = [sender, receiver]
+        on_path = {sender, receiver}
+        stack = [iter(self.succ.get(receiver, ()))]
+        steps = 0
+        while stack and len(found) < limit and steps < budget:
+            nxt = next(stack[-1], None)
+            if nxt is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+            steps += 1
+            if nxt == sender:
+                if len(path) >= min_length:
+                    found.append(self._cycle(path))
+            elif nxt not in on_path and reachable(nxt, max_length - len(path)):
+                path.append(nxt)
+                on_path.add(nxt)
+                stack.append(iter(self.succ.get(nxt, ())))
+        return found
+
+    def _cycle(self, path):
+        # Каноническая форма: начиная с наименьшего id объявления.
+        start = path.index(min(path))
+        ads = tuple(path[start:] + path[:start])
+        proposals = tuple(self.proposal(a, b)
+                          for a, b in zip(ads, ads[1:] + ads[:1]))
+        return Cycle(ads, proposals)
+
+
+class CycleEngine:
+    def __init__(self, max_length=None, budget=None, using='default'):
+        self.max_length = max_length or getattr(settings, 'ADS_CYCLE_MAX_LENGTH', 5)
+        self.budget = budget or getattr(settings, 'ADS_CYCLE_SEARCH_BUDGET', 50000)
+        self.using = using
+        self.graph = CycleGraph()
+        self.high_water = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Догрузить ожидающие предложения, созданные после прошлой загрузки."""
+        start = max(0, self.high_water - REFRESH_OVERLAP) if self.loaded else 0
+        rows = (ExchangeProposal.objects.using(self.using)
+                .filter(pk__gt=start, status='waiting').order_by('pk')
+                .values_list('pk', 'ad_sender_id', 'ad_receiver_id')
+                .iterator(chunk_size=10000))
+        with self._lock:
+            for pk, sender, receiver_ in rows:
+                self.graph.add(pk, sender, receiver_)
+                self.high_water = max(self.high_water, pk)
+            self.loaded = True
+
+    def apply(self, event):
+        if not self.loaded:
+            return
+        edge = (event['proposal'], event['ad_sender'], event['ad_receiver'])
+        with self._lock:
+            if event['status'] == 'waiting':
+                self.graph.add(*edge)
+                self.high_water = max(self.high_water, event['proposal'])
+            else:
+                self.graph.discard(*edge)
+
+    def suggest(self, ad_ids, limit=20):
+        """Циклы через объявления ad_ids, сверенные с базой."""
+        self.refresh()
+        cycles = {}
+        with self._lock:
+            for ad in ad_ids:
+                for target in list(self.graph.succ.get(ad, ())):
+                    for cycle in self.graph.cycles_through(
+                            ad, target, self.max_length,
+                            limit=limit, budget=self.budget):
+                        cycles.setdefault(cycle.ads, cycle)
+                    if len(cycles) >= limit:
+                        break
+        return self.verify(list(cycles.values())[:limit])
+
+    def verify(self, cycles):
+        """Отбросить циклы с уже закрытыми предложениями и убрать их рёбра."""
+        ids = {pk for cycle in cycles for pk in cycle.proposals}
+        alive = set(ExchangeProposal.objects.using(self.using)
+                    .filter(pk__in=ids, status='waiting')
+                    .values_list('pk', flat=True))
+        result = []
+        with self._lock:
+            for cycle in cycles:
+                edges = zip(cycle.proposals, cycle.ads, cycle.ads[1:] + cycle.ads[:1])
+                stale = [edge for edge in edges if edge[0] not in alive]
+                for edge in stale:
+                    self.graph.discard(*edge)
+                if not stale:
+                    result.append(cycle)
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    return CycleEngine()
+
+
+@receiver(setting_changed)
+def reset_engine(setting, **kwargs):
+    if setting.startswith('ADS_CYCLE_'):
+        get_engine.cache_clear()
+
+
+@receiver(proposal_changed)
+def track_proposal(sender, event, **kwargs):
+    get_engine().apply(event)
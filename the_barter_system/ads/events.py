@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+from .models import ExchangeProposal
+
+
+# Отправляется после COMMIT для каждого события предложения (event=dict).
+proposal_changed = Signal()
+
+
+class BaseBroker:
+    """
+    Pub/sub событий по пользователям. Каждое событие получает
+    возрастающий id; клиент передаёт последний увиденный id и получает
+    только более новые.
+    """
+
+    def publish(self, user_ids, event):
+        raise NotImplementedError
+
+    def last_id(self):
+        raise NotImplementedError
+
+    def since(self, user_id, last_id):
+        """(события после last_id, complete); complete=False — часть потеряна."""
+        raise NotImplementedError
+
+    async def wait(self, user_id, last_id, timeout):
+        """Как since, но ждёт новых событий не дольше timeout секунд."""
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """
+    Кольцевой буфер последних событий каждого пользователя в памяти
+    процесса. Ожидающие клиенты не опрашивают ни базу, ни буфер: publish
+    будит их через call_soon_threadsafe их event loop'а. Для нескольких
+    процессов нужен общий брокер с тем же интерфейсом.
+
+    Буфер пользователя, которому ничего не публиковалось idle_seconds
+    (ADS_EVENTS_BUFFER_SECONDS), выбрасывается: окно должно быть больше
+    перерыва между переподключениями клиента.
+    """
+
+    def __init__(self, buffer_size=100, idle_seconds=None):
+        self.buffer_size = buffer_size
+        if idle_seconds is None:
+            idle_seconds = getattr(settings, 'ADS_EVENTS_BUFFER_SECONDS', 3600)
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._events = {}
+        self._dropped = {}
+        # Пользователь -> время последней публикации, старые в начале.
+        self._published = OrderedDict()
+        self._waiters = defaultdict(set)
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            self._last_id += 1
+            event = {**event, 'id': self._last_id}
+            waiters = []
+            now = time.monotonic()
+            self._evict(now - self.idle_seconds)
+            for user_id in set(user_ids):
+                self._published[user_id] = now
+                self._published.move_to_end(user_id)
+                buffer = self._events.setdefault(
+                    user_id, deque(maxlen=self.buffer_size))
+                if len(buffer) == buffer.maxlen:
+                    self._dropped[user_id] = buffer[0]['id']
+                buffer.append(event)
+                waiters.extend(self._waiters.get(user_id, ()))
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+        return event
+
+    def _evict(self, before):
+        while self._published:
+            user_id, published = next(iter(self._published.items()))
+            if published >= before:
+                break
+            del self._published[user_id]
+            self._events.pop(user_id, None)
+            self._dropped.pop(user_id, None)
+
+    def last_id(self):
+        return self._last_id
+
+    def since(self, user_id, last_id):
+        with self._lock:
+            events = [e for e in self._events.get(user_id, ()) if e['id'] > last_id]
+            complete = self._dropped.get(user_id, 0) <= last_id
+        return events, complete
+
+    async def wait(self, user_id, last_id, timeout):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters[user_id].add(waiter)
+        try:
+            events, complete = self.since(user_id, last_id)
+            if events or not complete:
+                return events, complete
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.since(user_id, last_id)
+        finally:
+            with self._lock:
+                self._waiters[user_id].discard(waiter)
+                if not self._waiters[user_id]:
+                    del self._waiters[user_id]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Брокер из settings.ADS_EVENT_BROKER, один на процесс."""
+    path = getattr(settings, 'ADS_EVENT_BROKER', None)
+    return import_string(path)() if path else InMemoryBroker()
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting in ('ADS_EVENT_BROKER', 'ADS_EVENTS_BUFFER_SECONDS'):
+        get_broker.cache_clear()
+
+
+def stream_available(request):
+    """
+    SSE только под ASGI и если не выключен ADS_EVENTS_SSE: под WSGI
+    StreamingHttpResponse с async-итератором собирается целиком и держит
+    поток весь ADS_EVENTS_STREAM_SECONDS.
+    """
+    return isinstance(request, ASGIRequest) and getattr(settings, 'ADS_EVENTS_SSE', True)
+
+
+def proposal_event(kind, proposal_id, sender_id, receiver_id, status):
+    return {
+        'type': f'proposal.{kind}',
+        'proposal': proposal_id,
+        'ad_sender': sender_id,
+        'ad_receiver': receiver_id,
+        'status': status,
+    }
+
+
+def publish_on_commit(user_ids, event, using='default'):
+    """Событие уходит только после COMMIT: клиент не увидит откатанное."""
+    def publish():
+        get_broker().publish(user_ids, event)
+        proposal_changed.send(sender=ExchangeProposal, event=event)
+
+    transaction.on_commit(publish, using=using)
@@ -0,0 +1,75 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import DEFERRED, Count, F, Value
+from django.db.models.functions import Greatest
+
+from .models import Ad, CategoryFacet
+
+
+def facet_key(values):
+    return values.get('category'), values.get('condition')
+
+
+def previous_facet_key(instance, using):
+    """(category, condition) объявления до сохранения."""
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(loaded.get(name, DEFERRED) is not DEFERRED
+           for name in ('category', 'condition')):
+        return facet_key(loaded)
+    row = (Ad.objects.using(using).filter(pk=instance.pk)
+           .values('category', 'condition').first())
+    return facet_key(row) if row else None
+
+
+def apply_deltas(deltas, using='default'):
+    """Инкрементально применить изменения счётчиков {(category, condition): n}."""
+    for (category, condition), delta in deltas.items():
+        if not delta:
+            continue
+        facets = CategoryFacet.objects.using(using).filter(
+            category=category, condition=condition)
+        # Разошедшийся счётчик не должен упереться в CHECK >= 0 и откатить
+        # само удаление или правку объявления.
+        count = F('count') + delta if delta > 0 else Greatest(F('count') + delta, Value(0))
+        if facets.update(count=count):
+            continue
+        if delta > 0:
+            facet, created = CategoryFacet.objects.using(using).get_or_create(
+                category=category, condition=condition,
+                defaults={'count': delta})
+            if not created:
+                facets.update(count=F('count') + delta)
+
+
+def deltas_for_ads(ads, sign=1):
+    return Counter({
+        key: sign * n
+        for key, n in Counter((ad.category, ad.condition) for ad in ads).items()
+    })
+
+
+def rebuild(using='default'):
+    with transaction.atomic(using=using):
+        CategoryFacet.objects.using(using).all().delete()
+        rows = (Ad.objects.using(using).order_by()
+                .values('category', 'condition').annotate(n=Count('id')))
+        CategoryFacet.objects.using(using).bulk_create(
+            CategoryFacet(category=row['category'], condition=row['condition'],
+                          count=row['n'])
+            for row in rows
+        )
+
+
+def get_facets(using=None):
+    """[{'category', 'count', 'conditions': {condition: count}}] по категориям."""
+    facets = {}
+    qs = CategoryFacet.objects.filter(count__gt=0).order_by('category', 'condition')
+    if using:
+        qs = qs.using(using)
+    for category, condition, count in qs.values_list('category', 'condition', 'count'):
+        facet = facets.setdefault(
+            category, {'category': category, 'count': 0, 'conditions': {}})
+        facet['count'] += count
+        facet['conditions'][condition] = count
+    return list(facets.values())
@@ -0,0 +1,79 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def parse_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Оставляет в ответе только поля из context['fields'] (None — все).
+    Вложенные сериализаторы не трогает: список относится к корню.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        if selected is None or parent is not None:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields=a,b и ?omit=c для list/retrieve: лишние поля убираются из
+    ответа, а их колонки — из SELECT через only().
+
+    Колонка поля — его source. sparse_required_columns читаются всегда:
+    их используют пагинация и ETag, и отложенное поле стоило бы
+    отдельного запроса на каждую строку.
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_required_columns = ('id',)
+
+    def get_selected_fields(self):
+        """Имена полей ответа по порядку сериализатора или None — все."""
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = self._parse_selected_fields()
+        return self._selected_fields
+
+    def _parse_selected_fields(self):
+        params = self.request.query_params
+        requested = {param: parse_names(params.get(param, ''))
+                     for param in (FIELDS_PARAM, OMIT_PARAM)}
+        if self.action not in self.sparse_actions or not any(requested.values()):
+            return None
+        available = list(self.get_serializer_class()().fields)
+        errors = {}
+        for param, names in requested.items():
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                errors[param] = f'Неизвестные поля: {", ".join(unknown)}.'
+        if errors:
+            raise ValidationError(errors)
+        only = requested[FIELDS_PARAM] or available
+        return [name for name in available
+                if name in only and name not in requested[OMIT_PARAM]]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_selected_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selected = self.get_selected_fields()
+        if selected is None:
+            return queryset
+        fields = self.get_serializer_class()().fields
+        columns = list(self.sparse_required_columns)
+        columns += [fields[name].source.replace('.', '__') for name in selected
+                    if fields[name].source != '*']
+        return queryset.only(*dict.fromkeys(columns))
@@ -0,0 +1,13 @@
+from rest_framework import filters
+
+from .search import search_ads
+
+
+class AdSearchFilter(filters.SearchFilter):
+    """?search= через полнотекстовый бэкенд вместо icontains по search_fields."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return search_ads(queryset, query)
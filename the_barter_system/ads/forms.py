@@ -34,7 +34,7 @@ class ExchangeProposalForm(forms.ModelForm):
 
     def clean_ad_sender(self):
         ad_sender = self.cleaned_data['ad_sender']
-        if ad_sender.user != self.user:
+        if self.user is None or ad_sender.user_id != self.user.pk:
             raise ValidationError("Вы можете предлагать только свои объявления.")
         if self.target_ad and ad_sender.pk == self.target_ad.pk:
             raise ValidationError("Нельзя обмениваться одним и тем же объявлением.")
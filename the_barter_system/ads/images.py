@@ -0,0 +1,255 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import socket
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from . import cache
+from .models import AdImage
+
+STORAGE_ALIAS = 'ads_images'
+CONTENT_TYPE = 'image/jpeg'
+
+
+class ImageError(Exception):
+    """Картинку не удалось скачать или разобрать; текст — для AdImage.error."""
+
+
+def get_options():
+    return {
+        'sizes': sorted(getattr(settings, 'ADS_IMAGE_SIZES', (160, 320, 640, 1280))),
+        'max_bytes': getattr(settings, 'ADS_IMAGE_MAX_BYTES', 10 * 1024 * 1024),
+        'max_pixels': getattr(settings, 'ADS_IMAGE_MAX_PIXELS', 40_000_000),
+        'quality': getattr(settings, 'ADS_IMAGE_QUALITY', 82),
+    }
+
+
+class BaseFetcher:
+    """Скачивает картинку по URL объявления и возвращает байты."""
+
+    def fetch(self, url, max_bytes):
+        raise NotImplementedError
+
+
+def is_public(address):
+    return ipaddress.ip_address(address.split('%')[0]).is_global
+
+
+def connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                   source_address=None, *args, **kwargs):
+    """
+    socket.create_connection только к публичным адресам. Адрес проверяется
+    тот, к которому идёт соединение, поэтому ни редирект, ни повторное
+    разрешение имени (DNS rebinding) не приведут к внутреннему сервису.
+    """
+    host, port = address
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as exc:
+        raise ImageError(f'Не удалось скачать: {exc}') from exc
+    for *_, sockaddr in infos:
+        if not is_public(sockaddr[0]):
+            raise ImageError(f'Адрес {sockaddr[0]} не публичный.')
+    return socket.create_connection(infos[0][4][:2], timeout, source_address)
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class HttpFetcher(BaseFetcher):
+    """
+    Ссылки присылают пользователи, поэтому соединения разрешены только с
+    публичными адресами (см. connect_public), а прокси из окружения не
+    используются: через прокси проверить конечный адрес нельзя.
+    """
+    timeout = 10
+    user_agent = 'the-barter-system image fetcher'
+
+    def __init__(self):
+        self.opener = urllib.request.build_opener(
+            urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler)
+
+    def fetch(self, url, max_bytes):
+        if urlsplit(url).scheme not in ('http', 'https'):
+            raise ImageError('Поддерживаются только http и https.')
+        request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                content_type = response.headers.get_content_type()
+                if not content_type.startswith('image/'):
+                    raise ImageError(f'Не картинка: {content_type}.')
+                # Читаем на байт больше лимита, чтобы отличить файл ровно
+                # в лимит от обрезанного.
+                data = response.read(max_bytes + 1)
+        except OSError as exc:
+            raise ImageError(f'Не удалось скачать: {exc}') from exc
+        if len(data) > max_bytes:
+            raise ImageError(f'Файл больше {max_bytes} байт.')
+        return data
+
+
+@lru_cache(maxsize=None)
+def get_fetcher():
+    """Загрузчик из settings.ADS_IMAGE_FETCHER, один на процесс."""
+    path = getattr(settings, 'ADS_IMAGE_FETCHER', None)
+    return import_string(path)() if path else HttpFetcher()
+
+
+@receiver(setting_changed)
+def reset_fetcher(setting, **kwargs):
+    if setting == 'ADS_IMAGE_FETCHER':
+        get_fetcher.cache_clear()
+
+
+def get_storage():
+    return storages[STORAGE_ALIAS]
+
+
+def original_path(digest):
+    return f'{digest[:2]}/{digest}/original'
+
+
+def thumbnail_path(digest, width):
+    return f'{digest[:2]}/{digest}/{width}.jpg'
+
+
+def target_widths(width, sizes):
+    """Ширины миниатюр: без увеличения, но хотя бы одна."""
+    return [size for size in sizes if size <= width] or [width]
+
+
+def save_once(storage, name, data):
+    # Пути зависят только от содержимого: существующий файл уже верен.
+    if storage.exists(name):
+        return
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Тот же файл параллельно записал другой поток, хранилище дало
+        # копии новое имя.
+        storage.delete(saved)
+
+
+class Ingested(NamedTuple):
+    digest: str
+    width: int
+    height: int
+    widths: list
+
+
+def ingest(url, fetcher=None, storage=None, options=None):
+    """
+    Скачать картинку один раз, сохранить исходник и миниатюры в хранилище.
+    Не обращается к БД, поэтому выполняется в потоках пула.
+    """
+    fetcher = fetcher or get_fetcher()
+    storage = storage or get_storage()
+    options = options or get_options()
+    data = fetcher.fetch(url, options['max_bytes'])
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > options['max_pixels']:
+                raise ImageError(f'Слишком большое изображение: '
+                                 f'{image.width}×{image.height}.')
+            image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ImageError(f'Не удалось разобрать картинку: {exc}') from exc
+
+    save_once(storage, original_path(digest), data)
+    widths = target_widths(image.width, options['sizes'])
+    for width in widths:
+        name = thumbnail_path(digest, width)
+        if storage.exists(name):
+            continue
+        height = max(1, round(image.height * width / image.width))
+        buffer = io.BytesIO()
+        image.resize((width, height), Image.Resampling.LANCZOS).save(
+            buffer, 'JPEG', quality=options['quality'], optimize=True,
+            progressive=True)
+        save_once(storage, name, buffer.getvalue())
+    return Ingested(digest, image.width, image.height, widths)
+
+
+def enqueue(ads, using='default'):
+    """Поставить картинки объявлений в очередь; пустой image_url — убрать."""
+    ads = list(ads)
+    AdImage.objects.using(using).filter(
+        ad__in=[ad for ad in ads if not ad.image_url]).delete()
+    queued = [AdImage(ad=ad, source_url=ad.image_url) for ad in ads if ad.image_url]
+    AdImage.objects.using(using).bulk_create(
+        queued, update_conflicts=True, unique_fields=['ad'],
+        update_fields=['source_url', 'status', 'error', 'attempts', 'updated_at'])
+
+
+def process_pending(limit=None, workers=4, max_attempts=3, using='default'):
+    """
+    Обработать очередь пулом потоков: загрузка и Pillow отпускают GIL.
+    Возвращает (готово, ошибок).
+    """
+    pending = (AdImage.objects.using(using).filter(status='pending')
+               .order_by('ad_id').values_list('ad_id', 'source_url', 'attempts'))
+    if limit:
+        pending = pending[:limit]
+    pending = list(pending)
+    fetcher, storage, options = get_fetcher(), get_storage(), get_options()
+
+    def run(url):
+        try:
+            return ingest(url, fetcher, storage, options)
+        except ImageError as exc:
+            return exc
+
+    # Одна ссылка у нескольких объявлений скачивается один раз.
+    urls = list(dict.fromkeys(url for _, url, _ in pending))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(urls, pool.map(run, urls)))
+
+    ready = failed = 0
+    for ad_id, url, attempts in pending:
+        result = results[url]
+        # Условие по source_url: если картинку успели заменить, новая
+        # ссылка остаётся в очереди.
+        row = AdImage.objects.using(using).filter(ad_id=ad_id, source_url=url)
+        if isinstance(result, ImageError):
+            failed += 1
+            row.update(error=str(result)[:500], attempts=attempts + 1,
+                       status='failed' if attempts + 1 >= max_attempts else 'pending')
+            continue
+        ready += row.update(status='ready', error='', digest=result.digest,
+                            width=result.width, height=result.height,
+                            widths=result.widths)
+    if pending:
+        cache.invalidate([ad_id for ad_id, _, _ in pending], using=using)
+    return ready, failed
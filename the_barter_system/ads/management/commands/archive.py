@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ads import archive
+
+
+class Command(BaseCommand):
+    help = ('Переносит закрытые предложения и неактивные объявления в архивные '
+            'таблицы короткими транзакциями; архив доступен через /api/archive/.')
+
+    def add_arguments(self, parser):
+        options = archive.get_options()
+        parser.add_argument('--proposal-days', type=int, default=options['proposal_days'],
+                            help='Предложения, закрытые раньше стольких дней назад.')
+        parser.add_argument('--ad-days', type=int, default=options['ad_days'],
+                            help='Объявления без изменений и предложений столько дней.')
+        parser.add_argument('--batch-size', type=int, default=options['batch_size'])
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Секунд между пачками, чтобы пропустить другие записи.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, что будет перенесено.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if options['dry_run']:
+            now = timezone.now()
+            proposals = archive.resolved_proposals(
+                now - timedelta(days=options['proposal_days']), using).count()
+            ads = archive.inactive_ads(
+                now - timedelta(days=options['ad_days']), using).count()
+            self.stdout.write(f'К переносу: предложений {proposals}, '
+                              f'объявлений {ads}.')
+            return
+
+        started = time.perf_counter()
+        result = archive.archive(options['proposal_days'], options['ad_days'],
+                                 options['batch_size'], options['pause'], using)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'В архиве: предложений {result.proposals}, объявлений {result.ads} '
+            f'за {elapsed:.1f} с.'))
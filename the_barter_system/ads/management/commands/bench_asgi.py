@@ -0,0 +1,171 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from ads.bench import CATEGORIES, make_rng, random_text, summary
+from ads.models import Ad
+from ads.services import bulk_create_ads
+
+User = get_user_model()
+
+HOST = 'localhost'
+ROUTES = {
+    'list': ('/api/async/ads/', '/api/ads/'),
+    'detail': ('/api/async/ads/{pk}/', '/api/ads/{pk}/'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает асинхронные read-endpoint\'ы под ASGI с синхронными '
+            'DRF-view под WSGI: запросы в секунду и задержки при заданной '
+            'конкурентности. Оба стека вызываются в процессе, без сети; '
+            'кэш ответов на время замера выключен.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--seed-ads', type=int, default=0,
+                            help='Создать столько объявлений на время замера.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        seeded = self.seed(options) if options['seed_ads'] else []
+        try:
+            pk = Ad.objects.values_list('pk', flat=True).order_by('-pk').first()
+            if pk is None:
+                self.stderr.write('Нет объявлений: используйте --seed-ads.')
+                return
+            with override_settings(ADS_CACHE_TIMEOUT=0):
+                results = self.run(options, pk)
+        finally:
+            if seeded:
+                Ad.objects.filter(pk__in=seeded).delete()
+                User.objects.filter(username='__bench_asgi__').delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+        for route, row in results['routes'].items():
+            self.stdout.write(route)
+            for name, stats in row.items():
+                self.stdout.write(
+                    f"  {name:<5} {stats['rps']:>8.0f} req/s "
+                    f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                    f"errors={stats['errors']}")
+
+    def seed(self, options):
+        rng = make_rng(options['seed'])
+        owner, _ = User.objects.get_or_create(username='__bench_asgi__')
+        ads = bulk_create_ads([
+            Ad(user=owner, title=random_text(rng, 3),
+               description=random_text(rng, 30),
+               category=rng.choice(CATEGORIES), condition='used')
+            for _ in range(options['seed_ads'])
+        ])
+        return [ad.pk for ad in ads]
+
+    def run(self, options, pk):
+        asgi, wsgi = get_asgi_application(), get_wsgi_application()
+        n, concurrency = options['requests'], options['concurrency']
+        results = {'requests': n, 'concurrency': concurrency, 'routes': {}}
+        for route, (async_path, sync_path) in ROUTES.items():
+            results['routes'][route] = {
+                'asgi': asyncio.run(
+                    run_asgi(asgi, async_path.format(pk=pk), n, concurrency)),
+                'wsgi': run_wsgi(wsgi, sync_path.format(pk=pk), n, concurrency),
+            }
+        return results
+
+
+def report(samples, errors, elapsed):
+    return {**summary(samples), 'rps': len(samples) / elapsed if elapsed else 0.0,
+            'errors': errors}
+
+
+async def asgi_get(app, path):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path,
+        'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'accept', b'application/json')],
+        'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Клиент не отключается: Django отменит ожидание после ответа.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_asgi(app, path, n, concurrency):
+    samples, errors = [], 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with limit:
+            start = time.perf_counter()
+            status = await asgi_get(app, path)
+            samples.append(time.perf_counter() - start)
+            errors += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    return report(samples, errors, time.perf_counter() - started)
+
+
+def wsgi_get(app, path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST,
+        'HTTP_ACCEPT': 'application/json', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0])
+
+
+def run_wsgi(app, path, n, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        status = wsgi_get(app, path)
+        return time.perf_counter() - start, status != 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(n)))
+    elapsed = time.perf_counter() - started
+    return report([t for t, _ in outcomes], sum(e for _, e in outcomes), elapsed)
@@ -0,0 +1,94 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from ads.bench import make_rng, summary
+from ads.cycles import CycleGraph
+
+
+class Command(BaseCommand):
+    help = ('Замеряет движок циклов обмена на синтетическом графе в памяти: '
+            'построение, инкрементальные вставки/удаления и поиск циклов '
+            'через ребро.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=50000)
+        parser.add_argument('--edges', type=int, default=1000000)
+        parser.add_argument('--max-length', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--budget', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--memory', action='store_true',
+                            help='Учитывать память (tracemalloc, медленнее).')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        results = self.run(options)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"граф: {results['nodes']} вершин, {results['edges']} рёбер, "
+            f"построен за {results['build_s']:.1f} с"
+            + (f", {results['memory_mb']:.0f} МБ" if 'memory_mb' in results else ''))
+        for name in ('add', 'discard', 'search'):
+            stats = results[name]
+            self.stdout.write(
+                f"  {name:<8} p50={stats['p50_ms']:.3f}ms "
+                f"p99={stats['p99_ms']:.3f}ms mean={stats['mean_ms']:.3f}ms")
+        self.stdout.write(f"  найдено циклов: {results['cycles_found']} "
+                          f"в {results['queries_with_cycles']} из {options['queries']} запросов")
+
+    def random_edge(self, rng, nodes):
+        # Популярные объявления чаще бывают целью: степень захода по Ципфу.
+        sender = rng.randrange(nodes)
+        receiver = min(nodes - 1, int(rng.paretovariate(1.2)) - 1
+                       if rng.random() < 0.3 else rng.randrange(nodes))
+        return sender, receiver
+
+    def run(self, options):
+        rng = make_rng(options['seed'])
+        nodes, n_edges = options['nodes'], options['edges']
+        graph = CycleGraph()
+        if options['memory']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for pk in range(1, n_edges + 1):
+            sender, receiver = self.random_edge(rng, nodes)
+            if sender != receiver:
+                graph.add(pk, sender, receiver)
+        results = {'nodes': nodes, 'edges': graph.edge_count,
+                   'build_s': time.perf_counter() - started}
+        if options['memory']:
+            results['memory_mb'] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+            tracemalloc.stop()
+
+        adds, discards, searches = [], [], []
+        found = hits = 0
+        next_pk = n_edges + 1
+        for _ in range(options['queries']):
+            sender, receiver = self.random_edge(rng, nodes)
+            if sender == receiver:
+                continue
+            start = time.perf_counter()
+            graph.add(next_pk, sender, receiver)
+            adds.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            cycles = graph.cycles_through(sender, receiver, options['max_length'],
+                                          budget=options['budget'])
+            searches.append(time.perf_counter() - start)
+            found += len(cycles)
+            hits += bool(cycles)
+
+            start = time.perf_counter()
+            graph.discard(next_pk, sender, receiver)
+            discards.append(time.perf_counter() - start)
+            next_pk += 1
+
+        results.update(add=summary(adds), discard=summary(discards),
+                       search=summary(searches), cycles_found=found,
+                       queries_with_cycles=hits)
+        return results
@@ -0,0 +1,241 @@
+import json
+import subprocess
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import NamedTuple, Optional
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ads.bench import CATEGORIES, WORDS, summary
+from ads.models import Ad, AdImage, ExchangeProposal
+
+User = get_user_model()
+
+class Case(NamedTuple):
+    name: str
+    route: str
+    path: str
+    user: Optional[int] = None
+    method: str = 'get'
+    expect: int = 200
+    # Изменяющие запросы выполняются в транзакции с откатом, чтобы каждый
+    # повтор видел те же данные.
+    rollback: bool = False
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер каждого маршрута ads/urls.py на текущей базе '
+            '(см. seed_bench): запросы в секунду, p50/p95/p99 и число SQL-'
+            'запросов. Результат можно сохранить в JSON и сравнить с прошлым.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', help='Только случаи, чьё имя содержит строку.')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Не выключать кэш ответов.')
+        parser.add_argument('--output', help='Сохранить результат в JSON-файл.')
+        parser.add_argument('--compare', help='JSON прошлого запуска для сравнения.')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='Рост p95 во столько раз считается регрессией.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        cases = [case for case in self.plan()
+                 if not options['only'] or options['only'] in case.name]
+        # Повторы одного клиента иначе упёрлись бы в лимиты запросов.
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+                     'ADS_THROTTLE_RATES': {}}
+        if not options['with_cache']:
+            overrides['ADS_CACHE_TIMEOUT'] = 0
+        with override_settings(**overrides):
+            routes = {case.name: self.measure(case, options) for case in cases}
+
+        results = {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connections['default'].vendor,
+            'rows': {'users': User.objects.count(), 'ads': Ad.objects.count(),
+                     'proposals': ExchangeProposal.objects.count()},
+            'repeat': options['repeat'],
+            'cache': options['with_cache'],
+            'routes': routes,
+        }
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+        regressions = []
+        if options['compare']:
+            previous = json.loads(Path(options['compare']).read_text(encoding='utf-8'))
+            regressions = compare(previous, results, options['threshold'])
+            results['regressions'] = regressions
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+        else:
+            self.print_table(results, regressions)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессий: {len(regressions)}.')
+
+    def plan(self):
+        ad = Ad.objects.order_by('-pk').first()
+        if ad is None:
+            raise CommandError('База пуста: сначала manage.py seed_bench.')
+        # Первые авторы и первые объявления по Ципфу самые активные.
+        busy = Ad.objects.order_by('pk').values_list('user_id', flat=True).first()
+        other = (User.objects.exclude(pk=ad.user_id).order_by('pk')
+                 .values_list('pk', flat=True).first())
+        waiting = (ExchangeProposal.objects.filter(status='waiting')
+                   .select_related('ad_receiver').order_by('-pk').first())
+        word, category = WORDS[0], CATEGORIES[0]
+
+        # proposal_events не замеряется: SSE-поток держит соединение до
+        # дедлайна, задержка запроса для него не имеет смысла.
+        cases = [
+            Case('ad_list', 'ad_list', reverse('ad_list')),
+            Case('ad_list?q', 'ad_list', f"{reverse('ad_list')}?q={quote(word)}"),
+            Case('ad_list?category', 'ad_list',
+                 f"{reverse('ad_list')}?category={quote(category)}"),
+            Case('ad_list?condition', 'ad_list', f"{reverse('ad_list')}?condition=new"),
+            Case('ad_list?category&condition', 'ad_list',
+                 f"{reverse('ad_list')}?category={quote(category)}&condition=used"),
+            Case('ad_list?page=2', 'ad_list', f"{reverse('ad_list')}?page=2"),
+            Case('ad_detail', 'ad_detail', reverse('ad_detail', args=[ad.pk])),
+            Case('ad_create', 'ad_create', reverse('ad_create'), ad.user_id),
+            Case('ad_update', 'ad_update', reverse('ad_update', args=[ad.pk]), ad.user_id),
+            Case('ad_delete', 'ad_delete', reverse('ad_delete', args=[ad.pk]), ad.user_id),
+            Case('login', 'login', reverse('login')),
+            Case('signup', 'signup', reverse('signup')),
+            Case('logout', 'logout', reverse('logout'), busy, expect=302),
+            Case('api/ads', 'ad-list', '/api/ads/'),
+            Case('api/ads?category', 'ad-list', f'/api/ads/?category={quote(category)}'),
+            Case('api/ads?search', 'ad-list', f'/api/ads/?search={quote(word)}'),
+            Case('api/ads/{id}', 'ad-detail', f'/api/ads/{ad.pk}/'),
+            Case('api/ads/facets', 'ad-facets', '/api/ads/facets/'),
+            Case('api/ads/{id}/similar', 'ad-similar', f'/api/ads/{ad.pk}/similar/'),
+            Case('api/proposals', 'exchangeproposal-list', '/api/proposals/', busy),
+            Case('api/cycles', 'cycle-list', '/api/cycles/', busy),
+            Case('api/archive/proposals', 'archivedproposal-list',
+                 '/api/archive/proposals/', busy),
+            Case('api/async/ads', 'async_ad_list', reverse('async_ad_list')),
+            Case('api/async/ads/{id}', 'async_ad_detail',
+                 reverse('async_ad_detail', args=[ad.pk])),
+            Case('api/async/proposals', 'async_my_proposals',
+                 reverse('async_my_proposals'), busy),
+            Case('proposal_events_poll', 'proposal_events_poll',
+                 f"{reverse('proposal_events_poll')}?since=0&timeout=0", busy),
+            Case('metrics', 'metrics', reverse('metrics')),
+        ]
+        if other is not None:
+            cases.append(Case('proposal_create', 'proposal_create',
+                              reverse('proposal_create', args=[ad.pk]), other))
+        for view_type in ('all', 'sent', 'received'):
+            cases.append(Case(f'proposal_list?type={view_type}', 'proposal_list',
+                              f"{reverse('proposal_list')}?type={view_type}", busy))
+        if waiting is not None:
+            receiver = waiting.ad_receiver.user_id
+            cases += [
+                Case('proposal_detail', 'proposal_detail',
+                     reverse('proposal_detail', args=[waiting.pk]), receiver),
+                Case('proposal_update_status', 'proposal_update_status',
+                     reverse('proposal_update_status', args=[waiting.pk, 'reject']),
+                     receiver, method='post', expect=302, rollback=True),
+            ]
+        image = AdImage.objects.filter(status='ready').first()
+        if image is not None:
+            cases.append(Case('ad_image', 'ad_image', image.thumbnail_url))
+        return cases
+
+    def measure(self, case, options):
+        client = Client()
+        if case.user is not None:
+            client.force_login(User.objects.get(pk=case.user))
+        send = getattr(client, case.method)
+
+        def call():
+            with ExitStack() as stack:
+                if case.rollback:
+                    stack.enter_context(transaction.atomic())
+                response = send(case.path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                if case.rollback:
+                    transaction.set_rollback(True)
+            return response.status_code
+
+        for _ in range(options['warmup']):
+            call()
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connection))
+                        for connection in connections.all()]
+            status = call()
+        queries = sum(len(c.captured_queries) for c in captured)
+
+        samples, errors = [], 0
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            errors += call() != case.expect
+            samples.append(time.perf_counter() - started)
+        elapsed = sum(samples)
+        return {
+            'route': case.route, 'method': case.method.upper(), 'path': case.path,
+            'status': status, 'errors': errors, 'queries': queries,
+            'rps': len(samples) / elapsed if elapsed else 0.0,
+            **summary(samples),
+        }
+
+    def print_table(self, results, regressions):
+        rows = results['rows']
+        self.stdout.write(
+            f"{results['database']}: {rows['users']} пользователей, {rows['ads']} "
+            f"объявлений, {rows['proposals']} предложений; коммит "
+            f"{results['commit'] or '?'}")
+        for name, stats in results['routes'].items():
+            line = (f"  {name:<30} {stats['status']} q={stats['queries']:<3} "
+                    f"{stats['rps']:>8.0f} req/s p50={stats['p50_ms']:.2f}ms "
+                    f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms")
+            if stats['errors']:
+                line += f" ошибок={stats['errors']}"
+            self.stdout.write(line)
+        for row in regressions:
+            self.stdout.write(self.style.WARNING(
+                f"  регрессия {row['name']}: p95 {row['p95_before_ms']:.2f} → "
+                f"{row['p95_ms']:.2f}ms, запросов {row['queries_before']} → "
+                f"{row['queries']}"))
+
+
+def compare(previous, current, threshold):
+    """Маршруты, где вырос p95 (больше чем в threshold раз) или число запросов."""
+    regressions = []
+    for name, now in current['routes'].items():
+        before = previous.get('routes', {}).get(name)
+        if before is None:
+            continue
+        slower = before['p95_ms'] and now['p95_ms'] / before['p95_ms'] > threshold
+        if slower or now['queries'] > before['queries']:
+            regressions.append({
+                'name': name, 'p95_before_ms': before['p95_ms'],
+                'p95_ms': now['p95_ms'], 'queries_before': before['queries'],
+                'queries': now['queries'],
+            })
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
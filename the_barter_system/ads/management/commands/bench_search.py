@@ -0,0 +1,69 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ads.bench import CATEGORIES, make_rng, random_text, summary, timed, WORDS
+from ads.models import Ad
+from ads.search import IContainsBackend, get_search_backend
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает полнотекстовый поиск с icontains на синтетических '
+            'объявлениях. Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ads', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            results = self.run(options)
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+        for query, row in results['queries'].items():
+            self.stdout.write(f'q={query!r}')
+            for name, stats in row.items():
+                self.stdout.write(
+                    f"  {name:<24} p50={stats['p50_ms']:.2f}ms "
+                    f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms")
+
+    def run(self, options):
+        rng = make_rng(options['seed'])
+        owner = User.objects.create(username='__bench_search__')
+        ads = [
+            Ad(user=owner, title=random_text(rng, 3),
+               description=random_text(rng, 30),
+               category=rng.choice(CATEGORIES), condition='used')
+            for _ in range(options['ads'])
+        ]
+        Ad.objects.bulk_create(ads, batch_size=1000)
+
+        backend = get_search_backend()
+        backend.rebuild()
+        baseline = IContainsBackend()
+        base_qs = Ad.objects.order_by('-created_at', '-id')
+        limit = options['page_size']
+
+        queries = [WORDS[0], WORDS[5] + ' ' + WORDS[20], 'несуществующее']
+        results = {'ads': options['ads'], 'backend': type(backend).__name__,
+                   'queries': {}}
+        for query in queries:
+            results['queries'][query] = {
+                'icontains': summary(timed(
+                    lambda: list(baseline.search(base_qs, query)[:limit]),
+                    options['repeat'])),
+                type(backend).__name__: summary(timed(
+                    lambda: list(backend.search(base_qs, query)[:limit]),
+                    options['repeat'])),
+            }
+        return results
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ads import similarity
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие объявления (TF-IDF). По умолчанию — только '
+            'для изменённых с прошлого запуска; --full пересчитывает всё.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Строк матрицы сходства за один шаг.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run = similarity.build if options['full'] else similarity.refresh
+        record = run(options['database'], options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        kind = 'полный' if record.full else 'частичный'
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчёт {kind}: обновлено списков {record.updated} '
+            f'из {record.ads} за {elapsed:.1f} с.'))
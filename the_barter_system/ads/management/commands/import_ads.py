@@ -0,0 +1,177 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ads.forms import AdForm
+from ads.models import Ad, ImportCheckpoint
+from ads.services import bulk_create_ads
+
+User = get_user_model()
+
+FIELDS = AdForm._meta.fields
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт объявлений из CSV или JSONL: проверка по '
+            'правилам AdForm, вставка пачками, продолжение с контрольной точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True,
+                            help='Владелец импортируемых объявлений.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='По умолчанию определяется по расширению.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить с сохранённой контрольной точки.')
+        parser.add_argument('--rejects',
+                            help='Файл JSONL для отклонённых строк.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path']).resolve()
+        if not path.is_file():
+            raise CommandError(f'Файл не найден: {path}')
+        fmt = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+        try:
+            owner = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден.")
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=str(path))
+        if not options['resume']:
+            checkpoint.offset = checkpoint.line = 0
+            checkpoint.inserted = checkpoint.rejected = 0
+            checkpoint.save()
+        elif checkpoint.line:
+            self.stdout.write(f'Продолжение со строки {checkpoint.line + 1}.')
+
+        rejects = (open(options['rejects'], 'a' if options['resume'] else 'w',
+                        encoding='utf-8')
+                   if options['rejects'] else None)
+        started = time.perf_counter()
+        processed = 0
+        try:
+            with open(path, 'rb') as stream:
+                rows = read_rows(stream, fmt, checkpoint.offset, checkpoint.line)
+                for batch in batched(validate_rows(rows, owner), options['batch_size']):
+                    self.write_batch(batch, checkpoint, rejects)
+                    processed += len(batch)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(self.progress(checkpoint, processed, started))
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            self.progress(checkpoint, processed, started)))
+
+    def write_batch(self, batch, checkpoint, rejects):
+        ads = [row.ad for row in batch if row.ad is not None]
+        failed = [row for row in batch if row.ad is None]
+        with transaction.atomic():
+            bulk_create_ads(ads)
+            # Контрольная точка фиксируется в той же транзакции, что и
+            # пачка: после сбоя строки не задвоятся и не потеряются.
+            checkpoint.offset = batch[-1].offset
+            checkpoint.line = batch[-1].last_line
+            checkpoint.inserted += len(ads)
+            checkpoint.rejected += len(failed)
+            checkpoint.save()
+        if rejects:
+            for row in failed:
+                rejects.write(json.dumps(
+                    {'line': row.line, 'errors': row.errors, 'row': row.data},
+                    ensure_ascii=False) + '\n')
+            rejects.flush()
+
+    def progress(self, checkpoint, processed, started):
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0.0
+        return (f'Строк: {checkpoint.line}, добавлено: {checkpoint.inserted}, '
+                f'отклонено: {checkpoint.rejected}, '
+                f'{rate:.0f} строк/с за {elapsed:.1f} с.')
+
+
+class ImportRow(NamedTuple):
+    line: int
+    data: dict
+    offset: int
+    last_line: int
+    ad: Optional[Ad] = None
+    errors: Optional[dict] = None
+
+
+def tracked_lines(stream):
+    """Строки файла и байтовое смещение конца каждой из них."""
+    for raw in stream:
+        yield raw.decode('utf-8').lstrip('\ufeff'), stream.tell()
+
+
+def read_rows(stream, fmt, offset=0, line=0):
+    """ImportRow без проверки для каждой записи, начиная с offset."""
+    if fmt == 'jsonl':
+        stream.seek(offset)
+        for text, end in tracked_lines(stream):
+            line += 1
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+            except ValueError as exc:
+                yield ImportRow(line, {'raw': text.rstrip()}, end, line,
+                                errors={'__all__': [f'Некорректный JSON: {exc}']})
+                continue
+            yield ImportRow(line, data, end, line)
+        return
+
+    stream.seek(0)
+    header_text, header_end = next(tracked_lines(stream))
+    header = next(csv.reader([header_text]))
+    stream.seek(max(offset, header_end))
+    line = line or 1
+    position = {'end': stream.tell()}
+
+    def lines():
+        for text, end in tracked_lines(stream):
+            position['end'] = end
+            yield text
+
+    # csv.reader забирает строки по одной без упреждения, поэтому после
+    # каждой записи position['end'] указывает точно на её конец, а
+    # line_num — на последнюю физическую строку записи.
+    reader = csv.reader(lines())
+    base = line
+    for values in reader:
+        start, line = line + 1, base + reader.line_num
+        if any(values):
+            yield ImportRow(start, dict(zip(header, values)),
+                            position['end'], line)
+
+
+def validate_rows(rows, owner):
+    """Проверка каждой записи через AdForm; ошибки не прерывают импорт."""
+    for row in rows:
+        if row.errors:
+            yield row
+            continue
+        data = row.data if isinstance(row.data, dict) else {}
+        form = AdForm(data={name: data.get(name) or '' for name in FIELDS})
+        if form.is_valid():
+            ad = form.save(commit=False)
+            ad.user = owner
+            yield row._replace(ad=ad)
+        else:
+            yield row._replace(errors=form.errors.get_json_data())
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
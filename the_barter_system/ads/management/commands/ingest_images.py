@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ads import images
+from ads.models import Ad, AdImage
+
+
+class Command(BaseCommand):
+    help = ('Скачивает картинки объявлений из очереди в хранилище и строит '
+            'миниатюры в пуле потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--limit', type=int,
+                            help='Не больше стольких картинок за запуск.')
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help='Сначала поставить в очередь объявления с '
+                                 'image_url, которых в ней ещё нет.')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Вернуть в очередь картинки с ошибкой.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if options['enqueue_missing']:
+            missing = (Ad.objects.using(using).exclude(image_url__isnull=True)
+                       .exclude(image_url='').filter(stored_image__isnull=True)
+                       .only('id', 'image_url'))
+            images.enqueue(missing.iterator(chunk_size=1000), using)
+        if options['retry_failed']:
+            AdImage.objects.using(using).filter(status='failed').update(
+                status='pending', attempts=0)
+
+        started = time.perf_counter()
+        ready, failed = images.process_pending(
+            options['limit'], options['workers'], options['max_attempts'], using)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {ready}, ошибок: {failed} за {elapsed:.1f} с.'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ads import purge
+
+
+class Command(BaseCommand):
+    help = ('Окончательно удаляет мягко удалённые объявления и их предложения '
+            'пачками. Прерванный запуск можно просто повторить.')
+
+    def add_arguments(self, parser):
+        options = purge.get_options()
+        parser.add_argument('--limit', type=int,
+                            help='Не больше стольких объявлений за запуск.')
+        parser.add_argument('--batch-size', type=int, default=options['batch_size'])
+        parser.add_argument('--pause', type=float, default=options['pause'],
+                            help='Секунд между пачками.')
+        parser.add_argument('--status', action='store_true',
+                            help='Только показать очередь и прогресс.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if options['status']:
+            queue = list(purge.pending(using))
+            for row in queue:
+                total = '?' if row.proposals_total is None else row.proposals_total
+                self.stdout.write(
+                    f'  объявление {row.ad_id}: предложений удалено '
+                    f'{row.proposals_deleted} из {total}, с {row.requested_at:%Y-%m-%d %H:%M}')
+            self.stdout.write(f'В очереди: {len(queue)}.')
+            return
+
+        started = time.perf_counter()
+        done = purge.process_pending(options['limit'], options['batch_size'],
+                                     options['pause'], using)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено объявлений: {done} за {elapsed:.1f} с.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ads import facets
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики категорий объявлений с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        facets.rebuild(options['database'])
+        total = sum(f['count'] for f in facets.get_facets(options['database']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: {total} объявлений.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ads.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс объявлений.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересобран ({type(backend).__name__}).'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ads import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики предложений объявлений по самим '
+            'предложениям (включая архив) и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Объявлений в одной транзакции.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fixed = counters.reconcile(options['batch_size'], options['database'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено объявлений: {fixed} за {elapsed:.1f} с.'))
@@ -0,0 +1,153 @@
+import json
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from ads import cache, counters, facets
+from ads.bench import CATEGORIES, make_rng, random_text, zipf_cum_weights
+from ads.models import Ad, ExchangeProposal
+from ads.search import get_search_backend
+
+User = get_user_model()
+
+# Доли по убыванию: большинство предложений ещё ждут ответа.
+STATUS_WEIGHTS = {'waiting': 0.6, 'rejected': 0.3, 'accepted': 0.1}
+CONDITION_WEIGHTS = {'used': 0.7, 'new': 0.3}
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных замеров: '
+            'пользователи, объявления и предложения с перекосом по авторам, '
+            'категориям и статусам. Данные остаются в базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--ads', type=int, default=1000000)
+        parser.add_argument('--proposals', type=int, default=5000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='bench',
+                            help='Префикс имён пользователей.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        prefix = options['prefix']
+        if options['users'] < 2 and options['proposals']:
+            raise CommandError('Для предложений нужно хотя бы два пользователя.')
+        if User.objects.using(using).filter(username__startswith=prefix + '_').exists():
+            raise CommandError(f'Пользователи {prefix}_* уже есть: '
+                               f'выберите другой --prefix.')
+
+        self.rng = make_rng(options['seed'])
+        self.options = options
+        timings = {}
+        started = time.perf_counter()
+        user_ids = self.stage('users', timings, self.create_users)
+        ads = self.stage('ads', timings, self.create_ads, user_ids)
+        proposals = self.stage('proposals', timings, self.create_proposals, ads)
+        self.stage('indexes', timings, self.rebuild_derived)
+        results = {
+            'users': len(user_ids), 'ads': len(ads[0]),
+            'proposals': proposals, 'seed': options['seed'],
+            'seconds': timings, 'total_s': time.perf_counter() - started,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: {results['users']} пользователей, {results['ads']} "
+            f"объявлений, {results['proposals']} предложений за "
+            f"{results['total_s']:.1f} с."))
+
+    def stage(self, name, timings, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - started
+        if self.options['verbosity'] > 1:
+            self.stdout.write(f'{name}: {timings[name]:.1f} с')
+        return result
+
+    def batches(self, total, make):
+        """Вставка пачками по batch_size, каждая в своей транзакции."""
+        size = self.options['batch_size']
+        using = self.options['database']
+        for start in range(0, total, size):
+            rows = [make(i) for i in range(start, min(total, start + size))]
+            with transaction.atomic(using=using):
+                yield type(rows[0]).objects.using(using).bulk_create(rows)
+
+    def create_users(self):
+        # Хэш считается один раз: входить под этими пользователями не нужно.
+        password = make_password(None)
+        prefix = self.options['prefix']
+        ids = []
+        for created in self.batches(
+                self.options['users'],
+                lambda i: User(username=f'{prefix}_{i}', password=password)):
+            ids.extend(user.pk for user in created)
+        return ids
+
+    def create_ads(self, user_ids):
+        """Активность авторов и популярность категорий — по Ципфу."""
+        rng = self.rng
+        user_weights = zipf_cum_weights(len(user_ids), skew=1.1)
+        category_weights = zipf_cum_weights(len(CATEGORIES))
+        conditions = list(CONDITION_WEIGHTS)
+        condition_weights = list(accumulate(CONDITION_WEIGHTS.values()))
+
+        def make(i):
+            return Ad(
+                user_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+                title=random_text(rng, 3), description=random_text(rng, 20),
+                category=rng.choices(CATEGORIES, cum_weights=category_weights)[0],
+                condition=rng.choices(conditions, cum_weights=condition_weights)[0])
+
+        ids, owners = [], []
+        for created in self.batches(self.options['ads'], make):
+            ids.extend(ad.pk for ad in created)
+            owners.extend(ad.user_id for ad in created)
+        return ids, owners
+
+    def create_proposals(self, ads):
+        """Отправитель — любое объявление, получатель чаще популярный."""
+        ids, owners = ads
+        if len(set(owners)) < 2:
+            return 0
+        rng = self.rng
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(accumulate(STATUS_WEIGHTS.values()))
+        n = len(ids)
+
+        def pick_pair():
+            while True:
+                sender = rng.randrange(n)
+                receiver = (min(n - 1, int(rng.paretovariate(1.2)) - 1)
+                            if rng.random() < 0.3 else rng.randrange(n))
+                if owners[sender] != owners[receiver]:
+                    return ids[sender], ids[receiver]
+
+        def make(i):
+            sender, receiver = pick_pair()
+            return ExchangeProposal(
+                ad_sender_id=sender, ad_receiver_id=receiver,
+                status=rng.choices(statuses, cum_weights=status_weights)[0])
+
+        return sum(len(created) for created in
+                   self.batches(self.options['proposals'], make))
+
+    def rebuild_derived(self):
+        """bulk_create обходит сигналы: индексы и счётчики — целиком."""
+        using = self.options['database']
+        facets.rebuild(using)
+        counters.reconcile(self.options['batch_size'], using)
+        get_search_backend(using).rebuild()
+        cache.bump([cache.GLOBAL])
+        # Свежая статистика, иначе планировщик оценивает таблицы как пустые.
+        with connections[using].cursor() as cursor:
+            cursor.execute('ANALYZE')
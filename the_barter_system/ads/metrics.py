@@ -0,0 +1,155 @@
+import hmac
+import ipaddress
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess,
+)
+
+# Несколько процессов (gunicorn, uvicorn --workers) пишут значения в
+# mmap-файлы каталога PROMETHEUS_MULTIPROC_DIR, /metrics суммирует их.
+# Переменная должна быть задана до запуска процессов.
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_LATENCY = Histogram(
+    'barter_request_duration_seconds', 'Время ответа по имени маршрута.',
+    ['view', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter(
+    'barter_responses', 'Ответы по маршруту и коду статуса.',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'barter_request_db_queries', 'Число SQL-запросов на один HTTP-запрос.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+PAGE_CACHE = Counter(
+    'barter_page_cache', 'Обращения к кэшу ответов: hit или miss.',
+    ['prefix', 'result'],
+)
+THROTTLED = Counter(
+    'barter_throttled', 'Запросы, отклонённые лимитом (429).',
+    ['scope'],
+)
+PROPOSALS = Counter(
+    'barter_proposals', 'События предложений обмена после COMMIT.',
+    ['event'],
+)
+
+_queries = ContextVar('ads_metrics_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def instrument(connection, **kwargs):
+    # Как в ads.profiling: соединение живёт в своём потоке, поэтому
+    # обёртка ставится при создании, а счётчик запроса берётся из ContextVar.
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, коды статусов и число SQL-запросов по имени маршрута
+    (ad_list, ad-list, ...). Имя, а не путь: иначе у метрик было бы по
+    метке на каждое объявление. При ADS_METRICS = False не подключается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ADS_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(instrument, dispatch_uid='ads_metrics')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():
+            instrument(connection)
+        counter, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        return self.finish(request, response, counter, started)
+
+    async def __acall__(self, request):
+        counter, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        return self.finish(request, response, counter, started)
+
+    def start(self):
+        counter = [0]
+        return counter, _queries.set(counter), time.perf_counter()
+
+    def finish(self, request, response, counter, started):
+        elapsed = time.perf_counter() - started
+        view = view_label(request)
+        REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        RESPONSES.labels(view, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(view).observe(counter[0])
+        return response
+
+
+def collect():
+    """Текст для Prometheus: сумма по процессам или реестр этого процесса."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def is_allowed(request):
+    """
+    Пустить сборщик: адрес из ADS_METRICS_ALLOWED_IPS (адреса или сети)
+    или заголовок Authorization: Bearer ADS_METRICS_TOKEN. Адрес берётся из
+    REMOTE_ADDR: X-Forwarded-For подделывается клиентом.
+    """
+    token = getattr(settings, 'ADS_METRICS_TOKEN', None)
+    if token:
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(given.encode(), token.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in getattr(settings, 'ADS_METRICS_ALLOWED_IPS', ()))
+
+
+def metrics_view(request):
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(collect(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_facets(apps, schema_editor):
+    Ad = apps.get_model('ads', 'Ad')
+    CategoryFacet = apps.get_model('ads', 'CategoryFacet')
+    db = schema_editor.connection.alias
+    rows = (Ad.objects.using(db).order_by()
+            .values('category', 'condition').annotate(n=Count('id')))
+    CategoryFacet.objects.using(db).bulk_create(
+        CategoryFacet(category=row['category'], condition=row['condition'],
+                      count=row['n'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0002_ad_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('condition', models.CharField(choices=[('new', 'Новый'), ('used', 'Б/У')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'condition'), name='unique_category_facet')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
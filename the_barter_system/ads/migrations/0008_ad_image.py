@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0007_similar_ads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdImage',
+            fields=[
+                ('ad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stored_image', serialize=False, to='ads.ad')),
+                ('source_url', models.URLField()),
+                ('status', models.CharField(choices=[('pending', 'Ожидает загрузки'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10)),
+                ('digest', models.CharField(blank=True, max_length=64)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('widths', models.JSONField(default=list)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['ad'], name='adimage_pending_idx')],
+            },
+        ),
+    ]
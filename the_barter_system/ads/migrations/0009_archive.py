@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0008_ad_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchangeproposal',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedAd',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('image_url', models.URLField(blank=True, null=True)),
+                ('category', models.CharField(max_length=100)),
+                ('condition', models.CharField(choices=[('new', 'Новый'), ('used', 'Б/У')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='archivedad_user_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedProposal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ad_sender', models.BigIntegerField()),
+                ('ad_receiver', models.BigIntegerField()),
+                ('ad_sender_title', models.CharField(max_length=200)),
+                ('ad_receiver_title', models.CharField(max_length=200)),
+                ('comment', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('waiting', 'Ожидает'), ('accepted', 'Принята'), ('rejected', 'Отклонена')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+                ('receiver_user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('sender_user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sender_user', '-created_at', '-id'], name='archivedprop_sender_idx'), models.Index(fields=['receiver_user', '-created_at', '-id'], name='archivedprop_receiver_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AdPurge',
+            fields=[
+                ('ad_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('requested_at', models.DateTimeField()),
+                ('proposals_total', models.PositiveIntegerField(blank=True, null=True)),
+                ('proposals_deleted', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('finished_at__isnull', True)), fields=['requested_at'], name='adpurge_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:43
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Ad = apps.get_model('ads', 'Ad')
+    ExchangeProposal = apps.get_model('ads', 'ExchangeProposal')
+    ArchivedProposal = apps.get_model('ads', 'ArchivedProposal')
+    db = schema_editor.connection.alias
+
+    def counted(model, field, **filters):
+        rows = (model.objects.using(db).filter(**{field: OuterRef('pk')}, **filters)
+                .order_by().values(field).annotate(n=Count('pk')).values('n'))
+        return Coalesce(Subquery(rows), 0)
+
+    Ad.objects.using(db).update(
+        proposals_received_count=(counted(ExchangeProposal, 'ad_receiver')
+                                  + counted(ArchivedProposal, 'ad_receiver')),
+        proposals_waiting_count=counted(ExchangeProposal, 'ad_receiver',
+                                        status='waiting'),
+        proposals_sent_count=(counted(ExchangeProposal, 'ad_sender')
+                              + counted(ArchivedProposal, 'ad_sender')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0010_ad_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='proposals_received_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='proposals_sent_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='proposals_waiting_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['-proposals_received_count', '-created_at', '-id'], name='ad_received_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedproposal',
+            index=models.Index(fields=['ad_sender'], name='archivedprop_ad_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedproposal',
+            index=models.Index(fields=['ad_receiver'], name='archivedprop_ad_receiver_idx'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,21 @@ from django.urls import reverse
 User = get_user_model()
 
 
+class AdManager(models.Manager):
+    """Удалённые объявления (deleted_at) ждут purge_ads и нигде не видны."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class ProposalManager(models.Manager):
+    """Предложения с удалёнными объявлениями скрыты вместе с ними."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ad_sender__deleted_at__isnull=True,
+                                             ad_receiver__deleted_at__isnull=True)
+
+
 class Ad(models.Model):
     CONDITION_CHOICES = [
         ("new", "Новый"),
@@ -14,7 +29,8 @@ class Ad(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name="ads"
+        related_name="ads",
+        db_index=False
     )
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -25,6 +41,48 @@ class Ad(models.Model):
         choices=CONDITION_CHOICES
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # auto_now не срабатывает в QuerySet.update() и bulk_update(): там
+    # updated_at выставляется явно (см. services).
+    updated_at = models.DateTimeField(auto_now=True)
+    # Мягкое удаление (services.delete_ads): строка и её предложения
+    # удаляются позже, пачками, командой purge_ads.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Денормализованные счётчики предложений (см. ads.counters): меняются
+    # атомарным F() вместе с предложениями, reconcile_counters чинит
+    # расхождения. Архивные предложения тоже учитываются.
+    proposals_received_count = models.PositiveIntegerField(default=0)
+    proposals_waiting_count = models.PositiveIntegerField(default=0)
+    proposals_sent_count = models.PositiveIntegerField(default=0)
+
+    objects = AdManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # FK на пользователя покрыт ad_user_created_idx, отдельный индекс
+        # не нужен.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='ad_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'],
+                         name='ad_category_created_idx'),
+            models.Index(fields=['condition', '-created_at', '-id'],
+                         name='ad_condition_created_idx'),
+            models.Index(fields=['category', 'condition', '-created_at', '-id'],
+                         name='ad_cat_cond_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='ad_user_created_idx'),
+            # ?ordering=-proposals_received_count: курсор дополняет ключ
+            # до (count, created_at, id).
+            models.Index(fields=['-proposals_received_count', '-created_at', '-id'],
+                         name='ad_received_count_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения на момент загрузки: по ним сигналы считают, что изменилось.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return f"{self.title} ({self.get_condition_display()})"
@@ -32,6 +90,141 @@ class Ad(models.Model):
     def get_absolute_url(self):
         return reverse('ad_detail', kwargs={'pk': self.pk})
 
+    @property
+    def ready_image(self):
+        """Локальная копия картинки, если она уже обработана."""
+        # Без строки AdImage обращение к связи бросает AttributeError.
+        image = getattr(self, 'stored_image', None)
+        return image if image is not None and image.status == 'ready' else None
+
+
+class AdImage(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Ожидает загрузки"),
+        ("ready", "Готово"),
+        ("failed", "Ошибка"),
+    ]
+
+    ad = models.OneToOneField(
+        Ad,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stored_image"
+    )
+    source_url = models.URLField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default="pending"
+    )
+    # SHA-256 исходного файла: файлы лежат по содержимому и не меняются.
+    digest = models.CharField(max_length=64, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    widths = models.JSONField(default=list)
+    error = models.CharField(max_length=500, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ad'], condition=models.Q(status='pending'),
+                         name='adimage_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ad_id}: {self.get_status_display()}"
+
+    def url(self, width):
+        return reverse('ad_image', kwargs={'digest': self.digest, 'width': width})
+
+    @property
+    def thumbnail_url(self):
+        return self.url(self.widths[0])
+
+    @property
+    def display_url(self):
+        return self.url(self.widths[-1])
+
+    @property
+    def srcset(self):
+        return ', '.join(f'{self.url(width)} {width}w' for width in self.widths)
+
+
+class CategoryFacet(models.Model):
+    category = models.CharField(max_length=100)
+    condition = models.CharField(
+        max_length=10,
+        choices=Ad.CONDITION_CHOICES
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'condition'],
+                name='unique_category_facet'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category} / {self.condition}: {self.count}"
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField(max_length=500, unique=True)
+    offset = models.BigIntegerField(default=0)
+    line = models.PositiveIntegerField(default=0)
+    inserted = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.line}"
+
+
+class SimilarAd(models.Model):
+    """
+    Предрассчитанные похожие объявления: до K строк на объявление.
+    Выборка для страницы — один проход по индексу (ad, rank).
+    """
+    ad = models.ForeignKey(
+        Ad,
+        on_delete=models.CASCADE,
+        related_name="similar_ads",
+        db_index=False
+    )
+    rank = models.PositiveSmallIntegerField()
+    similar = models.ForeignKey(
+        Ad,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    score = models.FloatField()
+
+    class Meta:
+        # FK на объявление покрыт unique_similar_rank.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ad', 'rank'],
+                name='unique_similar_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ad_id} -> {self.similar_id}: {self.score:.3f}"
+
+
+class SimilarityBuild(models.Model):
+    """Запуск пересчёта похожих; started_at — граница для следующего."""
+    started_at = models.DateTimeField()
+    full = models.BooleanField(default=False)
+    ads = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.started_at}: {self.updated}/{self.ads}"
+
 
 class ExchangeProposal(models.Model):
     STATUS_CHOICES = [
@@ -43,12 +236,14 @@ class ExchangeProposal(models.Model):
     ad_sender = models.ForeignKey(
         Ad,
         on_delete=models.CASCADE,
-        related_name="proposals_sent"
+        related_name="proposals_sent",
+        db_index=False
     )
     ad_receiver = models.ForeignKey(
         Ad,
         on_delete=models.CASCADE,
-        related_name="proposals_received"
+        related_name="proposals_received",
+        db_index=False
     )
     comment = models.TextField(blank=True)
     status = models.CharField(
@@ -57,6 +252,133 @@ class ExchangeProposal(models.Model):
         default="waiting"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Когда предложение приняли или отклонили; у закрытых до появления
+    # поля — NULL, для архивации их возраст считается от created_at.
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ProposalManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # FK на объявления покрыты составными индексами *_created_idx.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='proposal_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'],
+                         name='proposal_status_created_idx'),
+            models.Index(fields=['ad_sender', '-created_at', '-id'],
+                         name='proposal_sender_created_idx'),
+            models.Index(fields=['ad_receiver', '-created_at', '-id'],
+                         name='proposal_receiver_created_idx'),
+        ]
 
     def __str__(self):
         return f"Proposal from {self.ad_sender_id} to {self.ad_receiver_id}: {self.get_status_display()}"
+
+
+class AdPurge(models.Model):
+    """
+    Удаление объявления в фоне: purge_ads удаляет предложения пачками и
+    записывает прогресс в той же транзакции, поэтому прерванный запуск
+    продолжается с места остановки. Строка остаётся после удаления Ad.
+    """
+    ad_id = models.BigIntegerField(primary_key=True)
+    requested_at = models.DateTimeField()
+    # Считается при первом проходе, а не в запросе на удаление.
+    proposals_total = models.PositiveIntegerField(null=True, blank=True)
+    proposals_deleted = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['requested_at'],
+                         condition=models.Q(finished_at__isnull=True),
+                         name='adpurge_pending_idx'),
+        ]
+
+    def __str__(self):
+        total = '?' if self.proposals_total is None else self.proposals_total
+        return f"{self.ad_id}: {self.proposals_deleted}/{total}"
+
+
+class ArchivedAd(models.Model):
+    """
+    Объявление, перенесённое из Ad командой archive; id сохраняется.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False
+    )
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    image_url = models.URLField(blank=True, null=True)
+    category = models.CharField(max_length=100)
+    condition = models.CharField(
+        max_length=10,
+        choices=Ad.CONDITION_CHOICES
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='archivedad_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.get_condition_display()})"
+
+
+class ArchivedProposal(models.Model):
+    """
+    Закрытое предложение, перенесённое из ExchangeProposal. Участники —
+    владельцы объявлений на момент архивации, как их видит список
+    предложений; названия сохранены, раз объявления тоже могут уйти в архив.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # id объявлений без внешнего ключа: объявление может быть и в Ad,
+    # и в ArchivedAd.
+    ad_sender = models.BigIntegerField()
+    ad_receiver = models.BigIntegerField()
+    ad_sender_title = models.CharField(max_length=200)
+    ad_receiver_title = models.CharField(max_length=200)
+    sender_user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False
+    )
+    receiver_user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False
+    )
+    comment = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=ExchangeProposal.STATUS_CHOICES
+    )
+    created_at = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender_user', '-created_at', '-id'],
+                         name='archivedprop_sender_idx'),
+            models.Index(fields=['receiver_user', '-created_at', '-id'],
+                         name='archivedprop_receiver_idx'),
+            # Для сверки счётчиков объявлений.
+            models.Index(fields=['ad_sender'], name='archivedprop_ad_sender_idx'),
+            models.Index(fields=['ad_receiver'], name='archivedprop_ad_receiver_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived proposal from {self.ad_sender} to {self.ad_receiver}: {self.get_status_display()}"
@@ -0,0 +1,268 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+DEFAULT_KEYSET_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder обрезает datetime до миллисекунд, а курсору нужна
+    # точная позиция, иначе строки с близким created_at потеряются.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def invert_ordering(ordering):
+    return tuple(f[1:] if f.startswith('-') else '-' + f for f in ordering)
+
+
+def match_keyset_ordering(order_by, ordering):
+    """
+    Ключевая сортировка, совместимая с order_by queryset'а, или None.
+    Подходит префикс ключа в прямом или обратном направлении:
+    ('-created_at',) дополняется до ('-created_at', '-id').
+    """
+    order_by = tuple(order_by)
+    for candidate in (tuple(ordering), invert_ordering(ordering)):
+        if order_by and candidate[:len(order_by)] == order_by:
+            return candidate
+    return None
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous,
+                 next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу сортировки (created_at, id) без OFFSET и
+    COUNT(*): каждая страница — это WHERE по позиции курсора и LIMIT
+    page_size + 1, поэтому её стоимость не зависит от глубины.
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_KEYSET_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [f.lstrip('-') for f in self.ordering]
+
+    def encode_cursor(self, obj, reverse=False):
+        position = [self._value(obj, name) for name in self.fields]
+        payload = json.dumps([position, reverse], default=_encode_value)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            position, reverse = json.loads(base64.urlsafe_b64decode(padded))
+            if len(position) != len(self.fields):
+                raise ValueError
+            opts = self.queryset.model._meta
+            values = [opts.get_field(name).to_python(value)
+                      for name, value in zip(self.fields, position)]
+        except (TypeError, ValueError, binascii.Error,
+                FieldDoesNotExist, ValidationError) as exc:
+            raise InvalidCursor(token) from exc
+        return values, bool(reverse)
+
+    def _value(self, obj, name):
+        attname = self.queryset.model._meta.get_field(name).attname
+        # Строки из values() — словари.
+        return obj[attname] if isinstance(obj, dict) else getattr(obj, attname)
+
+    def _after(self, ordering, values):
+        """WHERE для строк, идущих строго после позиции в данной сортировке."""
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], values)}
+            clauses.append(Q(**equal, **{name + lookup: values[i]}))
+        # Нестрогая граница по первому полю даёт СУБД диапазон для поиска
+        # по индексу; дизъюнкция ниже лишь отсекает строки на границе.
+        first = ordering[0]
+        bound = Q(**{first.lstrip('-') + ('__lte' if first.startswith('-')
+                                          else '__gte'): values[0]})
+        return bound & reduce(or_, clauses)
+
+    def page_queryset(self, cursor=None):
+        """Запрос страницы (LIMIT page_size + 1) и направление обхода."""
+        ordering, reverse = self.ordering, False
+        qs = self.queryset
+        if cursor:
+            values, reverse = self.decode_cursor(cursor)
+            if reverse:
+                ordering = invert_ordering(self.ordering)
+            qs = qs.filter(self._after(ordering, values))
+        return qs.order_by(*ordering)[:self.per_page + 1], reverse
+
+    def build_page(self, rows, cursor, reverse):
+        rows = list(rows)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        next_cursor = (self.encode_cursor(rows[-1])
+                       if has_next and rows else None)
+        previous_cursor = (self.encode_cursor(rows[0], reverse=True)
+                           if has_previous and rows else None)
+        return KeysetPage(rows, has_next, has_previous,
+                          next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        qs, reverse = self.page_queryset(cursor)
+        return self.build_page(qs, cursor, reverse)
+
+
+class KeysetPaginationMixin:
+    """
+    Курсорная пагинация для ListView. Смещение (?page=) остаётся доступным
+    явно, а также используется, когда сортировка не совпадает с ключом
+    (например, по релевантности поиска).
+    """
+    keyset_ordering = DEFAULT_KEYSET_ORDERING
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = match_keyset_ordering(queryset.query.order_by,
+                                         self.keyset_ordering)
+        if self.page_kwarg in self.request.GET or ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Неверный курсор.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class AdPagination(PageNumberPagination):
+    page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация для API с непрозрачными next/previous. Ключей
+    может быть несколько (keyset_orderings у view); ?page=N или сортировка
+    не по ключу переключают на offset_pagination_class.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    ordering = DEFAULT_KEYSET_ORDERING
+    offset_pagination_class = AdPagination
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset_paginator = None
+        orderings = getattr(view, 'keyset_orderings', None) or [self.ordering]
+        ordering = next(filter(None, (match_keyset_ordering(queryset.query.order_by, o)
+                                      for o in orderings)), None)
+        offset_class = self.offset_pagination_class
+        if offset_class.page_query_param in request.query_params or ordering is None:
+            self.offset_paginator = offset_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        paginator = KeysetPaginator(queryset, self.page_size, ordering)
+        try:
+            self.page = paginator.page(
+                request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page.object_list)
+
+    def get_validator_state(self):
+        """Всё, кроме строк страницы, что попадает в тело ответа (для ETag)."""
+        if self.offset_paginator is not None:
+            paginator = self.offset_paginator
+            return (paginator.page.paginator.count,
+                    paginator.get_next_link(), paginator.get_previous_link())
+        return (self.get_next_link(), self.get_previous_link())
+
+    def get_next_link(self):
+        if not self.page.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.page.next_cursor)
+
+    def get_previous_link(self):
+        if not self.page.previous_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы из next/previous.',
+                'schema': {'type': 'string'},
+            },
+            *self.offset_pagination_class().get_schema_operation_parameters(view),
+        ]
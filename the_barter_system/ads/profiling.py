@@ -0,0 +1,205 @@
+import cProfile
+import logging
+import random
+import re
+import sysconfig
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('ads.profiling')
+
+# Кадры из этих каталогов не показываем как источник запроса.
+_LIBRARY_PARTS = ('site-packages', 'dist-packages', sysconfig.get_paths()['stdlib'],
+                  str(Path(__file__)))
+# cProfile в одном процессе лучше запускать по одному: профили потоков
+# смешиваются, а с Python 3.12 второй профилировщик и вовсе не запустится.
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    __slots__ = ('started', 'slow_query', 'sql_count', 'sql_time',
+                 'render_started', 'render_time', 'serialize_time',
+                 'serialize_depth')
+
+    def __init__(self, slow_query):
+        self.started = time.perf_counter()
+        self.slow_query = slow_query
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;desc="{self.sql_count} SQL";dur={self.sql_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ]
+        return ', '.join(metrics)
+
+
+_profile = ContextVar('ads_request_profile', default=None)
+
+
+def get_options():
+    return {
+        'enabled': getattr(settings, 'ADS_PROFILING', False),
+        'slow_query_ms': getattr(settings, 'ADS_PROFILING_SLOW_QUERY_MS', 100),
+        'sample_rate': getattr(settings, 'ADS_PROFILING_SAMPLE_RATE', 0.0),
+        'directory': getattr(settings, 'ADS_PROFILING_DIR', None),
+    }
+
+
+def query_origin(limit=3):
+    """Ближайшие к запросу кадры кода проекта: файл:строка в функции."""
+    frames = [frame for frame in traceback.extract_stack()
+              if not any(part in frame.filename for part in _LIBRARY_PARTS)]
+    return ' <- '.join(f'{frame.filename}:{frame.lineno} in {frame.name}'
+                       for frame in reversed(frames[-limit:]))
+
+
+class SerializerTimingMixin:
+    """
+    Время to_representation для Server-Timing. Вложенные сериализаторы
+    не считаются повторно; без профиля запроса — одна проверка ContextVar.
+    """
+
+    def to_representation(self, instance):
+        profile = _profile.get()
+        if profile is None or profile.serialize_depth:
+            return super().to_representation(instance)
+        profile.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serialize_time += time.perf_counter() - started
+            profile.serialize_depth -= 1
+
+
+def track_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        profile.sql_count += 1
+        profile.sql_time += elapsed
+        if elapsed >= profile.slow_query:
+            logger.warning('Медленный запрос %.1f мс (%s): %s\n  %s',
+                           elapsed * 1000, context['connection'].alias,
+                           sql, query_origin())
+
+
+def instrument(connection, **kwargs):
+    # Соединения принадлежат потокам, а ORM асинхронных view работает в
+    # потоках sync_to_async, поэтому обёртка ставится на каждое соединение
+    # при создании и сама находит профиль запроса через ContextVar.
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_query)
+
+
+class ProfilingMiddleware:
+    """
+    SQL (число и время), отрисовка ответа и сериализация DRF в заголовке
+    Server-Timing; медленные запросы — в лог ads.profiling с местом вызова;
+    cProfile для доли ADS_PROFILING_SAMPLE_RATE запросов — в
+    ADS_PROFILING_DIR (под ASGI профилируется только поток цикла событий).
+    При ADS_PROFILING = False Django исключает middleware из цепочки, и
+    обёртки запросов не ставятся.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = get_options()
+        if not options['enabled']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_query = options['slow_query_ms'] / 1000
+        self.sample_rate = options['sample_rate']
+        self.directory = Path(options['directory'] or settings.BASE_DIR / 'profiles')
+        connection_created.connect(instrument, dispatch_uid='ads_profiling')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all():
+            instrument(connection)
+        profile, token, profiler = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        profile, token, profiler = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, profile, profiler)
+
+    def start(self):
+        profile = RequestProfile(self.slow_query)
+        token = _profile.set(profile)
+        return profile, token, self.start_profiler()
+
+    def stop(self, token, profiler):
+        _profile.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+
+    def finish(self, request, response, profile, profiler):
+        total = time.perf_counter() - profile.started
+        if profiler is not None:
+            self.dump(profiler, request, total)
+        response.headers['Server-Timing'] = profile.server_timing(total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Хуки идут снизу вверх по MIDDLEWARE, и этот, из начала списка,
+        # вызывается последним: сразу за ним ответ отрисовывается. Конец
+        # отрисовки отмечает post-render callback.
+        profile = _profile.get()
+        profile.render_started = time.perf_counter()
+        response.add_post_render_callback(lambda _: self.rendered(profile))
+        return response
+
+    def rendered(self, profile):
+        profile.render_time += time.perf_counter() - profile.render_started
+
+    def start_profiler(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        if not _profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def dump(self, profiler, request, total):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^\w-]+', '_', request.path).strip('_') or 'root'
+        name = (f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{slug[:60]}-'
+                f'{total * 1000:.0f}ms-{random.randrange(16 ** 4):04x}.prof')
+        profiler.dump_stats(self.directory / name)
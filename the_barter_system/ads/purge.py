@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Ad, AdPurge, ExchangeProposal
+
+
+def get_options():
+    return {
+        'batch_size': getattr(settings, 'ADS_PURGE_BATCH_SIZE', 1000),
+        'pause': getattr(settings, 'ADS_PURGE_PAUSE_SECONDS', 0),
+    }
+
+
+def pending(using='default'):
+    return (AdPurge.objects.using(using).filter(finished_at__isnull=True)
+            .order_by('requested_at', 'ad_id'))
+
+
+def purge_ad(purge, batch_size, pause=0, using='default'):
+    """
+    Удалить предложения объявления пачками по batch_size, затем само
+    объявление. Каждая пачка — своя транзакция вместе с прогрессом в
+    AdPurge, так что блокировки короткие, а после сбоя работа продолжается.
+    """
+    proposals = ExchangeProposal.all_objects.using(using).filter(
+        Q(ad_sender=purge.ad_id) | Q(ad_receiver=purge.ad_id))
+    if purge.proposals_total is None:
+        purge.proposals_total = proposals.count()
+        purge.save(update_fields=['proposals_total', 'updated_at'])
+    # Счётчики второй стороны уменьшил ещё delete_ads.
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(proposals.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted, _ = (ExchangeProposal.all_objects.using(using)
+                          .filter(pk__in=pks).delete())
+            AdPurge.objects.using(using).filter(pk=purge.pk).update(
+                proposals_deleted=F('proposals_deleted') + deleted,
+                updated_at=timezone.now())
+            purge.proposals_deleted += deleted
+        if pause:
+            time.sleep(pause)
+
+    with transaction.atomic(using=using):
+        # Через ORM: сигналы уберут объявление из поиска, каскад — картинку
+        # и списки похожих.
+        Ad.all_objects.using(using).filter(
+            pk=purge.ad_id, deleted_at__isnull=False).delete()
+        purge.finished_at = timezone.now()
+        purge.save(update_fields=['finished_at', 'updated_at'])
+
+
+def process_pending(limit=None, batch_size=None, pause=None, using='default'):
+    """Доудалить объявления из очереди; возвращает их число."""
+    options = get_options()
+    batch_size = batch_size or options['batch_size']
+    pause = options['pause'] if pause is None else pause
+    queue = pending(using)
+    if limit is not None:
+        queue = queue[:limit]
+    done = 0
+    for purge in list(queue):
+        purge_ad(purge, batch_size, pause, using)
+        done += 1
+    return done
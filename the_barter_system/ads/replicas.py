@@ -0,0 +1,116 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestState:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+_state = ContextVar('ads_replica_state', default=None)
+
+
+def read_replicas():
+    return list(getattr(settings, 'ADS_READ_REPLICAS', ()))
+
+
+class ReplicaRouter:
+    """
+    Чтение моделей ads с реплик — только в запросах, которые разрешил
+    ReplicaMiddleware; вне запроса (команды, shell) и внутри транзакции
+    всё читается с основной базы. Запись всегда идёт на основную и до
+    конца запроса возвращает на неё чтение.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = read_replicas()
+        if (state is None or not state.use_replica or not replicas
+                or model._meta.app_label != 'ads'
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *read_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Безопасные запросы к view с use_read_replica = True читают с реплик.
+    Если запрос что-то записал, ставится cookie primary_pin на
+    ADS_PRIMARY_STICKY_SECONDS: пока она жива, пользователь читает с
+    основной базы и видит свои изменения несмотря на отставание реплик.
+    Работает и в синхронном, и в асинхронном стеке без лишних переходов
+    между потоками.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = RequestState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(STICKY_COOKIE, '1',
+                                max_age=settings.ADS_PRIMARY_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.choose_database(request, view_func)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.choose_database(request, view_func)
+
+    def choose_database(self, request, view_func):
+        view = (getattr(view_func, 'cls', None)
+                or getattr(view_func, 'view_class', None) or view_func)
+        state = _state.get()
+        state.use_replica = (request.method in SAFE_METHODS
+                             and STICKY_COOKIE not in request.COOKIES
+                             and getattr(view, 'use_read_replica', False)
+                             and not state.wrote)
@@ -0,0 +1,183 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query or '')
+
+
+class BaseSearchBackend:
+    """Полнотекстовый поиск по заголовку и описанию объявлений."""
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def search(self, queryset, query):
+        """Отфильтровать queryset по запросу и отсортировать по релевантности."""
+        raise NotImplementedError
+
+    def index(self, ads):
+        pass
+
+    def remove(self, ad_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class IContainsBackend(BaseSearchBackend):
+    """Старый путь через LIKE '%q%' — для СУБД без полнотекстового индекса."""
+
+    def search(self, queryset, query):
+        q = query.strip()
+        if not q:
+            return queryset
+        return queryset.filter(
+            Q(title__icontains=q) |
+            Q(description__icontains=q)
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Виртуальная таблица FTS5 ads_ad_fts, rowid совпадает с ads_ad.id."""
+
+    table = 'ads_ad_fts'
+    # Вес совпадения в заголовке выше, чем в описании.
+    weights = (10.0, 1.0)
+
+    def match_expression(self, query):
+        tokens = tokenize(query)
+        return ' '.join('"%s"*' % token for token in tokens)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        table = queryset.model._meta.db_table
+        # JOIN, а не коррелированный подзапрос: иначе MATCH выполнялся бы
+        # заново для каждой найденной строки.
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = "{table}"."id"',
+                   f'{self.table} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({self.table}, %s, %s)'},
+            select_params=self.weights,
+        ).order_by('search_rank', '-created_at', '-id')
+
+    def index(self, ads):
+        rows = [(ad.pk, ad.title, ad.description) for ad in ads]
+        if not rows:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table}(rowid, title, description) '
+                'VALUES (%s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, ad_ids):
+        ad_ids = list(ad_ids)
+        if not ad_ids:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk in ad_ids],
+            )
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table}(rowid, title, description) '
+                'SELECT id, title, description FROM ads_ad'
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Таблица ads_ad_search с колонкой tsvector и GIN-индексом."""
+
+    table = 'ads_ad_search'
+    config = 'simple'
+    document_sql = (
+        "setweight(to_tsvector('{config}', %s), 'A') || "
+        "setweight(to_tsvector('{config}', %s), 'B')"
+    )
+
+    def tsquery(self, query):
+        tokens = tokenize(query)
+        return ' & '.join('%s:*' % token for token in tokens)
+
+    def search(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return queryset
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.ad_id = "{table}"."id"',
+                   f"{self.table}.document @@ to_tsquery('{self.config}', %s)"],
+            params=[tsquery],
+            select={'search_rank': f"ts_rank({self.table}.document, "
+                                   f"to_tsquery('{self.config}', %s))"},
+            select_params=[tsquery],
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    def index(self, ads):
+        rows = [(ad.pk, ad.title, ad.description) for ad in ads]
+        if not rows:
+            return
+        document = self.document_sql.format(config=self.config)
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table}(ad_id, document) '
+                f'VALUES (%s, {document}) '
+                'ON CONFLICT (ad_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove(self, ad_ids):
+        ad_ids = list(ad_ids)
+        if not ad_ids:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE ad_id = ANY(%s)', [ad_ids])
+
+    def rebuild(self):
+        document = self.document_sql.format(config=self.config) % (
+            'title', 'description')
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table}(ad_id, document) '
+                f'SELECT id, {document} FROM ads_ad'
+            )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """Бэкенд из settings.ADS_SEARCH_BACKEND или по типу СУБД."""
+    path = getattr(settings, 'ADS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)(using)
+    vendor = connections[using].vendor
+    return VENDOR_BACKENDS.get(vendor, IContainsBackend)(using)
+
+
+def search_ads(queryset, query):
+    return get_search_backend(queryset.db).search(queryset, query)
@@ -1,15 +1,53 @@
 from rest_framework import serializers
-from .models import Ad, ExchangeProposal
+from .fieldsets import SparseFieldsetSerializerMixin
+from .models import Ad, ArchivedAd, ArchivedProposal, ExchangeProposal, SimilarAd
+from .profiling import SerializerTimingMixin
 
-class AdSerializer(serializers.ModelSerializer):
+
+class AdListSerializer(serializers.ListSerializer):
+    """Список объявлений для /api/ads/bulk/: проверка каждого элемента отдельно."""
+
+    def validate_items(self, items, instances=None):
+        """
+        Возвращает [(index, validated_data)] и {index: errors}.
+        instances — {index: Ad} для обновления: элемент проверяется
+        относительно своего объекта.
+        """
+        valid, errors = [], {}
+        for index, item in enumerate(items):
+            self.child.instance = (instances or {}).get(index)
+            self.child.initial_data = item
+            try:
+                valid.append((index, self.run_child_validation(item)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        self.child.instance = None
+        return valid, errors
+
+
+class AdSerializer(SparseFieldsetSerializerMixin, SerializerTimingMixin,
+                   serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Ad
-        fields = ['id', 'user', 'title', 'description', 'image_url', 'category', 'condition', 'created_at']
+        fields = ['id', 'user', 'title', 'description', 'image_url', 'category', 'condition', 'created_at', 'updated_at',
+                  'proposals_received_count', 'proposals_waiting_count', 'proposals_sent_count']
+        read_only_fields = ['proposals_received_count', 'proposals_waiting_count',
+                            'proposals_sent_count']
+        list_serializer_class = AdListSerializer
+
 
+class SimilarAdSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    ad = AdSerializer(source='similar', read_only=True)
 
-class ExchangeProposalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SimilarAd
+        fields = ['rank', 'score', 'ad']
+
+
+class ExchangeProposalSerializer(SparseFieldsetSerializerMixin, SerializerTimingMixin,
+                                 serializers.ModelSerializer):
     class Meta:
         model = ExchangeProposal
         fields = [
@@ -19,18 +57,19 @@ class ExchangeProposalSerializer(serializers.ModelSerializer):
             'comment',
             'status',
             'created_at',
+            'resolved_at',
         ]
-        read_only_fields = ['status', 'created_at']
+        read_only_fields = ['status', 'created_at', 'resolved_at']
 
     def validate_ad_sender(self, ad_sender):
         user = self.context['request'].user
-        if ad_sender.user != user:
+        if ad_sender.user_id != user.pk:
             raise serializers.ValidationError("Вы можете предлагать только свои объявления.")
         return ad_sender
 
     def validate(self, data):
         request = self.context['request']
-        target_ad = self.context['view'].get_target_ad()
+        target_ad = data.get('ad_receiver') or self.context['view'].get_target_ad()
         if ad_sender := data.get('ad_sender'):
             if ad_sender.pk == target_ad.pk:
                 raise serializers.ValidationError("Нельзя обмениваться одним и тем же объявлением.")
@@ -38,4 +77,30 @@ class ExchangeProposalSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class ArchivedAdSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedAd
+        fields = ['id', 'title', 'description', 'image_url', 'category', 'condition',
+                  'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
+
+
+class ArchivedProposalSerializer(SerializerTimingMixin, serializers.ModelSerializer):
+    sender = serializers.StringRelatedField(source='sender_user', read_only=True)
+    receiver = serializers.StringRelatedField(source='receiver_user', read_only=True)
+
+    class Meta:
+        model = ArchivedProposal
+        fields = ['id', 'ad_sender', 'ad_sender_title', 'sender', 'ad_receiver',
+                  'ad_receiver_title', 'receiver', 'comment', 'status',
+                  'created_at', 'resolved_at', 'archived_at']
+        read_only_fields = fields
+
+
+class CycleSerializer(SerializerTimingMixin, serializers.Serializer):
+    ads = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    proposals = serializers.ListField(child=serializers.IntegerField(),
+                                      min_length=2)
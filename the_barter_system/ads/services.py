@@ -0,0 +1,293 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Q, When
+from django.utils import timezone
+
+from . import cache, counters, events, facets, images
+from .models import Ad, AdPurge, ExchangeProposal, SimilarAd
+from .search import get_search_backend
+
+BULK_BATCH_SIZE = 500
+SEARCH_FIELDS = {'title', 'description'}
+FACET_FIELDS = {'category', 'condition'}
+
+
+class ProposalError(Exception):
+    pass
+
+
+class NotReceiver(ProposalError):
+    pass
+
+
+class AlreadyResolved(ProposalError):
+    pass
+
+
+class NotParticipant(ProposalError):
+    pass
+
+
+class NotACycle(ProposalError):
+    pass
+
+
+def _lock_ads(ad_ids, using):
+    """
+    Блокирует объявления в порядке pk, чтобы встречные обмены не ловили
+    deadlock. Объявление могли удалить после чтения предложения: тогда
+    предложение скрыто вместе с ним — AlreadyResolved.
+    """
+    ads = {
+        ad.pk: ad
+        for ad in Ad.all_objects.using(using).select_for_update()
+        .filter(pk__in=ad_ids).order_by('pk')
+    }
+    if len(ads) != len(set(ad_ids)) or any(ad.deleted_at for ad in ads.values()):
+        raise AlreadyResolved(ad_ids)
+    return ads
+
+
+def _waiting_competitors(ads, using):
+    """
+    Ожидающие предложения с участием объявлений ads: (pk, ad_sender,
+    ad_receiver, владелец ad_sender, владелец ad_receiver). Читать нужно до
+    смены владельцев — уведомления уходят прежним.
+    """
+    return list(
+        ExchangeProposal.objects.using(using)
+        .filter(status='waiting')
+        .filter(Q(ad_sender__in=ads) | Q(ad_receiver__in=ads))
+        .values_list('pk', 'ad_sender_id', 'ad_receiver_id',
+                     'ad_sender__user_id', 'ad_receiver__user_id'))
+
+
+def _rotate_owners(edges, ads, using):
+    """Для каждого ребра sender→receiver владелец sender получает receiver."""
+    Ad.objects.using(using).filter(pk__in=ads).update(
+        user_id=Case(*(When(pk=receiver, then=ads[sender].user_id)
+                       for sender, receiver in edges)),
+        updated_at=timezone.now(),
+    )
+    cache.invalidate(list(ads), [ad.category for ad in ads.values()], using)
+
+
+def _reject_competitors(competitors, using):
+    # Конкурента могли отклонить параллельно (reject_proposal не блокирует
+    # объявления): блокируем строки и берём только ещё ожидающие, чтобы
+    # счётчики и события совпали с UPDATE.
+    still_waiting = set(
+        ExchangeProposal.objects.using(using).select_for_update(of=('self',))
+        .filter(pk__in=[row[0] for row in competitors], status='waiting')
+        .values_list('pk', flat=True))
+    competitors = [row for row in competitors if row[0] in still_waiting]
+    rejected = (ExchangeProposal.objects.using(using)
+                .filter(pk__in=still_waiting, status='waiting')
+                .update(status='rejected', resolved_at=timezone.now()))
+    counters.apply_deltas(counters.for_resolved(row[2] for row in competitors), using)
+    for pk, ad_sender, ad_receiver, sender_user, receiver_user in competitors:
+        events.publish_on_commit(
+            [sender_user, receiver_user],
+            events.proposal_event('rejected', pk, ad_sender, ad_receiver,
+                                  'rejected'),
+            using)
+    return rejected
+
+
+def _announce_accepted(proposals, ads, using):
+    for pk, sender, receiver in proposals:
+        events.publish_on_commit(
+            [ads[sender].user_id, ads[receiver].user_id],
+            events.proposal_event('accepted', pk, sender, receiver, 'accepted'),
+            using)
+
+
+def accept_proposal(proposal_id, user, using='default'):
+    """
+    Принять предложение и обменять владельцев объявлений атомарно.
+
+    Объявления блокируются (SELECT ... FOR UPDATE; на SQLite транзакции
+    открываются как BEGIN IMMEDIATE), статус меняется условным
+    UPDATE ... WHERE status='waiting', а все остальные ожидающие
+    предложения с этими объявлениями отклоняются одним UPDATE.
+    Возвращает число отклонённых конкурирующих предложений.
+    """
+    with transaction.atomic(using=using):
+        proposal = (ExchangeProposal.objects.using(using)
+                    .values('ad_sender_id', 'ad_receiver_id')
+                    .filter(pk=proposal_id).first())
+        if proposal is None:
+            raise AlreadyResolved(proposal_id)
+        sender_id = proposal['ad_sender_id']
+        receiver_id = proposal['ad_receiver_id']
+        ads = _lock_ads([sender_id, receiver_id], using)
+        if ads[receiver_id].user_id != user.pk:
+            raise NotReceiver(proposal_id)
+
+        accepted = (ExchangeProposal.objects.using(using)
+                    .filter(pk=proposal_id, status='waiting')
+                    .update(status='accepted', resolved_at=timezone.now()))
+        if not accepted:
+            raise AlreadyResolved(proposal_id)
+        counters.apply_deltas(counters.for_resolved([receiver_id]), using)
+
+        competitors = _waiting_competitors(ads, using)
+        _rotate_owners([(sender_id, receiver_id), (receiver_id, sender_id)],
+                       ads, using)
+        _announce_accepted([(proposal_id, sender_id, receiver_id)], ads, using)
+        return _reject_competitors(competitors, using)
+
+
+def execute_cycle(proposal_ids, user, using='default'):
+    """
+    Провести цикл обмена: предложения proposal_ids образуют цепочку
+    A→B→…→A, каждый владелец отдаёт своё объявление и получает то, за
+    которое сам предлагал обмен. Согласие всех участников уже выражено их
+    предложениями, запускать цикл может любой из них.
+
+    Всё происходит в одной транзакции: объявления блокируются, предложения
+    принимаются условным UPDATE (если хотя бы одно уже закрыто — откат),
+    владельцы сдвигаются по кругу одним UPDATE, прочие ожидающие
+    предложения с этими объявлениями отклоняются.
+    """
+    proposal_ids = list(proposal_ids)
+    with transaction.atomic(using=using):
+        rows = {pk: (sender, receiver) for pk, sender, receiver in
+                ExchangeProposal.objects.using(using)
+                .filter(pk__in=proposal_ids, status='waiting')
+                .values_list('pk', 'ad_sender_id', 'ad_receiver_id')}
+        if len(rows) != len(proposal_ids) or len(set(proposal_ids)) != len(rows):
+            raise AlreadyResolved(proposal_ids)
+        edges = [rows[pk] for pk in proposal_ids]
+        senders = [sender for sender, _ in edges]
+        if (len(edges) < 2 or len(set(senders)) != len(senders)
+                or any(edges[i][1] != edges[(i + 1) % len(edges)][0]
+                       for i in range(len(edges)))):
+            raise NotACycle(proposal_ids)
+
+        ads = _lock_ads(senders, using)
+        if user.pk not in {ad.user_id for ad in ads.values()}:
+            raise NotParticipant(proposal_ids)
+        accepted = (ExchangeProposal.objects.using(using)
+                    .filter(pk__in=proposal_ids, status='waiting')
+                    .update(status='accepted', resolved_at=timezone.now()))
+        if accepted != len(proposal_ids):
+            raise AlreadyResolved(proposal_ids)
+        counters.apply_deltas(
+            counters.for_resolved(receiver for _, receiver in edges), using)
+
+        competitors = _waiting_competitors(ads, using)
+        _rotate_owners(edges, ads, using)
+        _announce_accepted(
+            [(pk, *edge) for pk, edge in zip(proposal_ids, edges)], ads, using)
+        return _reject_competitors(competitors, using)
+
+
+def reject_proposal(proposal_id, user, using='default'):
+    with transaction.atomic(using=using):
+        proposal = (ExchangeProposal.objects.using(using)
+                    .filter(pk=proposal_id, status='waiting',
+                            ad_receiver__user=user)
+                    .values_list('ad_sender_id', 'ad_receiver_id',
+                                 'ad_sender__user_id')
+                    .first())
+        rejected = (ExchangeProposal.objects.using(using)
+                    .filter(pk=proposal_id, status='waiting',
+                            ad_receiver__user=user)
+                    .update(status='rejected', resolved_at=timezone.now()))
+        if not rejected:
+            raise AlreadyResolved(proposal_id)
+        ad_sender, ad_receiver, sender_user = proposal
+        counters.apply_deltas(counters.for_resolved([ad_receiver]), using)
+        events.publish_on_commit(
+            [sender_user, user.pk],
+            events.proposal_event('rejected', proposal_id, ad_sender,
+                                  ad_receiver, 'rejected'),
+            using)
+
+
+def bulk_create_ads(ads, batch_size=BULK_BATCH_SIZE, using='default'):
+    """
+    bulk_create без сигналов post_save, поэтому поисковый индекс и
+    счётчики категорий обновляются здесь одним проходом.
+    """
+    created = Ad.objects.using(using).bulk_create(ads, batch_size=batch_size)
+    get_search_backend(using).index(created)
+    facets.apply_deltas(facets.deltas_for_ads(created), using)
+    images.enqueue([ad for ad in created if ad.image_url], using)
+    cache.invalidate(categories={ad.category for ad in created}, using=using)
+    return created
+
+
+def bulk_update_ads(ads, fields, previous_facets=None,
+                    batch_size=BULK_BATCH_SIZE, using='default'):
+    """previous_facets: {pk: (category, condition)} до изменения."""
+    fields = set(fields)
+    if not ads or not fields:
+        return
+    # bulk_update не вызывает pre_save, auto_now выставляем сами.
+    now = timezone.now()
+    for ad in ads:
+        ad.updated_at = now
+    fields.add('updated_at')
+    Ad.objects.using(using).bulk_update(ads, sorted(fields), batch_size=batch_size)
+    if fields & SEARCH_FIELDS:
+        get_search_backend(using).index(ads)
+    if 'image_url' in fields:
+        images.enqueue(ads, using)
+    categories = {ad.category for ad in ads}
+    if previous_facets:
+        categories.update(category for category, _ in previous_facets.values())
+    cache.invalidate([ad.pk for ad in ads], categories, using)
+    if fields & cache.LISTED_FIELDS:
+        pks = [ad.pk for ad in ads]
+        for chunk_start in range(0, len(pks), batch_size):
+            cache.bump_on_commit(cache.neighbour_scopes(
+                pks[chunk_start:chunk_start + batch_size], using), using)
+    if fields & FACET_FIELDS and previous_facets:
+        deltas = Counter()
+        for ad in ads:
+            deltas[previous_facets[ad.pk]] -= 1
+            deltas[(ad.category, ad.condition)] += 1
+        facets.apply_deltas(deltas, using)
+
+
+def delete_ads(ads, using='default'):
+    """
+    Удаление без каскада в запросе: объявления помечаются deleted_at и
+    пропадают из выборок, фасеты, счётчики предложений второй стороны и кэш
+    страниц обновляются сразу, а строки вместе с предложениями удаляет
+    purge_ads (см. ads.purge).
+    Возвращает удалённые сейчас объявления.
+    """
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        hidden = list(Ad.objects.using(using).select_for_update()
+                      .filter(pk__in=[ad.pk for ad in ads]).order_by('pk')
+                      .only('pk', 'category', 'condition'))
+        if not hidden:
+            return []
+        ids = [ad.pk for ad in hidden]
+        # Предложения скрываются вместе с объявлениями; читать их нужно до
+        # UPDATE, пока видны только ещё не учтённые.
+        proposals = (ExchangeProposal.objects.using(using)
+                     .filter(Q(ad_sender__in=ids) | Q(ad_receiver__in=ids))
+                     .values_list('ad_sender_id', 'ad_receiver_id', 'status'))
+        deltas = counters.for_proposals(proposals, sign=-1)
+        for pk in ids:
+            deltas.pop(pk, None)
+        Ad.objects.using(using).filter(pk__in=ids).update(
+            deleted_at=now, updated_at=now)
+        AdPurge.objects.using(using).bulk_create(
+            [AdPurge(ad_id=pk, requested_at=now) for pk in ids],
+            ignore_conflicts=True)
+        # Списки похожих сразу, а не при purge_ads: similarity.refresh
+        # строит векторы только по видимым объявлениям.
+        cache.bump_on_commit(cache.neighbour_scopes(ids, using), using)
+        SimilarAd.objects.using(using).filter(
+            Q(ad__in=ids) | Q(similar__in=ids)).delete()
+        facets.apply_deltas(facets.deltas_for_ads(hidden, sign=-1), using)
+        counters.apply_deltas(deltas, using)
+        cache.invalidate(ids, {ad.category for ad in hidden}, using)
+    return hidden
@@ -0,0 +1,150 @@
+from collections import Counter
+
+from django.db.models import DEFERRED
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, counters, events, facets, images, metrics
+from .models import Ad, ExchangeProposal
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Ad)
+def index_ad(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend(using).index([instance])
+
+
+@receiver(post_delete, sender=Ad)
+def unindex_ad(sender, instance, using, **kwargs):
+    get_search_backend(using).remove([instance.pk])
+
+
+@receiver(pre_save, sender=Ad)
+def remember_facet(sender, instance, using, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._previous_facet = None
+    else:
+        instance._previous_facet = facets.previous_facet_key(instance, using)
+
+
+@receiver(pre_save, sender=Ad)
+def remember_listed_change(sender, instance, raw=False, **kwargs):
+    # post_save-обработчики успевают обновить _loaded_values, сравниваем до.
+    loaded = getattr(instance, '_loaded_values', {})
+    instance._listed_changed = any(
+        loaded.get(name, DEFERRED) is DEFERRED or loaded[name] != getattr(instance, name)
+        for name in cache.LISTED_FIELDS)
+
+
+@receiver(post_save, sender=Ad)
+def update_facets(sender, instance, using, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = Counter()
+    previous = getattr(instance, '_previous_facet', None)
+    if previous:
+        deltas[previous] -= 1
+    deltas[(instance.category, instance.condition)] += 1
+    facets.apply_deltas(deltas, using)
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        'category': instance.category,
+        'condition': instance.condition,
+    }
+
+
+@receiver(post_save, sender=Ad)
+def queue_image(sender, instance, using, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if created and not instance.image_url:
+        return
+    if not created and loaded.get('image_url', '') == instance.image_url:
+        return
+    images.enqueue([instance], using)
+    instance._loaded_values = {**loaded, 'image_url': instance.image_url}
+
+
+@receiver(pre_delete, sender=Ad)
+def remember_deleted_facet(sender, instance, using, **kwargs):
+    # Мягко удалённое объявление вычтено из фасетов ещё в delete_ads.
+    if instance.deleted_at is not None:
+        instance._previous_facet = None
+        return
+    instance._previous_facet = facets.previous_facet_key(instance, using)
+
+
+@receiver(post_delete, sender=Ad)
+def release_facet(sender, instance, using, **kwargs):
+    previous = getattr(instance, '_previous_facet', None)
+    if previous:
+        facets.apply_deltas({previous: -1}, using)
+
+
+@receiver(post_save, sender=Ad)
+def invalidate_saved(sender, instance, using, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_facet', None)
+    categories = [instance.category] + ([previous[0]] if previous else [])
+    cache.invalidate([instance.pk], categories, using)
+    if not created and getattr(instance, '_listed_changed', True):
+        # Заголовок и категория видны и на страницах, где объявление в похожих.
+        cache.bump_on_commit(cache.neighbour_scopes([instance.pk], using), using)
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{name: getattr(instance, name) for name in cache.LISTED_FIELDS},
+    }
+
+
+@receiver(pre_delete, sender=Ad)
+def remember_neighbour_pages(sender, instance, using, **kwargs):
+    # После удаления каскад уже убрал строки SimilarAd.
+    instance._neighbour_scopes = cache.neighbour_scopes([instance.pk], using)
+
+
+@receiver(post_delete, sender=Ad)
+def invalidate_deleted(sender, instance, using, **kwargs):
+    cache.invalidate([instance.pk], [instance.category], using)
+    cache.bump_on_commit(getattr(instance, '_neighbour_scopes', []), using)
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def count_proposal(sender, instance, using, created, raw=False, **kwargs):
+    # Смена статуса учитывается в services, там же, где UPDATE.
+    if raw or not created:
+        return
+    counters.apply_deltas(counters.for_proposals(
+        [(instance.ad_sender_id, instance.ad_receiver_id, instance.status)]), using)
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def announce_proposal(sender, instance, using, created, raw=False, **kwargs):
+    # Смена статуса идёт через services и публикуется там.
+    if raw or not created:
+        return
+    fields = [ExchangeProposal._meta.get_field(name)
+              for name in ('ad_sender', 'ad_receiver')]
+    if all(field.is_cached(instance) for field in fields):
+        # Форма и сериализатор уже загрузили оба объявления.
+        users = [getattr(instance, field.name).user_id for field in fields]
+    else:
+        users = list(Ad.objects.using(using)
+                     .filter(pk__in=[instance.ad_sender_id, instance.ad_receiver_id])
+                     .values_list('user_id', flat=True))
+    events.publish_on_commit(
+        users,
+        events.proposal_event('created', instance.pk, instance.ad_sender_id,
+                              instance.ad_receiver_id, instance.status),
+        using)
+
+
+@receiver(events.proposal_changed)
+def count_proposal_event(sender, event, **kwargs):
+    # После COMMIT, как и сами события: откаченные предложения не в счёт.
+    metrics.PROPOSALS.labels(event['type'].removeprefix('proposal.')).inc()
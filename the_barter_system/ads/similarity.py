@@ -0,0 +1,224 @@
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from . import cache
+from .models import Ad, SimilarAd, SimilarityBuild
+from .search import tokenize
+
+# Слова заголовка весят больше слов описания.
+TITLE_WEIGHT = 2
+# На маленькой выборке частые слова ещё различают объявления.
+MAX_DF_MIN_ADS = 100
+# Ограничение SQLite на число параметров запроса.
+BATCH_SIZE = 500
+
+
+def get_options():
+    return {
+        'k': getattr(settings, 'ADS_SIMILAR_COUNT', 10),
+        'min_score': getattr(settings, 'ADS_SIMILAR_MIN_SCORE', 0.05),
+        'max_df': getattr(settings, 'ADS_SIMILAR_MAX_DF', 0.5),
+    }
+
+
+def ad_terms(title, description, category):
+    title = [token.lower() for token in tokenize(title)]
+    description = [token.lower() for token in tokenize(description)]
+    # Двоеточия нет в \w+, поэтому с обычным словом терм категории не совпадёт.
+    return title * TITLE_WEIGHT + description + ['category:' + category.lower()]
+
+
+class Vectors(NamedTuple):
+    ids: np.ndarray
+    matrix: sparse.csr_matrix
+
+
+def vectorize(rows, max_df=0.5):
+    """
+    TF-IDF по строкам (id, title, description, category), отсортированным
+    по id: сублинейный tf, сглаженный idf, нормировка строк по L2.
+    """
+    vocabulary = {}
+    ids, indices, indptr = [], [], [0]
+    for pk, title, description, category in rows:
+        ids.append(pk)
+        indices.extend(vocabulary.setdefault(term, len(vocabulary))
+                       for term in ad_terms(title, description, category))
+        indptr.append(len(indices))
+
+    n = len(ids)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32),
+         np.asarray(indices, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=(n, len(vocabulary)))
+    matrix.sum_duplicates()
+
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    if n >= MAX_DF_MIN_ADS:
+        # Слова, которые есть почти везде, о сходстве ничего не говорят,
+        # а произведение X·Xᵀ с ними становится плотным.
+        idf[df > max_df * n] = 0
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+    matrix.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+    return Vectors(np.asarray(ids, dtype=np.int64), matrix)
+
+
+def load_vectors(using='default', max_df=0.5):
+    rows = (Ad.objects.using(using).order_by('id')
+            .values_list('id', 'title', 'description', 'category')
+            .iterator(chunk_size=2000))
+    return vectorize(rows, max_df)
+
+
+def top_neighbours(scores, rows, k, min_score):
+    """
+    Для i-й строки разреженной матрицы scores (сходство объявления rows[i]
+    со всеми) — k лучших соседей без него самого: (столбцы, оценки).
+    """
+    for i, row in enumerate(rows):
+        lo, hi = scores.indptr[i], scores.indptr[i + 1]
+        cols, vals = scores.indices[lo:hi], scores.data[lo:hi]
+        keep = (cols != row) & (vals >= min_score)
+        cols, vals = cols[keep], vals[keep]
+        if len(vals) > k:
+            best = np.argpartition(-vals, k - 1)[:k]
+            cols, vals = cols[best], vals[best]
+        # При равных оценках выше более старое объявление.
+        order = np.lexsort((cols, -vals))
+        yield cols[order], vals[order]
+
+
+def chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def write_lists(lists, using='default'):
+    """Заменить списки похожих: {ad_id: [(similar_id, score), ...]}."""
+    for ad_ids in chunks(list(lists), BATCH_SIZE):
+        SimilarAd.objects.using(using).filter(ad_id__in=ad_ids).delete()
+    SimilarAd.objects.using(using).bulk_create(
+        (SimilarAd(ad_id=ad_id, rank=rank, similar_id=similar_id, score=score)
+         for ad_id, neighbours in lists.items()
+         for rank, (similar_id, score) in enumerate(neighbours)),
+        batch_size=BATCH_SIZE)
+
+
+def build(using='default', chunk_size=1000):
+    """Полный пересчёт: X·Xᵀ блоками по chunk_size строк."""
+    options = get_options()
+    started = timezone.now()
+    ids, matrix = load_vectors(using, options['max_df'])
+    transposed = matrix.T.tocsr()
+    with transaction.atomic(using=using):
+        SimilarAd.objects.using(using).all().delete()
+        for start in range(0, len(ids), chunk_size):
+            rows = range(start, min(len(ids), start + chunk_size))
+            scores = matrix[start:rows.stop] @ transposed
+            lists = {
+                int(ids[row]): list(zip(ids[cols].tolist(), vals.tolist()))
+                for row, (cols, vals) in zip(rows, top_neighbours(
+                    scores, rows, options['k'], options['min_score']))
+            }
+            write_lists(lists, using)
+        record = SimilarityBuild.objects.using(using).create(
+            started_at=started, full=True, ads=len(ids), updated=len(ids))
+    cache.bump([cache.SIMILAR])
+    return record
+
+
+def refresh(using='default', chunk_size=1000):
+    """
+    Пересчёт для объявлений, изменённых с начала прошлого запуска: их
+    собственные списки строятся заново, а в чужие списки они входят, если
+    обходят последнего соседа. Векторы строятся по всей базе, но сходство
+    считается только для изменённых строк. Удалённые объявления уходят из
+    списков каскадом, освободившиеся места заполнит следующий полный пересчёт.
+    """
+    last = (SimilarityBuild.objects.using(using)
+            .order_by('-started_at').first())
+    if last is None:
+        return build(using, chunk_size)
+    options = get_options()
+    k, min_score = options['k'], options['min_score']
+    started = timezone.now()
+    changed = list(Ad.objects.using(using)
+                   .filter(updated_at__gte=last.started_at)
+                   .order_by('id').values_list('id', flat=True))
+    if not changed:
+        return SimilarityBuild.objects.using(using).create(
+            started_at=started, ads=Ad.objects.using(using).count())
+
+    ids, matrix = load_vectors(using, options['max_df'])
+    transposed = matrix.T.tocsr()
+    # Между чтениями объявление могли скрыть: его нет среди векторов.
+    position = {pk: row for row, pk in enumerate(ids.tolist())}
+    changed = [pk for pk in changed if pk in position]
+    changed_rows = np.array([position[pk] for pk in changed], dtype=np.int64)
+    changed_set = set(changed)
+
+    # Порог входа в чужой список: оценка k-го соседа, если список полон.
+    floor = np.full(len(ids), min_score, dtype=np.float32)
+    last_places = (SimilarAd.objects.using(using).filter(rank=k - 1)
+                   .values_list('ad_id', 'score').iterator(chunk_size=2000))
+    for ad_id, score in last_places:
+        if ad_id in position:
+            floor[position[ad_id]] = score
+
+    own = {}
+    candidates = {}
+    for rows in chunks(changed_rows, chunk_size):
+        scores = matrix[rows] @ transposed
+        for row, (cols, vals) in zip(rows, top_neighbours(
+                scores, rows, k, min_score)):
+            own[int(ids[row])] = list(zip(ids[cols].tolist(), vals.tolist()))
+        # Сходство симметрично: столбцы scores — оценки изменённых
+        # объявлений для всех остальных.
+        scores = scores.tocoo()
+        passed = (scores.data > floor[scores.col]) & (
+            scores.col != rows[scores.row])
+        for col, row, value in zip(scores.col[passed].tolist(),
+                                   rows[scores.row[passed]].tolist(),
+                                   scores.data[passed].tolist()):
+            candidates.setdefault(int(ids[col]), []).append(
+                (int(ids[row]), value))
+
+    # Списки, где изменённые объявления стоят со старой оценкой.
+    for ad_ids in chunks(changed, BATCH_SIZE):
+        stale = (SimilarAd.objects.using(using).filter(similar_id__in=ad_ids)
+                 .values_list('ad_id', flat=True))
+        for ad_id in stale:
+            candidates.setdefault(ad_id, [])
+    for ad_id in changed_set:
+        candidates.pop(ad_id, None)
+
+    merged = {}
+    current = {}
+    for ad_ids in chunks(list(candidates), BATCH_SIZE):
+        rows = (SimilarAd.objects.using(using).filter(ad_id__in=ad_ids)
+                .values_list('ad_id', 'similar_id', 'score'))
+        for ad_id, similar_id, score in rows:
+            if similar_id not in changed_set:
+                current.setdefault(ad_id, []).append((similar_id, score))
+    for ad_id, extra in candidates.items():
+        neighbours = current.get(ad_id, []) + extra
+        neighbours.sort(key=lambda item: (-item[1], item[0]))
+        merged[ad_id] = neighbours[:k]
+
+    with transaction.atomic(using=using):
+        write_lists({**merged, **own}, using)
+        record = SimilarityBuild.objects.using(using).create(
+            started_at=started, ads=len(ids), updated=len(own) + len(merged))
+    cache.bump([cache.ad_scope(pk) for pk in (*own, *merged)])
+    return record
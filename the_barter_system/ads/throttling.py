@@ -0,0 +1,149 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import THROTTLED
+
+SEARCH = 'search'
+PROPOSAL_CREATE = 'proposal_create'
+WRITE = 'write'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Ключ ведра переживает любую паузу между запросами; если кэш всё же
+# вытеснит его раньше, клиент лишь однажды получит полный запас заново.
+KEY_TIMEOUT = 86400
+
+
+def get_cache():
+    alias = getattr(settings, 'ADS_THROTTLE_CACHE_ALIAS', None)
+    return caches[alias or getattr(settings, 'ADS_CACHE_ALIAS', 'default')]
+
+
+def parse_rate(rate):
+    """'30/min' -> (интервал между запросами в мкс, размер всплеска)."""
+    count, period = rate.split('/')
+    count = int(count)
+    return PERIODS[period[0]] * 1_000_000 // count, count
+
+
+def get_rate(scope):
+    rate = getattr(settings, 'ADS_THROTTLE_RATES', {}).get(scope)
+    return parse_rate(rate) if rate else None
+
+
+def client_ident(request, user=None):
+    """
+    Вошедших различаем по пользователю, анонимов — по адресу. X-Forwarded-For
+    учитывается только при REST_FRAMEWORK['NUM_PROXIES'] > 0, иначе клиент
+    получал бы новое ведро с каждым выдуманным заголовком. Async-view
+    передают user из request.auser().
+    """
+    if user is None:
+        user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return 'ip:' + ''.join(BaseThrottle().get_ident(request).split())
+
+
+def consume(scope, ident):
+    """
+    Взять маркер из ведра scope/ident; 0 — запрос пропущен, иначе через
+    сколько секунд появится маркер. GCRA: в кэше хранится одно число —
+    теоретическое время прибытия (TAT) следующего запроса, и каждый запрос
+    сдвигает его атомарным incr на интервал, так что лимит общий для всех
+    процессов с этим кэшем. Отказ возвращает сдвиг через decr.
+    """
+    rate = get_rate(scope)
+    if rate is None:
+        return 0
+    interval, burst = rate
+    key = f'ads:throttle:{scope}:{ident}'
+    cache = get_cache()
+    now = time.time_ns() // 1000
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:
+        if cache.add(key, now + interval, KEY_TIMEOUT):
+            return 0
+        tat = cache.incr(key, interval)
+    if tat - interval < now:
+        # Ведро успело наполниться: отсчёт заново от текущего момента.
+        # Параллельный запрос может здесь проскочить без учёта — только
+        # на простаивавшем ведре, где запас всё равно полный.
+        cache.set(key, now + interval, KEY_TIMEOUT)
+        return 0
+    excess = tat - now - interval * burst
+    if excess <= 0:
+        return 0
+    cache.decr(key, interval)
+    THROTTLED.labels(scope).inc()
+    return excess / 1_000_000
+
+
+def throttled_response(wait):
+    seconds = math.ceil(wait)
+    response = HttpResponse(f'Слишком много запросов. Повторите через {seconds} с.',
+                            status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+class ThrottleMixin:
+    """Лимит запросов для обычных view; область — get_throttle_scope()."""
+    throttle_scope = None
+
+    def get_throttle_scope(self, request):
+        return self.throttle_scope
+
+    def dispatch(self, request, *args, **kwargs):
+        scope = self.get_throttle_scope(request)
+        if scope is not None:
+            wait = consume(scope, client_ident(request))
+            if wait:
+                return throttled_response(wait)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class BucketThrottle(BaseThrottle):
+    """То же ведро для DRF: 429 и Retry-After формирует сам DRF."""
+    scope = None
+    wait_seconds = None
+
+    def applies(self, request, view):
+        return True
+
+    def allow_request(self, request, view):
+        if not self.applies(request, view):
+            return True
+        self.wait_seconds = consume(self.scope, client_ident(request))
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SearchThrottle(BucketThrottle):
+    scope = SEARCH
+
+    def applies(self, request, view):
+        return bool(request.query_params.get(api_settings.SEARCH_PARAM, '').strip())
+
+
+class ProposalCreateThrottle(BucketThrottle):
+    scope = PROPOSAL_CREATE
+
+    def applies(self, request, view):
+        return view.action == 'create'
+
+
+class WriteThrottle(BucketThrottle):
+    scope = WRITE
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
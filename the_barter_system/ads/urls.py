@@ -1,20 +1,30 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views, metrics
+
 from .views import (
-    AdViewSet, ExchangeProposalViewSet,
+    AdViewSet, ExchangeProposalViewSet, CycleViewSet,
+    ArchivedAdViewSet, ArchivedProposalViewSet,
     AdListView, AdDetailView,
     AdCreateView, AdUpdateView, AdDeleteView,
     ProposalCreateView, login, logout, signup,
-    ProposalListView, ProposalDetailView, proposal_update_status
+    ProposalListView, ProposalDetailView, proposal_update_status, ad_image
 )
 
 router = DefaultRouter()
 router.register(r'ads', AdViewSet, basename='ad')
 router.register(r'proposals', ExchangeProposalViewSet, basename='exchangeproposal')
+router.register(r'cycles', CycleViewSet, basename='cycle')
+router.register(r'archive/ads', ArchivedAdViewSet, basename='archivedad')
+router.register(r'archive/proposals', ArchivedProposalViewSet,
+                basename='archivedproposal')
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('api/async/ads/', async_views.ad_list, name='async_ad_list'),
+    path('api/async/ads/<int:pk>/', async_views.ad_detail, name='async_ad_detail'),
+    path('api/async/proposals/', async_views.my_proposals, name='async_my_proposals'),
 
     path('', AdListView.as_view(), name='ad_list'),
     path('ads/create/', AdCreateView.as_view(), name='ad_create'),
@@ -22,8 +32,14 @@ urlpatterns = [
     path('ads/<int:pk>/edit/', AdUpdateView.as_view(), name='ad_update'),
     path('ads/<int:pk>/delete/', AdDeleteView.as_view(), name='ad_delete'),
 
+    re_path(r'^images/(?P<digest>[0-9a-f]{64})/(?P<width>[0-9]+)\.jpg$', ad_image,
+            name='ad_image'),
+
     path('ads/<int:pk>/propose/', ProposalCreateView.as_view(), name='proposal_create'),    
     path('proposals/', ProposalListView.as_view(), name='proposal_list'),
+    path('proposals/events/', async_views.proposal_events, name='proposal_events'),
+    path('proposals/events/poll/', async_views.proposal_events_poll,
+         name='proposal_events_poll'),
     path('proposals/<int:pk>/', ProposalDetailView.as_view(), name='proposal_detail'),
     path('proposals/<int:pk>/<str:action>/', proposal_update_status, name='proposal_update_status'),
 
@@ -31,4 +47,6 @@ urlpatterns = [
     path('login/', login, name='login'),
     path('logout/', logout, name='logout'),
     path('signup/', signup, name='signup'),
+
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
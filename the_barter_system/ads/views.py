@@ -1,9 +1,33 @@
-from rest_framework import viewsets, permissions, filters
-from rest_framework.pagination import PageNumberPagination
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Ad, ExchangeProposal
-from .serializers import AdSerializer, ExchangeProposalSerializer
+from .models import Ad, ArchivedAd, ArchivedProposal, ExchangeProposal, SimilarAd
+from .serializers import (
+    AdSerializer, ArchivedAdSerializer, ArchivedProposalSerializer, CycleSerializer,
+    ExchangeProposalSerializer, SimilarAdSerializer
+)
 from .permissions import IsOwnerOrReadOnly
+from .filters import AdSearchFilter
+from .pagination import DEFAULT_KEYSET_ORDERING, KeysetPagination, KeysetPaginationMixin
+from .search import search_ads
+from .facets import get_facets
+from .exports import ExportMixin
+from .fieldsets import SparseFieldsetMixin
+from .conditional import (
+    ConditionalDetailMixin, ConditionalGetMixin, ad_version, conditional_response,
+    make_etag
+)
+from .images import CONTENT_TYPE, get_storage, thumbnail_path
+from .cache import GLOBAL, SIMILAR, AnonymousCacheMixin, ad_scope, category_scope
+from .throttling import (
+    PROPOSAL_CREATE, SEARCH, ProposalCreateThrottle, SearchThrottle, ThrottleMixin,
+    WriteThrottle
+)
+from . import services
+from .cycles import get_engine
+from .events import stream_available
 
 from django.urls import reverse_lazy
 from django.db.models import Q
@@ -20,18 +44,41 @@ from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib import messages
 from django.db import transaction
+from django.http import FileResponse, Http404
+
+
+def similar_ads(ad_id):
+    """Готовый список похожих: один проход по индексу (ad, rank)."""
+    return (SimilarAd.objects.filter(ad_id=ad_id, similar__deleted_at__isnull=True)
+            .select_related('similar__user').order_by('rank'))
 
 
-class AdPagination(PageNumberPagination):
-    page_size = 10
+class CachedObjectMixin:
+    """get_object() вызывается и в test_func, и в get/post — читаем один раз."""
 
+    def get_object(self, queryset=None):
+        if not hasattr(self, '_cached_object'):
+            self._cached_object = super().get_object(queryset)
+        return self._cached_object
 
-class AdListView(ListView):
+
+class AdListView(AnonymousCacheMixin, ThrottleMixin, KeysetPaginationMixin, ListView):
     model = Ad
+    queryset = Ad.objects.select_related('stored_image')
+    use_read_replica = True
     template_name = 'ads/ad_list.html'
     context_object_name = 'ads'
     paginate_by = 10
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
+    # Счётчики категорий в фильтре зависят от всех объявлений, поэтому
+    # страница списка привязана к общей версии.
+    cache_prefix = 'ad_list'
+    cache_query_params = ('q', 'category', 'condition', 'page', 'cursor')
+
+    def get_throttle_scope(self, request):
+        # Ответ из кэша дешёвый и до лимита не доходит: считаются только
+        # поиски, которые действительно идут в базу.
+        return SEARCH if request.GET.get('q', '').strip() else None
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -40,10 +87,7 @@ class AdListView(ListView):
         condition = self.request.GET.get('condition')
 
         if q:
-            qs = qs.filter(
-                Q(title__icontains=q) |
-                Q(description__icontains=q)
-            )
+            qs = search_ads(qs, q)
         if category:
             qs = qs.filter(category=category)
         if condition:
@@ -58,15 +102,38 @@ class AdListView(ListView):
             'category':  self.request.GET.get('category', ''),
             'condition': self.request.GET.get('condition', ''),
             'all_conditions': Ad.CONDITION_CHOICES,
-            'all_categories': Ad.objects.values_list('category', flat=True).distinct(),
+            'category_facets': get_facets(),
         })
         return ctx
 
 
-class AdDetailView(DetailView):
+class AdDetailView(AnonymousCacheMixin, ConditionalDetailMixin, DetailView):
     model = Ad
+    use_read_replica = True
+    queryset = Ad.objects.select_related('user', 'stored_image')
     template_name = 'ads/ad_detail.html'
     context_object_name = 'ad'
+    cache_prefix = 'ad_detail'
+    cache_query_params = ()
+
+    def get_cache_scopes(self):
+        return [ad_scope(self.kwargs['pk']), SIMILAR]
+
+    def get_similar(self):
+        if not hasattr(self, '_similar'):
+            self._similar = list(similar_ads(self.object.pk))
+        return self._similar
+
+    def get_object_version(self, obj):
+        image = obj.ready_image
+        return (ad_version(obj), image and image.digest,
+                [(row.similar_id, row.similar.updated_at.isoformat())
+                 for row in self.get_similar()])
+
+    def get_context_data(self, **ctx):
+        ctx = super().get_context_data(**ctx)
+        ctx['similar_ads'] = self.get_similar()
+        return ctx
 
 
 class AdCreateView(LoginRequiredMixin, CreateView):
@@ -85,13 +152,13 @@ class AdCreateView(LoginRequiredMixin, CreateView):
         return super().form_invalid(form)
 
 
-class AdUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class AdUpdateView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, UpdateView):
     model = Ad
     form_class = AdForm
     template_name = 'ads/ad_form.html'
 
     def test_func(self):
-        return self.get_object().user == self.request.user
+        return self.get_object().user_id == self.request.user.pk
 
     def form_invalid(self, form):
         messages.error(
@@ -99,35 +166,205 @@ class AdUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return super().form_invalid(form)
 
 
-class AdDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class AdDeleteView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DeleteView):
     model = Ad
     template_name = 'ads/ad_confirm_delete.html'
     success_url = reverse_lazy('ad_list')
 
     def test_func(self):
-        return self.get_object().user == self.request.user
+        return self.get_object().user_id == self.request.user.pk
+
+    def form_valid(self, form):
+        # Предложения удалит purge_ads: каскад по тысячам строк в запросе
+        # держал бы блокировки секундами.
+        services.delete_ads([self.object])
+        return redirect(self.get_success_url())
 
 
-class AdViewSet(viewsets.ModelViewSet):
+class AdViewSet(AnonymousCacheMixin, ConditionalGetMixin, ExportMixin,
+                SparseFieldsetMixin, viewsets.ModelViewSet):
     permission_classes = [IsOwnerOrReadOnly]
-    pagination_class = AdPagination
-    queryset = Ad.objects.all().order_by('-created_at')
+    pagination_class = KeysetPagination
+    use_read_replica = True
+    queryset = Ad.objects.select_related('user').order_by('-created_at', '-id')
     serializer_class = AdSerializer
     filter_backends = [DjangoFilterBackend,
-                       filters.SearchFilter, filters.OrderingFilter]
+                       AdSearchFilter, filters.OrderingFilter]
+    throttle_classes = [SearchThrottle, WriteThrottle]
     filterset_fields = ['category', 'condition', 'user']
     search_fields = ['title', 'description']
-    ordering_fields = ['created_at', 'title']
+    ordering_fields = ['created_at', 'title', 'proposals_received_count']
+    # Сортировки, для которых есть индекс и курсорная пагинация.
+    keyset_orderings = [DEFAULT_KEYSET_ORDERING,
+                        ('-proposals_received_count', '-created_at', '-id')]
+    export_fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'title': 'title',
+        'description': 'description',
+        'image_url': 'image_url',
+        'category': 'category',
+        'condition': 'condition',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    # Ключи курсоров и всё, что входит в ETag (ad_version).
+    sparse_required_columns = ('id', 'created_at', 'updated_at', 'user__username',
+                               'proposals_received_count', 'proposals_waiting_count',
+                               'proposals_sent_count')
+
+    cache_prefix = 'api_ads'
+
+    def get_cache_scopes(self):
+        action = self.action_map.get(self.request.method.lower())
+        if action == 'retrieve':
+            return [ad_scope(self.kwargs['pk'])]
+        if action == 'list':
+            category = self.request.GET.get('category')
+            return [category_scope(category) if category else GLOBAL]
+        return None
+
+    def get_cache_extra(self):
+        return (self.request.META.get('HTTP_ACCEPT', ''),)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        services.delete_ads([instance])
+
+    @action(detail=False, pagination_class=None)
+    def facets(self, request):
+        return Response(get_facets())
+
+    @action(detail=True, pagination_class=None)
+    def similar(self, request, pk=None):
+        rows = list(similar_ads(pk)) if pk.isdigit() else []
+        if not rows:
+            # Пустой список или нет такого объявления — отличает только 404.
+            self.get_object()
+        return Response(SimilarAdSerializer(rows, many=True).data)
+
+    bulk_max_items = 5000
+
+    @action(detail=False, methods=['post', 'patch', 'delete'],
+            permission_classes=[permissions.IsAuthenticated, IsOwnerOrReadOnly])
+    def bulk(self, request):
+        """
+        Пакетные операции: POST — список новых объявлений, PATCH — список
+        объектов с id и изменяемыми полями, DELETE — список id. Всё
+        выполняется в одной транзакции, ответ содержит результат по каждому
+        элементу.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError('Ожидается непустой список.')
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                f'Не больше {self.bulk_max_items} элементов за запрос.')
+
+        handler = {
+            'POST': self._bulk_create,
+            'PATCH': self._bulk_update,
+            'DELETE': self._bulk_delete,
+        }[request.method]
+        with transaction.atomic():
+            results = handler(items)
 
-class ProposalCreateView(LoginRequiredMixin, CreateView):
+        failed = sum(1 for r in results if r['status'] == 'error')
+        if not failed:
+            code = status.HTTP_200_OK
+        elif failed == len(results):
+            code = status.HTTP_400_BAD_REQUEST
+        else:
+            code = status.HTTP_207_MULTI_STATUS
+        return Response({'results': results}, status=code)
+
+    def _bulk_error(self, index, errors):
+        return {'index': index, 'status': 'error', 'errors': errors}
+
+    def _bulk_targets(self, items):
+        """{index: Ad} для элементов со своими объявлениями и ошибки для прочих."""
+        ids = {}
+        seen = set()
+        results = {}
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else item
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                results[index] = self._bulk_error(index, {'id': ['Нужен id объявления.']})
+            elif pk in seen:
+                # Оба элемента получили бы один объект Ad: второй затёр бы
+                # прежние значения, по которым пересчитываются фасеты.
+                results[index] = self._bulk_error(
+                    index, {'id': ['Объявление уже есть в запросе.']})
+            else:
+                ids[index] = pk
+                seen.add(pk)
+        ads = Ad.objects.in_bulk(set(ids.values()))
+        owner_check = IsOwnerOrReadOnly()
+        targets = {}
+        for index, pk in ids.items():
+            ad = ads.get(pk)
+            if ad is None:
+                results[index] = self._bulk_error(index, {'id': ['Объявление не найдено.']})
+            elif not owner_check.has_object_permission(self.request, self, ad):
+                results[index] = self._bulk_error(
+                    index, {'id': ['Можно изменять только свои объявления.']})
+            else:
+                targets[index] = ad
+        return targets, results
+
+    def _bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        valid, errors = serializer.validate_items(items)
+        ads = [Ad(user=self.request.user, **attrs) for _, attrs in valid]
+        services.bulk_create_ads(ads)
+
+        results = {index: self._bulk_error(index, err) for index, err in errors.items()}
+        for (index, _), ad in zip(valid, ads):
+            results[index] = {'index': index, 'status': 'created', 'id': ad.pk}
+        return [results[index] for index in range(len(items))]
+
+    def _bulk_update(self, items):
+        targets, results = self._bulk_targets(items)
+        serializer = self.get_serializer(data=items, many=True, partial=True)
+        indexes = sorted(targets)
+        valid, errors = serializer.validate_items(
+            [items[i] for i in indexes],
+            instances={n: targets[i] for n, i in enumerate(indexes)})
+        for n, err in errors.items():
+            results[indexes[n]] = self._bulk_error(indexes[n], err)
+
+        changed, fields, previous = [], set(), {}
+        for n, attrs in valid:
+            ad = targets[indexes[n]]
+            previous[ad.pk] = (ad.category, ad.condition)
+            for name, value in attrs.items():
+                setattr(ad, name, value)
+            fields.update(attrs)
+            changed.append(ad)
+            results[indexes[n]] = {'index': indexes[n], 'status': 'updated', 'id': ad.pk}
+        services.bulk_update_ads(changed, fields, previous)
+        return [results[index] for index in range(len(items))]
+
+    def _bulk_delete(self, items):
+        targets, results = self._bulk_targets(items)
+        ads = list(targets.values())
+        for chunk_start in range(0, len(ads), services.BULK_BATCH_SIZE):
+            services.delete_ads(ads[chunk_start:chunk_start + services.BULK_BATCH_SIZE])
+        for index, ad in targets.items():
+            results[index] = {'index': index, 'status': 'deleted', 'id': ad.pk}
+        return [results[index] for index in range(len(items))]
+
+
+class ProposalCreateView(LoginRequiredMixin, ThrottleMixin, CreateView):
     model = ExchangeProposal
     form_class = ExchangeProposalForm
     template_name = 'ads/proposal_form.html'
 
+    def get_throttle_scope(self, request):
+        return PROPOSAL_CREATE if request.method == 'POST' else None
+
     def dispatch(self, request, *args, **kwargs):
         self.target_ad = get_object_or_404(Ad, pk=kwargs['pk'])
         return super().dispatch(request, *args, **kwargs)
@@ -158,23 +395,110 @@ class ProposalCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy('ad_detail', kwargs={'pk': self.target_ad.pk})
 
 
-class ExchangeProposalViewSet(viewsets.ModelViewSet):
-    queryset = ExchangeProposal.objects.all().order_by('-created_at')
+class ExchangeProposalViewSet(ExportMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = ExchangeProposal.objects.all().order_by('-created_at', '-id')
     serializer_class = ExchangeProposalSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ProposalCreateThrottle, WriteThrottle]
+    pagination_class = KeysetPagination
+    use_read_replica = True
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'ad_sender', 'ad_receiver']
     ordering_fields = ['created_at']
+    export_fields = {
+        'id': 'id',
+        'ad_sender': 'ad_sender_id',
+        'ad_receiver': 'ad_receiver_id',
+        'comment': 'comment',
+        'status': 'status',
+        'created_at': 'created_at',
+    }
+    sparse_required_columns = ('id', 'created_at')
+
+    def get_export_queryset(self):
+        # Выгрузка — только свои предложения: чужие комментарии целой
+        # таблицей не отдаём.
+        user = self.request.user
+        return super().get_export_queryset().filter(
+            Q(ad_sender__user=user) | Q(ad_receiver__user=user))
 
     def get_target_ad(self):
-        return get_object_or_404(Ad, pk=self.kwargs['pk'])
+        if not hasattr(self, '_target_ad'):
+            pk = self.kwargs.get('pk') or self.request.data.get('ad_receiver')
+            self._target_ad = get_object_or_404(Ad, pk=pk)
+        return self._target_ad
 
     def perform_create(self, serializer):
         serializer.save()
 
 
-class ProposalListView(LoginRequiredMixin, ListView):
+class ArchivedAdViewSet(viewsets.ReadOnlyModelViewSet):
+    """Свои объявления, перенесённые в архив командой archive."""
+    serializer_class = ArchivedAdSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    use_read_replica = True
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['category', 'condition']
+
+    def get_queryset(self):
+        return (ArchivedAd.objects.filter(user=self.request.user)
+                .order_by('-created_at', '-id'))
+
+
+class ArchivedProposalViewSet(viewsets.ReadOnlyModelViewSet):
+    """Архивные предложения, в которых участвовал пользователь."""
+    serializer_class = ArchivedProposalSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    use_read_replica = True
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'ad_sender', 'ad_receiver']
+
+    def get_queryset(self):
+        user = self.request.user
+        return (ArchivedProposal.objects
+                .filter(Q(sender_user=user) | Q(receiver_user=user))
+                .select_related('sender_user', 'receiver_user')
+                .order_by('-created_at', '-id'))
+
+
+class CycleViewSet(viewsets.ViewSet):
+    """
+    Циклы обмена A→B→…→A из ожидающих предложений, в которых участвует
+    пользователь; POST execute/ проводит цикл целиком.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [WriteThrottle]
+    serializer_class = CycleSerializer
+    max_suggestions = 20
+
+    def list(self, request):
+        ad_ids = Ad.objects.filter(user=request.user).values_list('pk', flat=True)
+        cycles = get_engine().suggest(list(ad_ids), limit=self.max_suggestions)
+        return Response(CycleSerializer(cycles, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def execute(self, request):
+        serializer = CycleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        proposals = serializer.validated_data['proposals']
+        try:
+            rejected = services.execute_cycle(proposals, request.user)
+        except services.NotParticipant:
+            return Response({'detail': 'Вы не участвуете в этом цикле.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        except services.NotACycle:
+            raise ValidationError({'proposals': ['Предложения не образуют цикл.']})
+        except services.AlreadyResolved:
+            return Response({'detail': 'Часть предложений уже закрыта.'},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({'proposals': proposals, 'rejected': rejected})
+
+
+class ProposalListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = ExchangeProposal
+    use_read_replica = True
     template_name = 'ads/proposal_list.html'
     context_object_name = 'proposals'
     paginate_by = 10
@@ -183,7 +507,7 @@ class ProposalListView(LoginRequiredMixin, ListView):
         user = self.request.user
         qs = super().get_queryset().select_related(
             'ad_sender__user', 'ad_receiver__user'
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
 
         view_type = self.request.GET.get('type', 'all')
         if view_type == 'sent':
@@ -216,25 +540,30 @@ class ProposalListView(LoginRequiredMixin, ListView):
             'receiver':      self.request.GET.get('receiver', ''),
             'status':        self.request.GET.get('status', ''),
             'status_choices': ExchangeProposal.STATUS_CHOICES,
+            'events_stream': stream_available(self.request),
         })
         return ctx
 
 
-class ProposalDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class ProposalDetailView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DetailView):
     model = ExchangeProposal
+    queryset = ExchangeProposal.objects.select_related(
+        'ad_sender__user', 'ad_receiver__user'
+    )
     template_name = 'ads/proposal_detail.html'
     context_object_name = 'proposal'
 
     def test_func(self):
         p = self.get_object()
         user = self.request.user
-        return (p.ad_sender.user == user) or (p.ad_receiver.user == user)
+        return user.pk in (p.ad_sender.user_id, p.ad_receiver.user_id)
 
 
 def proposal_update_status(request, pk, action):
-    proposal = get_object_or_404(ExchangeProposal, pk=pk)
+    proposal = get_object_or_404(
+        ExchangeProposal.objects.select_related('ad_receiver'), pk=pk)
 
-    if proposal.ad_receiver.user != request.user:
+    if proposal.ad_receiver.user_id != request.user.pk:
         messages.error(request, "Только получатель может изменить статус.")
         return redirect('proposal_detail', pk=pk)
 
@@ -242,33 +571,48 @@ def proposal_update_status(request, pk, action):
         messages.info(request, "Статус уже был изменён ранее.")
         return redirect('proposal_detail', pk=pk)
 
-    if action == 'accept':
-        with transaction.atomic():
-            sender_ad = proposal.ad_sender
-            receiver_ad = proposal.ad_receiver
-            owner_sender = sender_ad.user
-            owner_receiver = receiver_ad.user
-            sender_ad.user = owner_receiver
-            receiver_ad.user = owner_sender
+    try:
+        if action == 'accept':
+            services.accept_proposal(pk, request.user)
+            messages.success(
+                request, "Обмен успешно выполнен — объявления поменялись владельцами.")
 
-            sender_ad.save()
-            receiver_ad.save()
+        elif action == 'reject':
+            services.reject_proposal(pk, request.user)
+            messages.success(request, "Предложение обмена отклонено.")
 
-            proposal.status = 'accepted'
-            proposal.save()
+        else:
+            messages.error(request, "Неверное действие.")
 
-        messages.success(
-            request, "Обмен успешно выполнен — объявления поменялись владельцами.")
+    except services.NotReceiver:
+        messages.error(request, "Только получатель может изменить статус.")
+    except services.AlreadyResolved:
+        messages.info(request, "Статус уже был изменён ранее.")
+
+    return redirect('proposal_detail', pk=pk)
 
-    elif action == 'reject':
-        proposal.status = 'rejected'
-        proposal.save()
-        messages.success(request, "Предложение обмена отклонено.")
 
-    else:
-        messages.error(request, "Неверное действие.")
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
 
-    return redirect('proposal_detail', pk=pk)
+
+def ad_image(request, digest, width):
+    """
+    Миниатюра из хранилища. Путь задан содержимым файла и не меняется,
+    поэтому браузер и CDN могут хранить её год без перепроверки.
+    """
+    try:
+        stream = get_storage().open(thumbnail_path(digest, width))
+    except FileNotFoundError:
+        raise Http404('Нет такой миниатюры.')
+
+    def render():
+        return FileResponse(stream, content_type=CONTENT_TYPE)
+
+    response = conditional_response(request, make_etag(digest, width), None, render)
+    if response.status_code == 304:
+        stream.close()
+    response.headers['Cache-Control'] = f'public, max-age={IMAGE_MAX_AGE}, immutable'
+    return response
 
 
 def login(request):
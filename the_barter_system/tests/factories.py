@@ -0,0 +1,7 @@
+from ads.models import Ad
+
+
+def make_ad(user, title, **fields):
+    """Объявление с заполненными обязательными полями; fields их переопределяют."""
+    values = {'description': 'd', 'category': 'Спорт', 'condition': 'used', **fields}
+    return Ad.objects.create(user=user, title=title, **values)
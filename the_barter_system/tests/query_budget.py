@@ -0,0 +1,38 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Проверки числа SQL-запросов на endpoint.
+
+    assertQueryBudget(budget, fn) — fn укладывается в budget запросов.
+    assertConstantQueries(fn, grow) — число запросов fn не меняется после
+    grow(), который добавляет строки (N → M): нет N+1.
+    """
+
+    def capture_queries(self, fn, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as ctx:
+            result = fn()
+            if hasattr(result, 'render') and not getattr(result, 'is_rendered', True):
+                result.render()
+        return result, ctx.captured_queries
+
+    def _format_queries(self, queries):
+        return '\n'.join(f'  {i}. {q["sql"]}' for i, q in enumerate(queries, 1))
+
+    def assertQueryBudget(self, budget, fn, using=DEFAULT_DB_ALIAS):
+        result, queries = self.capture_queries(fn, using)
+        if len(queries) > budget:
+            self.fail(f'{len(queries)} запросов при бюджете {budget}:\n'
+                      f'{self._format_queries(queries)}')
+        return result
+
+    def assertConstantQueries(self, fn, grow, using=DEFAULT_DB_ALIAS):
+        _, before = self.capture_queries(fn, using)
+        grow()
+        result, after = self.capture_queries(fn, using)
+        if len(before) != len(after):
+            self.fail(f'Число запросов растёт с данными: {len(before)} → '
+                      f'{len(after)}:\n{self._format_queries(after)}')
+        return result
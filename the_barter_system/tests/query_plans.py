@@ -0,0 +1,64 @@
+import json
+import re
+
+from django.db import connections, transaction
+
+
+FULL_SCAN = 'full_scan'
+TEMP_SORT = 'temp_sort'
+
+# "SCAN ads_ad" без "USING ... INDEX" — чтение всей таблицы. Поиск по FTS5
+# выглядит как "SCAN ads_ad_fts VIRTUAL TABLE INDEX ..." и сканом не является.
+SQLITE_FULL_SCAN_RE = re.compile(
+    r'\bSCAN (?!CONSTANT ROW)(\S+)(?!.*(USING .*INDEX|VIRTUAL TABLE INDEX))')
+SQLITE_TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|DISTINCT|GROUP BY)')
+
+
+def _postgres_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _postgres_nodes(child)
+
+
+def explain(queryset):
+    """План запроса в виде списка (проблема, строка плана)."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=queryset.db):
+            with connection.cursor() as cursor:
+                # На маленьких тестовых таблицах планировщик предпочитает
+                # Seq Scan; запрещаем его, чтобы проверялась сама
+                # возможность использовать индекс.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        problems = []
+        for node in _postgres_nodes(plan):
+            if node['Node Type'] == 'Seq Scan':
+                problems.append((FULL_SCAN, node.get('Relation Name', '')))
+            elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                problems.append((TEMP_SORT, ', '.join(node.get('Sort Key', []))))
+        return problems
+
+    problems = []
+    for line in queryset.explain().splitlines():
+        if SQLITE_TEMP_SORT_RE.search(line):
+            problems.append((TEMP_SORT, line.strip()))
+        elif SQLITE_FULL_SCAN_RE.search(line):
+            problems.append((FULL_SCAN, line.strip()))
+    return problems
+
+
+class QueryPlanAssertionsMixin:
+    """
+    assertIndexedPlan(qs) падает, если план запроса читает таблицу целиком
+    или сортирует во временном B-дереве. allow перечисляет осознанные
+    исключения (например, TEMP_SORT), которые нужно пояснить в тесте.
+    """
+
+    def assertIndexedPlan(self, queryset, allow=(), msg=None):
+        problems = [(kind, line) for kind, line in explain(queryset)
+                    if kind not in allow]
+        if problems:
+            details = '\n'.join(f'  {kind}: {line}' for kind, line in problems)
+            self.fail(msg or f'План запроса не использует индексы:\n{details}\n'
+                             f'SQL: {queryset.query}')
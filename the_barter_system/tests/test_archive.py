@@ -0,0 +1,103 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ads import archive, services
+from ads.models import Ad, ArchivedAd, ArchivedProposal, CategoryFacet, ExchangeProposal
+
+from .factories import make_ad
+
+User = get_user_model()
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.carol = User.objects.create_user(username='carol', password='pass')
+        self.bike = make_ad(self.alice, 'Велосипед')
+        self.scooter = make_ad(self.bob, 'Самокат')
+
+    def days_ago(self, days):
+        return timezone.now() - timedelta(days=days)
+
+    def propose(self, status='waiting', created=0, resolved=None, sender=None,
+                receiver=None):
+        proposal = ExchangeProposal.objects.create(
+            ad_sender=sender or self.bike, ad_receiver=receiver or self.scooter,
+            status=status)
+        ExchangeProposal.objects.filter(pk=proposal.pk).update(
+            created_at=self.days_ago(created),
+            resolved_at=None if resolved is None else self.days_ago(resolved))
+        return proposal
+
+    def age_ads(self, days, *ads):
+        Ad.objects.filter(pk__in=[ad.pk for ad in ads]).update(
+            updated_at=self.days_ago(days))
+
+    def test_resolution_sets_resolved_at(self):
+        proposal = self.propose()
+        services.reject_proposal(proposal.pk, self.bob)
+        proposal.refresh_from_db()
+        self.assertIsNotNone(proposal.resolved_at)
+
+    def test_old_resolved_proposals_are_moved_in_batches(self):
+        old = [self.propose('rejected', created=200, resolved=120),
+               self.propose('accepted', created=200),
+               self.propose('rejected', created=150, resolved=100)]
+        recent = self.propose('rejected', created=200, resolved=5)
+        waiting = self.propose('waiting', created=200)
+
+        result = archive.archive(proposal_days=90, batch_size=2)
+        self.assertEqual(result, (3, 0))
+        self.assertEqual(set(ExchangeProposal.objects.values_list('pk', flat=True)),
+                         {recent.pk, waiting.pk})
+        row = ArchivedProposal.objects.get(pk=old[0].pk)
+        self.assertEqual((row.ad_sender, row.ad_receiver), (self.bike.pk, self.scooter.pk))
+        self.assertEqual((row.sender_user, row.receiver_user), (self.alice, self.bob))
+        self.assertEqual(row.ad_sender_title, 'Велосипед')
+
+    def test_inactive_ads_are_moved_with_their_proposals(self):
+        ball = make_ad(self.carol, 'Мяч')
+        kept = make_ad(self.carol, 'Ракетка')
+        self.propose('rejected', created=400, resolved=20, sender=ball)
+        self.propose('waiting', created=500, sender=kept)
+        self.age_ads(400, ball, kept)
+
+        result = archive.archive(proposal_days=90, ad_days=365)
+        self.assertEqual(result, (1, 1))
+        self.assertFalse(Ad.objects.filter(pk=ball.pk).exists())
+        self.assertTrue(Ad.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(ArchivedAd.objects.get().title, 'Мяч')
+        self.assertEqual(CategoryFacet.objects.get(condition='used').count, 3)
+
+    def test_api_shows_own_archive_read_only(self):
+        proposal = self.propose('rejected', created=200, resolved=200)
+        self.age_ads(400, self.bike, self.scooter)
+        archive.archive()
+
+        self.client.login(username='bob', password='pass')
+        rows = self.client.get('/api/archive/proposals/').json()['results']
+        self.assertEqual([(r['id'], r['sender'], r['receiver']) for r in rows],
+                         [(proposal.pk, 'alice', 'bob')])
+        ads = self.client.get('/api/archive/ads/').json()['results']
+        self.assertEqual([ad['id'] for ad in ads], [self.scooter.pk])
+        self.assertEqual(self.client.post('/api/archive/ads/', {}).status_code, 405)
+
+        self.client.login(username='carol', password='pass')
+        self.assertEqual(self.client.get('/api/archive/proposals/').json()['results'], [])
+        response = self.client.get(f'/api/archive/proposals/{proposal.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_dry_run_changes_nothing(self):
+        self.propose('rejected', created=200, resolved=200)
+        out = io.StringIO()
+        call_command('archive', '--dry-run', stdout=out)
+        self.assertIn('предложений 1, объявлений 0', out.getvalue())
+        self.assertEqual(ExchangeProposal.objects.count(), 1)
+        call_command('archive', stdout=io.StringIO())
+        self.assertEqual(ExchangeProposal.objects.count(), 0)
@@ -0,0 +1,65 @@
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import resolve
+from django.utils.module_loading import import_string
+
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class AsyncReadApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice')
+        cls.bob = User.objects.create_user(username='bob')
+        cls.ads = [
+            Ad.objects.create(user=cls.alice, title=f'Лампа {i}', description='d',
+                              category='Дом' if i % 2 else 'Спорт', condition='new')
+            for i in range(15)
+        ]
+        cls.bobs = Ad.objects.create(user=cls.bob, title='Стол', description='d',
+                                     category='Дом', condition='used')
+        ExchangeProposal.objects.create(ad_sender=cls.bobs, ad_receiver=cls.ads[0])
+
+    def test_views_and_middleware_are_async(self):
+        for url in ('/api/async/ads/', '/api/async/ads/1/', '/api/async/proposals/'):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    async def test_list_pages_by_cursor(self):
+        first = (await self.async_client.get('/api/async/ads/')).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['results'][0]['user'], 'bob')
+        second = (await self.async_client.get(first['next'])).json()
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 16)
+        self.assertIsNone(second['next'])
+
+    async def test_list_filters_and_search(self):
+        r = await self.async_client.get('/api/async/ads/?category=Дом&condition=used')
+        self.assertEqual([row['title'] for row in r.json()['results']], ['Стол'])
+        r = await self.async_client.get('/api/async/ads/?q=стол')
+        self.assertEqual([row['id'] for row in r.json()['results']], [self.bobs.pk])
+        r = await self.async_client.get('/api/async/ads/?cursor=broken')
+        self.assertEqual(r.status_code, 404)
+
+    async def test_detail(self):
+        r = await self.async_client.get(f'/api/async/ads/{self.bobs.pk}/')
+        self.assertEqual(r.json()['title'], 'Стол')
+        r = await self.async_client.get('/api/async/ads/999999/')
+        self.assertEqual(r.status_code, 404)
+
+    async def test_my_proposals(self):
+        r = await self.async_client.get('/api/async/proposals/')
+        self.assertEqual(r.status_code, 403)
+        await self.async_client.aforce_login(self.alice)
+        r = (await self.async_client.get('/api/async/proposals/?type=received')).json()
+        self.assertEqual(r['count'], 1)
+        self.assertEqual(r['results'][0]['ad_sender'], self.bobs.pk)
+        r = (await self.async_client.get('/api/async/proposals/?type=sent')).json()
+        self.assertEqual(r['count'], 0)
@@ -0,0 +1,68 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+from django.urls import get_resolver
+
+from ads.models import Ad, CategoryFacet, ExchangeProposal
+
+User = get_user_model()
+
+
+class BenchCommandsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def seed(self, **options):
+        options = {'users': 20, 'ads': 200, 'proposals': 500, 'batch_size': 70,
+                   **options}
+        call_command('seed_bench', stdout=io.StringIO(), **options)
+
+    def test_seed_bench_creates_skewed_data(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='bench_').count(), 20)
+        self.assertEqual(Ad.objects.count(), 200)
+        self.assertEqual(ExchangeProposal.objects.count(), 500)
+        self.assertFalse(ExchangeProposal.objects.filter(
+            ad_sender__user=F('ad_receiver__user')).exists())
+        waiting = ExchangeProposal.objects.filter(status='waiting').count()
+        accepted = ExchangeProposal.objects.filter(status='accepted').count()
+        self.assertGreater(waiting, accepted)
+        self.assertEqual(sum(CategoryFacet.objects.values_list('count', flat=True)), 200)
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_bench_routes_covers_named_routes_and_compares(self):
+        self.seed()
+        first = Path(self.dir.name, 'first.json')
+        call_command('bench_routes', repeat=2, warmup=0, output=str(first),
+                     stdout=io.StringIO())
+        results = json.loads(first.read_text(encoding='utf-8'))
+        routes = results['routes']
+        failed = {name: stats['status'] for name, stats in routes.items()
+                  if stats['errors']}
+        self.assertEqual(failed, {})
+        self.assertEqual(results['rows']['ads'], 200)
+        self.assertEqual(routes['ad_detail']['queries'], 2)
+
+        named = {name for name in get_resolver().reverse_dict
+                 if isinstance(name, str) and '-' not in name}
+        covered = {stats['route'] for stats in routes.values()}
+        self.assertEqual(named - covered, {'proposal_events', 'ad_image'})
+
+        # Прошлый запуск с меньшим числом запросов — это регрессия.
+        for stats in routes.values():
+            stats['queries'] -= 1
+        first.write_text(json.dumps(results), encoding='utf-8')
+        with self.assertRaises(CommandError):
+            call_command('bench_routes', repeat=1, warmup=0, only='api/ads',
+                         compare=str(first), fail_on_regression=True,
+                         stdout=io.StringIO())
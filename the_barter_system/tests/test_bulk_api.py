@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ads.facets import get_facets
+from ads.models import Ad
+from ads.search import search_ads
+
+User = get_user_model()
+
+
+class BulkAdApiTests(TestCase):
+    url = '/api/ads/bulk/'
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.own = Ad.objects.create(user=self.alice, title='Лампа', description='d',
+                                     category='Дом', condition='new')
+        self.foreign = Ad.objects.create(user=self.bob, title='Стол', description='d',
+                                         category='Дом', condition='used')
+        self.client.force_login(self.alice)
+
+    def send(self, method, payload):
+        return getattr(self.client, method)(
+            self.url, payload, content_type='application/json')
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.send('post', [{'title': 'x'}]).status_code, 403)
+
+    def test_create_reports_per_item_results(self):
+        r = self.send('post', [
+            {'title': 'Гитара', 'description': 'd', 'category': 'Музыка',
+             'condition': 'used'},
+            {'title': '', 'category': 'Музыка'},
+            {'title': 'Барабан', 'description': 'd', 'category': 'Музыка',
+             'condition': 'new'},
+        ])
+        self.assertEqual(r.status_code, 207)
+        results = r.json()['results']
+        self.assertEqual([row['status'] for row in results],
+                         ['created', 'error', 'created'])
+        self.assertIn('title', results[1]['errors'])
+        guitar = Ad.objects.get(pk=results[0]['id'])
+        self.assertEqual(guitar.user, self.alice)
+        self.assertEqual(list(search_ads(Ad.objects.all(), 'гитара')), [guitar])
+        music = next(f for f in get_facets() if f['category'] == 'Музыка')
+        self.assertEqual(music['conditions'], {'new': 1, 'used': 1})
+
+    def test_update_enforces_ownership(self):
+        r = self.send('patch', [
+            {'id': self.own.pk, 'title': 'Торшер', 'category': 'Свет'},
+            {'id': self.foreign.pk, 'title': 'Моё'},
+            {'id': 999999, 'title': 'Нет'},
+            {'id': self.own.pk, 'condition': 'broken'},
+        ])
+        results = r.json()['results']
+        self.assertEqual([row['status'] for row in results],
+                         ['updated', 'error', 'error', 'error'])
+        self.own.refresh_from_db()
+        self.foreign.refresh_from_db()
+        self.assertEqual((self.own.title, self.own.category), ('Торшер', 'Свет'))
+        self.assertEqual(self.foreign.title, 'Стол')
+        self.assertEqual(list(search_ads(Ad.objects.all(), 'торшер')), [self.own])
+        self.assertEqual({f['category']: f['count'] for f in get_facets()},
+                         {'Дом': 1, 'Свет': 1})
+
+    def test_repeated_id_is_rejected(self):
+        r = self.send('patch', [
+            {'id': self.own.pk, 'category': 'Свет'},
+            {'id': self.own.pk, 'category': 'Сад'},
+        ])
+        self.assertEqual(r.status_code, 207)
+        results = r.json()['results']
+        self.assertEqual([row['status'] for row in results], ['updated', 'error'])
+        self.assertIn('id', results[1]['errors'])
+        self.own.refresh_from_db()
+        self.assertEqual(self.own.category, 'Свет')
+        self.assertEqual({f['category']: f['count'] for f in get_facets()},
+                         {'Дом': 1, 'Свет': 1})
+
+        r = self.send('delete', [self.own.pk, self.own.pk])
+        self.assertEqual([row['status'] for row in r.json()['results']],
+                         ['deleted', 'error'])
+        self.assertEqual({f['category']: f['count'] for f in get_facets()}, {'Дом': 1})
+
+    def test_delete(self):
+        r = self.send('delete', [self.own.pk, self.foreign.pk])
+        self.assertEqual(r.status_code, 207)
+        self.assertFalse(Ad.objects.filter(pk=self.own.pk).exists())
+        self.assertTrue(Ad.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_rejects_non_list_payload(self):
+        self.assertEqual(self.send('post', {'title': 'x'}).status_code, 400)
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ads import services
+from ads.models import Ad, ExchangeProposal
+from ads.serializers import AdSerializer
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.ad = Ad.objects.create(user=self.alice, title='Лампа', description='d',
+                                    category='Дом', condition='new')
+        self.other = Ad.objects.create(user=self.bob, title='Стол', description='d',
+                                       category='Дом', condition='used')
+
+    def revalidate(self, url, response, **extra):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **extra)
+
+    def test_updated_at_follows_every_write(self):
+        before = self.ad.updated_at
+        self.ad.title = 'Лампа 2'
+        self.ad.save()
+        self.assertGreater(self.ad.updated_at, before)
+
+        before = self.ad.updated_at
+        services.bulk_update_ads([self.ad], ['title'])
+        self.ad.refresh_from_db()
+        self.assertGreater(self.ad.updated_at, before)
+
+        before = self.ad.updated_at
+        proposal = ExchangeProposal.objects.create(ad_sender=self.other,
+                                                   ad_receiver=self.ad)
+        services.accept_proposal(proposal.pk, self.alice)
+        self.ad.refresh_from_db()
+        self.assertGreater(self.ad.updated_at, before)
+
+    def test_api_detail_304_skips_serializer(self):
+        url = f'/api/ads/{self.ad.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        self.assertFalse(first['ETag'].startswith('W/'))
+
+        with mock.patch.object(AdSerializer, 'to_representation') as serialize:
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second['ETag'], first['ETag'])
+        serialize.assert_not_called()
+
+        self.ad.title = 'Лампа 2'
+        self.ad.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_api_list_etag_tracks_page_rows(self):
+        url = '/api/ads/?category=Дом'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        self.other.delete()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_html_detail_etag_depends_on_user(self):
+        url = reverse('ad_detail', kwargs={'pk': self.ad.pk})
+        first = self.client.get(url)
+        with mock.patch('django.views.generic.detail.'
+                        'SingleObjectTemplateResponseMixin.render_to_response') as render:
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        render.assert_not_called()
+
+        self.client.force_login(self.alice)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
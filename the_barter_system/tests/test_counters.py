@@ -0,0 +1,155 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from ads import archive, cache, purge, services
+from ads.models import Ad, ExchangeProposal
+from ads.pagination import KeysetPagination, KeysetPaginator
+from ads.views import AdViewSet
+
+from .factories import make_ad
+from .query_plans import QueryPlanAssertionsMixin
+
+User = get_user_model()
+
+
+class ProposalCounterTests(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.bike = make_ad(self.alice, 'Велосипед')
+        self.scooter = make_ad(self.bob, 'Самокат')
+        self.ball = make_ad(self.bob, 'Мяч')
+
+    def counts(self, ad):
+        ad = Ad.all_objects.get(pk=ad.pk)
+        return (ad.proposals_received_count, ad.proposals_waiting_count,
+                ad.proposals_sent_count)
+
+    def test_create_and_resolve_update_counters(self):
+        first = ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        second = ExchangeProposal.objects.create(ad_sender=self.ball, ad_receiver=self.bike)
+        self.assertEqual(self.counts(self.bike), (2, 2, 0))
+        self.assertEqual(self.counts(self.scooter), (0, 0, 1))
+
+        services.reject_proposal(second.pk, self.alice)
+        self.assertEqual(self.counts(self.bike), (2, 1, 0))
+        # Повторное отклонение не уменьшает счётчик ещё раз.
+        with self.assertRaises(services.AlreadyResolved):
+            services.reject_proposal(second.pk, self.alice)
+        services.accept_proposal(first.pk, self.alice)
+        self.assertEqual(self.counts(self.bike), (2, 0, 0))
+
+    def test_accept_rejects_competitors_in_bulk(self):
+        for ad in (self.scooter, self.ball):
+            ExchangeProposal.objects.create(ad_sender=ad, ad_receiver=self.bike)
+        chosen = ExchangeProposal.objects.create(ad_sender=self.bike, ad_receiver=self.scooter)
+        services.accept_proposal(chosen.pk, self.bob)
+
+        self.assertEqual(self.counts(self.scooter), (1, 0, 1))
+        # Встречные предложения к велосипеду отклонены вместе с принятием.
+        self.assertEqual(self.counts(self.bike), (2, 0, 1))
+
+    def test_api_exposes_read_only_counters(self):
+        ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        data = self.client.get(f'/api/ads/{self.bike.pk}/').json()
+        self.assertEqual((data['proposals_received_count'], data['proposals_waiting_count'],
+                          data['proposals_sent_count']), (1, 1, 0))
+
+        self.client.login(username='alice', password='pass')
+        self.client.patch(f'/api/ads/{self.bike.pk}/', {'proposals_received_count': 100},
+                          content_type='application/json')
+        self.assertEqual(self.counts(self.bike), (1, 1, 0))
+        self.assertContains(self.client.get('/'), 'Предложений: 1')
+
+    def test_counter_changes_bump_only_ad_pages(self):
+        list_version = cache.get_versions([cache.GLOBAL])
+        self.client.get(f'/api/ads/{self.bike.pk}/')
+
+        ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        data = self.client.get(f'/api/ads/{self.bike.pk}/').json()
+        self.assertEqual(data['proposals_received_count'], 1)
+        # Списки не сбрасываются на каждое предложение.
+        self.assertEqual(cache.get_versions([cache.GLOBAL]), list_version)
+
+    def test_ordering_by_received_uses_cursor_and_index(self):
+        for ad in (self.bike, self.ball):
+            ExchangeProposal.objects.create(ad_sender=ad, ad_receiver=self.scooter)
+        ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+
+        with mock.patch.object(KeysetPagination, 'page_size', 1):
+            data = self.client.get('/api/ads/?ordering=-proposals_received_count').json()
+            ids = [ad['id'] for ad in data['results']]
+            while data['next']:
+                self.assertIn('cursor=', data['next'])
+                data = self.client.get(data['next']).json()
+                ids += [ad['id'] for ad in data['results']]
+        self.assertEqual(ids, [self.scooter.pk, self.bike.pk, self.ball.pk])
+
+        request = APIRequestFactory().get('/', {'ordering': '-proposals_received_count'})
+        view = AdViewSet(action='list', action_map={'get': 'list'},
+                         kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        qs = view.filter_queryset(view.get_queryset())
+        paginator = KeysetPaginator(qs, 10, AdViewSet.keyset_orderings[1])
+        position = Ad(id=10 ** 9, created_at=timezone.now(), proposals_received_count=1)
+        for cursor in (None, paginator.encode_cursor(position)):
+            self.assertIndexedPlan(paginator.page_queryset(cursor)[0])
+
+    def test_archived_proposals_still_count_purged_do_not(self):
+        proposal = ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        services.reject_proposal(proposal.pk, self.alice)
+        ExchangeProposal.objects.filter(pk=proposal.pk).update(
+            resolved_at=timezone.now() - timedelta(days=200))
+        ExchangeProposal.objects.create(ad_sender=self.ball, ad_receiver=self.bike)
+        archive.archive(proposal_days=90)
+        self.assertEqual(self.counts(self.bike), (2, 1, 0))
+
+        services.delete_ads(Ad.objects.filter(pk=self.ball.pk))
+        purge.process_pending()
+        self.assertEqual(self.counts(self.bike), (1, 0, 0))
+
+    def test_soft_delete_updates_other_side_at_once(self):
+        ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        ExchangeProposal.objects.create(ad_sender=self.bike, ad_receiver=self.ball)
+        services.delete_ads(Ad.objects.filter(pk=self.bike.pk))
+        self.assertEqual(self.counts(self.scooter), (0, 0, 0))
+        self.assertEqual(self.counts(self.ball), (0, 0, 0))
+
+        purge.process_pending()
+        self.assertEqual(self.counts(self.scooter), (0, 0, 0))
+        self.assertEqual(self.counts(self.ball), (0, 0, 0))
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено объявлений: 0', out.getvalue())
+
+    def test_accept_after_concurrent_delete(self):
+        proposal = ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        lock_ads = services._lock_ads
+
+        def delete_first(ad_ids, using):
+            services.delete_ads(Ad.objects.filter(pk=self.bike.pk), using)
+            return lock_ads(ad_ids, using)
+
+        with mock.patch.object(services, '_lock_ads', side_effect=delete_first):
+            with self.assertRaises(services.AlreadyResolved):
+                services.accept_proposal(proposal.pk, self.alice)
+        self.assertEqual(Ad.objects.get(pk=self.scooter.pk).user, self.bob)
+
+    def test_reconcile_repairs_drift(self):
+        ExchangeProposal.objects.create(ad_sender=self.scooter, ad_receiver=self.bike)
+        Ad.objects.filter(pk=self.bike.pk).update(proposals_received_count=7,
+                                                  proposals_waiting_count=0)
+        Ad.objects.filter(pk=self.ball.pk).update(proposals_sent_count=3)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', '--batch-size', '2', stdout=out)
+        self.assertIn('Исправлено объявлений: 2', out.getvalue())
+        self.assertEqual(self.counts(self.bike), (1, 1, 0))
+        self.assertEqual(self.counts(self.ball), (0, 0, 0))
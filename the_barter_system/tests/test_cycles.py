@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from ads import services
+from ads.cycles import CycleGraph, get_engine
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class CycleGraphTests(SimpleTestCase):
+    def graph(self, *edges):
+        graph = CycleGraph()
+        for pk, (sender, receiver) in enumerate(edges, 1):
+            graph.add(pk, sender, receiver)
+        return graph
+
+    def test_finds_cycle_through_edge_in_canonical_form(self):
+        graph = self.graph((3, 1), (1, 2), (2, 3), (2, 4))
+        cycles = graph.cycles_through(2, 3, max_length=5)
+        self.assertEqual([(c.ads, c.proposals) for c in cycles], [((1, 2, 3), (2, 3, 1))])
+
+    def test_respects_length_bounds(self):
+        ring = self.graph(*[(i, (i + 1) % 6) for i in range(6)])
+        self.assertEqual(ring.cycles_through(0, 1, max_length=5), [])
+        self.assertEqual(len(ring.cycles_through(0, 1, max_length=6)), 1)
+        swap = self.graph((1, 2), (2, 1))
+        self.assertEqual(swap.cycles_through(1, 2, max_length=5), [])
+
+    def test_incremental_updates(self):
+        graph = self.graph((1, 2), (2, 3))
+        self.assertEqual(graph.cycles_through(1, 2, max_length=3), [])
+        graph.add(10, 3, 1)
+        graph.add(11, 3, 1)
+        self.assertEqual(graph.edge_count, 4)
+        graph.discard(10, 3, 1)
+        self.assertEqual(graph.cycles_through(1, 2, max_length=3)[0].proposals, (1, 2, 11))
+        graph.discard(11, 3, 1)
+        self.assertEqual(graph.cycles_through(1, 2, max_length=3), [])
+        self.assertEqual(graph.edge_count, 2)
+
+
+class CycleApiTests(TestCase):
+    def setUp(self):
+        get_engine.cache_clear()
+        self.users = [User.objects.create_user(username=name)
+                      for name in ('alice', 'bob', 'carol', 'dave')]
+        self.ads = [Ad.objects.create(user=user, title=user.username, description='d',
+                                      category='Дом', condition='new')
+                    for user in self.users]
+        a, b, c, d = self.ads
+        self.cycle = [ExchangeProposal.objects.create(ad_sender=s, ad_receiver=r)
+                      for s, r in ((a, b), (b, c), (c, a))]
+        self.outside = ExchangeProposal.objects.create(ad_sender=d, ad_receiver=a)
+
+    def test_suggests_cycle_to_participant_only(self):
+        self.client.force_login(self.users[1])
+        data = self.client.get('/api/cycles/').json()
+        self.assertEqual(data, [{'ads': [a.pk for a in self.ads[:3]],
+                                 'proposals': [p.pk for p in self.cycle]}])
+        self.client.force_login(self.users[3])
+        self.assertEqual(self.client.get('/api/cycles/').json(), [])
+
+    def test_execute_rotates_owners_atomically(self):
+        self.client.force_login(self.users[2])
+        r = self.client.post('/api/cycles/execute/',
+                             {'proposals': [p.pk for p in self.cycle]},
+                             content_type='application/json')
+        self.assertEqual(r.json()['rejected'], 1)
+        owners = [Ad.objects.get(pk=ad.pk).user.username for ad in self.ads[:3]]
+        # alice просила B, bob — C, carol — A.
+        self.assertEqual(owners, ['carol', 'alice', 'bob'])
+        self.outside.refresh_from_db()
+        self.assertEqual(self.outside.status, 'rejected')
+
+    def test_execute_refuses_stale_or_foreign_cycles(self):
+        ids = [p.pk for p in self.cycle]
+        self.client.force_login(self.users[3])
+        post = lambda ids: self.client.post('/api/cycles/execute/', {'proposals': ids},
+                                            content_type='application/json')
+        self.assertEqual(post(ids).status_code, 403)
+        self.client.force_login(self.users[0])
+        self.assertEqual(post(ids[:2]).status_code, 400)
+        services.reject_proposal(self.cycle[1].pk, self.users[2])
+        self.assertEqual(post(ids).status_code, 409)
+        self.assertEqual(Ad.objects.get(pk=self.ads[0].pk).user, self.users[0])
+        self.assertFalse(ExchangeProposal.objects.filter(status='accepted').exists())
+
+    def test_engine_drops_closed_proposals(self):
+        engine = get_engine()
+        self.assertEqual(len(engine.suggest([self.ads[0].pk])), 1)
+        ExchangeProposal.objects.filter(pk=self.cycle[0].pk).update(status='rejected')
+        self.assertEqual(engine.suggest([self.ads[0].pk]), [])
+        self.assertEqual(engine.graph.edge_count, 3)
@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.ads = [
+            Ad.objects.create(user=self.alice, title=f'Ad{i}', description='d,"q"',
+                              category='Cat1' if i % 2 else 'Cat2', condition='new')
+            for i in range(25)
+        ]
+        ExchangeProposal.objects.create(ad_sender=self.ads[0], ad_receiver=self.ads[1])
+        ExchangeProposal.objects.create(ad_sender=self.ads[2], ad_receiver=self.ads[1],
+                                        status='rejected')
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_ads_ndjson_is_streamed_in_one_request(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/ads/export/')
+            rows = [json.loads(line) for line in self.body(r).splitlines()]
+        self.assertTrue(r.streaming)
+        self.assertEqual(r['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]['user'], 'alice')
+        self.assertEqual(rows[0]['id'], self.ads[-1].pk)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_ads_csv_honours_filters(self):
+        r = self.client.get('/api/ads/export/?as=csv&category=Cat1')
+        rows = list(csv.DictReader(io.StringIO(self.body(r))))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0]['description'], 'd,"q"')
+        self.assertIn('attachment; filename="ad.csv"', r['Content-Disposition'])
+
+    def test_proposals_export(self):
+        self.client.force_login(self.alice)
+        r = self.client.get('/api/proposals/export/?status=rejected')
+        rows = [json.loads(line) for line in self.body(r).splitlines()]
+        self.assertEqual([row['ad_sender'] for row in rows], [self.ads[2].pk])
+
+    def test_proposals_export_is_limited_to_own(self):
+        bob = User.objects.create_user(username='bob')
+        bobs = Ad.objects.create(user=bob, title='Bob', description='d',
+                                 category='Cat1', condition='new')
+        mine = ExchangeProposal.objects.create(ad_sender=bobs, ad_receiver=self.ads[3])
+        carol = User.objects.create_user(username='carol')
+        self.client.force_login(carol)
+        self.assertEqual(self.body(self.client.get('/api/proposals/export/')), '')
+        self.client.force_login(bob)
+        rows = [json.loads(line) for line in
+                self.body(self.client.get('/api/proposals/export/')).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [mine.pk])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/ads/export/?as=xml').status_code, 400)
@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ads.facets import get_facets
+from ads.models import Ad, CategoryFacet
+
+User = get_user_model()
+
+
+class CategoryFacetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.ad1 = Ad.objects.create(user=self.alice, title='A1', description='d',
+                                     category='Книги', condition='new')
+        self.ad2 = Ad.objects.create(user=self.alice, title='A2', description='d',
+                                     category='Книги', condition='used')
+        self.ad3 = Ad.objects.create(user=self.bob, title='B1', description='d',
+                                     category='Спорт', condition='used')
+
+    def facets(self):
+        return {f['category']: (f['count'], f['conditions']) for f in get_facets()}
+
+    def test_counts_follow_create_update_delete(self):
+        self.assertEqual(self.facets(), {
+            'Книги': (2, {'new': 1, 'used': 1}),
+            'Спорт': (1, {'used': 1}),
+        })
+        self.ad2.category = 'Спорт'
+        self.ad2.save()
+        self.ad1.condition = 'used'
+        self.ad1.save()
+        self.ad3.delete()
+        self.assertEqual(self.facets(), {
+            'Книги': (1, {'used': 1}),
+            'Спорт': (1, {'used': 1}),
+        })
+
+    def test_owner_change_keeps_counts(self):
+        ad = Ad.objects.get(pk=self.ad1.pk)
+        ad.user = self.bob
+        ad.save()
+        self.assertEqual(self.facets()['Книги'], (2, {'new': 1, 'used': 1}))
+
+    def test_drifted_count_does_not_block_delete(self):
+        CategoryFacet.objects.filter(category='Спорт').update(count=0)
+        self.ad3.delete()
+        self.assertFalse(Ad.objects.filter(pk=self.ad3.pk).exists())
+        self.assertEqual(CategoryFacet.objects.get(category='Спорт').count, 0)
+
+    def test_rebuild_command(self):
+        CategoryFacet.objects.update(count=99)
+        call_command('rebuild_facets', stdout=StringIO())
+        self.assertEqual(self.facets()['Спорт'], (1, {'used': 1}))
+
+    def test_list_page_and_api_read_facets(self):
+        r = self.client.get(reverse('ad_list'))
+        self.assertContains(r, 'Книги (2)')
+        data = self.client.get('/api/ads/facets/').json()
+        self.assertEqual(data[0], {'category': 'Книги', 'count': 2,
+                                   'conditions': {'new': 1, 'used': 1}})
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.bike = Ad.objects.create(user=self.alice, title='Велосипед',
+                                      description='очень длинное описание ' * 50,
+                                      category='Спорт', condition='used')
+        self.scooter = Ad.objects.create(user=self.bob, title='Самокат', description='d',
+                                         category='Спорт', condition='new')
+        self.proposal = ExchangeProposal.objects.create(
+            ad_sender=self.bike, ad_receiver=self.scooter, comment='меняю')
+
+    def ad_select(self, queries):
+        return next(q['sql'] for q in queries.captured_queries
+                    if q['sql'].startswith('SELECT "ads_ad"."id"'))
+
+    def test_fields_trim_response_and_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/ads/?fields=title,user')
+        rows = response.json()['results']
+        self.assertEqual(rows, [{'user': 'bob', 'title': 'Самокат'},
+                                {'user': 'alice', 'title': 'Велосипед'}])
+        sql = self.ad_select(queries)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"category"', sql)
+        # Отложенные колонки не дочитываются по одной на строку.
+        self.assertEqual(sum('FROM "ads_ad"' in q['sql'] for q in queries.captured_queries), 1)
+
+    def test_omit_and_retrieve(self):
+        data = self.client.get(f'/api/ads/{self.bike.pk}/?omit=description,image_url').json()
+        self.assertNotIn('description', data)
+        self.assertEqual(data['title'], 'Велосипед')
+
+        full = self.client.get(f'/api/ads/{self.bike.pk}/')
+        sparse = self.client.get(f'/api/ads/{self.bike.pk}/?fields=id')
+        self.assertEqual(sparse.json(), {'id': self.bike.pk})
+        self.assertNotEqual(full['ETag'], sparse['ETag'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/ads/?fields=title,secret&omit=nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'omit'})
+
+    def test_writes_return_full_representation(self):
+        self.client.login(username='alice', password='pass')
+        response = self.client.patch(f'/api/ads/{self.bike.pk}/?fields=id', {'title': 'Байк'},
+                                     content_type='application/json')
+        self.assertEqual(response.json()['title'], 'Байк')
+        self.assertIn('description', response.json())
+
+    def test_proposals_fields(self):
+        self.client.login(username='alice', password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/proposals/?fields=id,status').json()
+        self.assertEqual(data['results'], [{'id': self.proposal.pk, 'status': 'waiting'}])
+        sql = next(q['sql'] for q in queries.captured_queries
+                   if 'FROM "ads_exchangeproposal"' in q['sql'])
+        self.assertNotIn('"comment"', sql)
@@ -0,0 +1,179 @@
+import io
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ads import images
+from ads.models import Ad, AdImage
+
+User = get_user_model()
+
+
+def png_bytes(width, height, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class LocalFetcher(images.BaseFetcher):
+    """Вместо сети — заранее заданные ответы по URL."""
+    files = {}
+    calls = []
+
+    def fetch(self, url, max_bytes):
+        self.calls.append(url)
+        if url not in self.files:
+            raise images.ImageError('404')
+        return self.files[url]
+
+
+class ImageIngestionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'ads_images': {'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                           'OPTIONS': {'location': self.media}},
+        }
+        settings = override_settings(
+            STORAGES=storages, ADS_IMAGE_FETCHER='tests.test_images.LocalFetcher',
+            ADS_IMAGE_SIZES=(160, 320, 640))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        LocalFetcher.files = {'http://img.test/big.png': png_bytes(800, 400),
+                              'http://img.test/small.png': png_bytes(100, 50, 'blue')}
+        LocalFetcher.calls = []
+        self.user = User.objects.create_user(username='alice')
+
+    def make_ad(self, image_url):
+        return Ad.objects.create(user=self.user, title='Велосипед', description='d',
+                                 category='Спорт', condition='used', image_url=image_url)
+
+    def test_save_queues_image_and_worker_builds_thumbnails(self):
+        ad = self.make_ad('http://img.test/big.png')
+        self.assertEqual(ad.stored_image.status, 'pending')
+        self.assertEqual(images.process_pending(workers=2), (1, 0))
+
+        image = AdImage.objects.get(ad=ad)
+        self.assertEqual((image.status, image.width, image.height), ('ready', 800, 400))
+        self.assertEqual(image.widths, [160, 320, 640])
+        with images.get_storage().open(images.thumbnail_path(image.digest, 320)) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+
+    def test_small_images_are_not_upscaled(self):
+        ad = self.make_ad('http://img.test/small.png')
+        images.process_pending()
+        self.assertEqual(AdImage.objects.get(ad=ad).widths, [100])
+
+    def test_same_picture_is_stored_once(self):
+        self.make_ad('http://img.test/big.png')
+        self.make_ad('http://img.test/big.png')
+        images.process_pending()
+        digests = set(AdImage.objects.values_list('digest', flat=True))
+        self.assertEqual(len(digests), 1)
+        storage = images.get_storage()
+        digest = digests.pop()
+        _, files = storage.listdir(f'{digest[:2]}/{digest}')
+        self.assertEqual(sorted(files), ['160.jpg', '320.jpg', '640.jpg', 'original'])
+
+    def test_shared_url_is_fetched_once(self):
+        for url in ('http://img.test/big.png', 'http://img.test/small.png') * 2:
+            self.make_ad(url)
+        self.assertEqual(images.process_pending(workers=2), (4, 0))
+        self.assertEqual(sorted(LocalFetcher.calls),
+                         ['http://img.test/big.png', 'http://img.test/small.png'])
+
+    def test_failures_are_retried_then_marked(self):
+        ad = self.make_ad('http://img.test/missing.png')
+        images.process_pending(max_attempts=2)
+        self.assertEqual(AdImage.objects.get(ad=ad).status, 'pending')
+        images.process_pending(max_attempts=2)
+        image = AdImage.objects.get(ad=ad)
+        self.assertEqual((image.status, image.attempts, image.error), ('failed', 2, '404'))
+
+    def test_changing_or_clearing_url_requeues(self):
+        ad = self.make_ad('http://img.test/big.png')
+        images.process_pending()
+        ad.title = 'Другой заголовок'
+        ad.save()
+        self.assertEqual(AdImage.objects.get(ad=ad).status, 'ready')
+
+        ad.image_url = 'http://img.test/small.png'
+        ad.save()
+        self.assertEqual(AdImage.objects.get(ad=ad).status, 'pending')
+        ad.image_url = ''
+        ad.save()
+        self.assertFalse(AdImage.objects.filter(ad=ad).exists())
+
+    def test_pages_use_local_thumbnails(self):
+        ad = self.make_ad('http://img.test/big.png')
+        response = self.client.get(reverse('ad_detail', args=[ad.pk]))
+        self.assertContains(response, 'src="http://img.test/big.png"')
+
+        call_command('ingest_images', stdout=io.StringIO())
+        image = AdImage.objects.get(ad=ad)
+        response = self.client.get(reverse('ad_detail', args=[ad.pk]))
+        self.assertNotContains(response, 'img.test')
+        self.assertContains(response, f'{image.url(640)} 640w')
+        response = self.client.get(reverse('ad_list'))
+        self.assertContains(response, f'src="{image.url(160)}"')
+
+    def test_thumbnail_is_served_with_long_lived_cache(self):
+        self.make_ad('http://img.test/big.png')
+        images.process_pending()
+        url = AdImage.objects.get().url(160)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).width, 160)
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get(url.replace('160', '161')).status_code, 404)
+
+    def test_command_enqueues_existing_ads(self):
+        ad = self.make_ad('http://img.test/big.png')
+        AdImage.objects.all().delete()
+        call_command('ingest_images', '--enqueue-missing', stdout=io.StringIO())
+        self.assertEqual(AdImage.objects.get(ad=ad).status, 'ready')
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header('Location', 'http://10.0.0.1/inner.png')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpFetcherTests(SimpleTestCase):
+    def test_internal_addresses_are_refused(self):
+        fetcher = images.HttpFetcher()
+        for url in ('http://127.0.0.1/a.png', 'http://169.254.169.254/latest/meta-data',
+                    'http://localhost/a.png', 'http://[::1]/a.png', 'https://10.0.0.1/a.png'):
+            with self.subTest(url=url), mock.patch('socket.create_connection') as connect:
+                with self.assertRaisesRegex(images.ImageError, 'не публичный'):
+                    fetcher.fetch(url, 1024)
+                connect.assert_not_called()
+
+    def test_redirect_to_internal_address_is_refused(self):
+        server = HTTPServer(('127.0.0.1', 0), RedirectHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/a.png'
+        # Сам тестовый сервер считаем публичным, цель редиректа — нет.
+        with mock.patch.object(images, 'is_public', lambda address: address == '127.0.0.1'):
+            with self.assertRaisesRegex(images.ImageError, '10.0.0.1 не публичный'):
+                images.HttpFetcher().fetch(url, 1024)
@@ -0,0 +1,85 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ads.facets import get_facets
+from ads.management.commands import import_ads
+from ads.models import Ad
+
+User = get_user_model()
+
+CSV = '''title,description,category,condition,image_url
+Велосипед,"Горный,
+почти новый",Спорт,used,
+,Без заголовка,Спорт,new,
+Гитара,Акустическая,Музыка,new,https://example.com/g.jpg
+Плеер,Кассетный,Музыка,broken,
+'''
+
+
+class ImportAdsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='partner')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = Path(self.tmp.name) / name
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_ads', path, '--user', 'partner', *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_with_rejects(self):
+        rejects = Path(self.tmp.name) / 'rejects.jsonl'
+        out = self.run_import(self.write('ads.csv', CSV), '--batch-size', '2',
+                              '--rejects', str(rejects))
+        self.assertIn('добавлено: 2', out)
+        self.assertIn('отклонено: 2', out)
+        bike = Ad.objects.get(title='Велосипед')
+        self.assertEqual(bike.description, 'Горный,\nпочти новый')
+        self.assertEqual(bike.user, self.owner)
+        errors = [json.loads(line) for line in rejects.read_text().splitlines()]
+        self.assertEqual([e['line'] for e in errors], [4, 6])
+        self.assertIn('title', errors[0]['errors'])
+        self.assertIn('condition', errors[1]['errors'])
+        self.assertEqual({f['category']: f['count'] for f in get_facets()},
+                         {'Спорт': 1, 'Музыка': 1})
+
+    def test_resume_after_crash_does_not_duplicate(self):
+        rows = [{'title': f'Ad{i}', 'description': 'd', 'category': 'Cat',
+                 'condition': 'new'} for i in range(10)]
+        path = self.write('ads.jsonl', '\n'.join(json.dumps(r) for r in rows))
+        real_create = import_ads.bulk_create_ads
+        calls = []
+
+        def crash_on_third_batch(ads):
+            calls.append(len(ads))
+            if len(calls) == 3:
+                raise RuntimeError('crash')
+            return real_create(ads)
+
+        with mock.patch.object(import_ads, 'bulk_create_ads', crash_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, '--batch-size', '3')
+        self.assertEqual(Ad.objects.count(), 6)
+
+        out = self.run_import(path, '--batch-size', '3', '--resume')
+        self.assertIn('Продолжение со строки 7', out)
+        self.assertEqual(sorted(Ad.objects.values_list('title', flat=True)),
+                         sorted(r['title'] for r in rows))
+
+    def test_invalid_json_line_is_rejected(self):
+        path = self.write('ads.jsonl', '{"title": "ok", "description": "d", '
+                          '"category": "C", "condition": "new"}\n{broken\n')
+        out = self.run_import(path)
+        self.assertIn('добавлено: 1, отклонено: 1', out)
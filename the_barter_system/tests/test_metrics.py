@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+# Процесс-воркер: свой счётчик в общем каталоге, как под gunicorn.
+WORKER = '''
+from prometheus_client import Counter
+Counter('barter_proposals', 'x', ['event']).labels('accepted').inc(3)
+'''
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(ADS_CACHE_TIMEOUT=300)
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.ad = Ad.objects.create(user=self.alice, title='Велосипед', description='d',
+                                    category='Спорт', condition='used')
+
+    def test_requests_are_labelled_by_url_name(self):
+        latency = sample('barter_request_duration_seconds_count',
+                         view='ad_detail', method='GET')
+        missing = sample('barter_responses_total', view='ad_detail',
+                         method='GET', status='404')
+        queries = sample('barter_request_db_queries_count', view='ad-list')
+
+        self.client.get(reverse('ad_detail', args=[self.ad.pk]))
+        self.client.get(reverse('ad_detail', args=[self.ad.pk + 1]))
+        self.client.get('/api/ads/')
+
+        self.assertEqual(sample('barter_request_duration_seconds_count',
+                                view='ad_detail', method='GET'), latency + 2)
+        self.assertEqual(sample('barter_responses_total', view='ad_detail',
+                                method='GET', status='404'), missing + 1)
+        self.assertEqual(sample('barter_request_db_queries_count', view='ad-list'),
+                         queries + 1)
+
+    def test_page_cache_hits_and_misses(self):
+        hits = sample('barter_page_cache_total', prefix='ad_list', result='hit')
+        misses = sample('barter_page_cache_total', prefix='ad_list', result='miss')
+        self.client.get(reverse('ad_list'))
+        self.client.get(reverse('ad_list'))
+        self.assertEqual(sample('barter_page_cache_total', prefix='ad_list',
+                                result='miss'), misses + 1)
+        self.assertEqual(sample('barter_page_cache_total', prefix='ad_list',
+                                result='hit'), hits + 1)
+
+    def test_proposal_events_are_counted_after_commit(self):
+        created = sample('barter_proposals_total', event='created')
+        theirs = Ad.objects.create(user=self.bob, title='Самокат', description='d',
+                                   category='Спорт', condition='new')
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeProposal.objects.create(ad_sender=theirs, ad_receiver=self.ad)
+        self.assertEqual(sample('barter_proposals_total', event='created'), created + 1)
+
+    def test_endpoint_serves_text_format(self):
+        self.client.get(reverse('ad_list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(response, 'barter_request_duration_seconds_bucket{')
+        self.assertContains(response, 'view="ad_list"')
+
+    @override_settings(ADS_METRICS_ALLOWED_IPS=['10.0.0.0/8'], ADS_METRICS_TOKEN='secret')
+    def test_endpoint_is_restricted(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_worker_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', WORKER], env=env, check=True)
+            with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+                response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'barter_proposals_total{event="accepted"} 6.0')
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        now = timezone.now()
+        for i in range(25):
+            ad = Ad.objects.create(
+                user=self.alice, title=f'Ad{i}', description='d',
+                category='Cat', condition='new'
+            )
+            # Группы по три объявления с одинаковым created_at проверяют
+            # разрешение равенства по id.
+            Ad.objects.filter(pk=ad.pk).update(
+                created_at=now - timedelta(minutes=i // 3))
+        self.expected = list(
+            Ad.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk_api(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids, pages
+
+    def test_api_walks_forward_and_back(self):
+        ids, pages = self.walk_api('/api/ads/')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('count', pages[0])
+
+        back = self.client.get(pages[2]['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']],
+                         self.expected[10:20])
+        first = self.client.get(back['previous']).json()
+        self.assertEqual([row['id'] for row in first['results']],
+                         self.expected[:10])
+        self.assertIsNone(first['previous'])
+
+    def test_api_page_runs_no_count_query(self):
+        _, pages = self.walk_api('/api/ads/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(pages[1]['next'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_api_offset_is_opt_in(self):
+        data = self.client.get('/api/ads/?page=2').json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual([row['id'] for row in data['results']],
+                         self.expected[10:20])
+
+    def test_api_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/ads/?cursor=zzz').status_code, 404)
+
+    def test_api_proposals_are_paginated(self):
+        ad = Ad.objects.create(user=self.bob, title='B', description='d',
+                               category='Cat', condition='new')
+        for sender in Ad.objects.filter(user=self.alice)[:12]:
+            ExchangeProposal.objects.create(ad_sender=sender, ad_receiver=ad)
+        self.client.force_login(self.alice)
+        ids, pages = self.walk_api('/api/proposals/')
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len(set(ids)), 12)
+
+    def test_html_list_uses_cursor_links(self):
+        r = self.client.get(reverse('ad_list'))
+        page = r.context['page_obj']
+        self.assertTrue(page.is_keyset)
+        self.assertContains(r, '?cursor=' + page.next_cursor)
+        seen = [ad.pk for ad in r.context['ads']]
+        while page.has_next():
+            r = self.client.get(reverse('ad_list') + '?cursor=' + page.next_cursor)
+            page = r.context['page_obj']
+            seen.extend(ad.pk for ad in r.context['ads'])
+        self.assertEqual(seen, self.expected)
+
+    def test_html_list_offset_opt_in(self):
+        r = self.client.get(reverse('ad_list') + '?page=3')
+        self.assertEqual([ad.pk for ad in r.context['ads']], self.expected[20:])
@@ -0,0 +1,69 @@
+import pstats
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ads.models import Ad
+
+User = get_user_model()
+
+
+def timings(response):
+    """{'db': {'desc': ..., 'dur': ...}, ...} из заголовка Server-Timing."""
+    metrics = {}
+    for item in response['Server-Timing'].split(', '):
+        name, *params = item.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class ProfilingDisabledTests(TestCase):
+    def test_no_header_when_disabled(self):
+        response = self.client.get(reverse('ad_list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(ADS_PROFILING=True, ADS_PROFILING_SLOW_QUERY_MS=10_000,
+                   ADS_PROFILING_SAMPLE_RATE=0, ADS_CACHE_TIMEOUT=0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.ad = Ad.objects.create(user=self.user, title='Велосипед', description='d',
+                                    category='Спорт', condition='used')
+
+    def test_html_page_reports_sql_and_render(self):
+        metrics = timings(self.client.get(reverse('ad_detail', args=[self.ad.pk])))
+        self.assertEqual(metrics['db']['desc'], '"2 SQL"')
+        self.assertGreater(float(metrics['render']['dur']), 0)
+        self.assertEqual(float(metrics['serialize']['dur']), 0)
+        self.assertGreaterEqual(float(metrics['total']['dur']),
+                                float(metrics['render']['dur']))
+
+    def test_api_reports_serializer_time(self):
+        metrics = timings(self.client.get('/api/ads/'))
+        self.assertEqual(metrics['db']['desc'], '"1 SQL"')
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+
+    @override_settings(ADS_PROFILING_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_origin(self):
+        with self.assertLogs('ads.profiling', 'WARNING') as logs:
+            self.client.get(reverse('ad_detail', args=[self.ad.pk]))
+        self.assertIn('ads_ad', logs.output[0])
+        self.assertTrue(any('ads/views.py' in line for line in logs.output))
+
+    def test_sampled_requests_are_profiled_to_disk(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(ADS_PROFILING_SAMPLE_RATE=1.0, ADS_PROFILING_DIR=directory):
+            self.client.get(reverse('ad_detail', args=[self.ad.pk]))
+        dumps = list(Path(directory).glob('*-GET-ads_*.prof'))
+        self.assertEqual(len(dumps), 1)
+        self.assertGreater(pstats.Stats(str(dumps[0])).total_calls, 0)
+
+    async def test_async_views_are_profiled(self):
+        response = await self.async_client.get('/api/async/ads/')
+        self.assertEqual(timings(response)['db']['desc'], '"1 SQL"')
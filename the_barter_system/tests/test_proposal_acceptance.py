@@ -0,0 +1,107 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from ads import services
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+def make_ad(user, title):
+    return Ad.objects.create(user=user, title=title, description='d',
+                             category='Cat', condition='new')
+
+
+class ProposalAcceptanceTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.carol = User.objects.create_user(username='carol')
+        self.a = make_ad(self.alice, 'A')
+        self.b = make_ad(self.bob, 'B')
+        self.c = make_ad(self.carol, 'C')
+        self.ab = ExchangeProposal.objects.create(ad_sender=self.a, ad_receiver=self.b)
+        self.cb = ExchangeProposal.objects.create(ad_sender=self.c, ad_receiver=self.b)
+        self.ac = ExchangeProposal.objects.create(ad_sender=self.a, ad_receiver=self.c)
+
+    def test_accept_swaps_owners_and_rejects_competitors(self):
+        rejected = services.accept_proposal(self.ab.pk, self.bob)
+        self.assertEqual(rejected, 2)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.user, self.b.user), (self.bob, self.alice))
+        statuses = dict(ExchangeProposal.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {self.ab.pk: 'accepted',
+                                    self.cb.pk: 'rejected',
+                                    self.ac.pk: 'rejected'})
+
+    def test_second_accept_is_refused(self):
+        services.accept_proposal(self.ab.pk, self.bob)
+        # B теперь у Алисы, но предложение от C уже отклонено.
+        with self.assertRaises(services.AlreadyResolved):
+            services.accept_proposal(self.cb.pk, self.alice)
+        with self.assertRaises(services.AlreadyResolved):
+            services.accept_proposal(self.ab.pk, self.alice)
+
+    def test_only_receiver_can_accept(self):
+        with self.assertRaises(services.NotReceiver):
+            services.accept_proposal(self.ab.pk, self.alice)
+        with self.assertRaises(services.AlreadyResolved):
+            services.reject_proposal(self.ab.pk, self.alice)
+
+    def test_view_accept_rejects_competitors(self):
+        self.client.force_login(self.bob)
+        url = reverse('proposal_update_status', args=[self.cb.pk, 'accept'])
+        r = self.client.post(url, follow=True)
+        self.assertContains(r, "Обмен успешно выполнен")
+        self.ab.refresh_from_db()
+        self.assertEqual(self.ab.status, 'rejected')
+
+
+class ConcurrentAcceptanceTests(TransactionTestCase):
+    """Параллельные принятия предложений, делящих одно объявление."""
+
+    threads = 8
+
+    def test_only_one_competing_accept_wins(self):
+        self.assertFalse(connection.is_in_memory_db())
+        receiver = User.objects.create_user(username='receiver')
+        target = make_ad(receiver, 'Target')
+        proposals = []
+        for i in range(self.threads):
+            sender = User.objects.create_user(username=f'sender{i}')
+            proposals.append(ExchangeProposal.objects.create(
+                ad_sender=make_ad(sender, f'S{i}'), ad_receiver=target))
+
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+
+        def accept(proposal):
+            try:
+                barrier.wait()
+                services.accept_proposal(proposal.pk, receiver)
+                outcomes.append('accepted')
+            except services.ProposalError:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=accept, args=(p,)) for p in proposals]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(outcomes),
+                         ['accepted'] + ['refused'] * (self.threads - 1))
+        accepted = ExchangeProposal.objects.get(status='accepted')
+        self.assertEqual(ExchangeProposal.objects.filter(status='waiting').count(), 0)
+        target.refresh_from_db()
+        sender_ad = Ad.objects.get(pk=accepted.ad_sender_id)
+        self.assertEqual(sender_ad.user, receiver)
+        self.assertEqual(Ad.objects.filter(user=receiver).count(), 1)
+        self.assertNotEqual(target.user, receiver)
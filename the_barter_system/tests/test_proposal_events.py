@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ads import services
+from ads.events import InMemoryBroker, get_broker
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class InMemoryBrokerTests(SimpleTestCase):
+    def test_since_filters_by_user_and_id(self):
+        broker = InMemoryBroker()
+        first = broker.publish([1, 2], {'type': 'a'})
+        broker.publish([2], {'type': 'b'})
+        self.assertEqual(broker.since(1, 0), ([first], True))
+        self.assertEqual([e['type'] for e in broker.since(2, first['id'])[0]], ['b'])
+
+    def test_overflow_is_reported(self):
+        broker = InMemoryBroker(buffer_size=2)
+        for _ in range(3):
+            broker.publish([1], {'type': 'a'})
+        events, complete = broker.since(1, 0)
+        self.assertEqual(len(events), 2)
+        self.assertFalse(complete)
+        self.assertTrue(broker.since(1, events[0]['id'])[1])
+
+    def test_wait_is_woken_from_another_thread(self):
+        broker = InMemoryBroker()
+
+        async def wait():
+            threading.Timer(0.05, broker.publish, [[7], {'type': 'a'}]).start()
+            return await broker.wait(7, 0, timeout=5)
+
+        events, _ = asyncio.run(wait())
+        self.assertEqual([e['type'] for e in events], ['a'])
+
+    def test_idle_buffers_are_evicted(self):
+        broker = InMemoryBroker(idle_seconds=60)
+        with mock.patch('ads.events.time.monotonic', return_value=0):
+            broker.publish([1, 2], {'type': 'a'})
+        with mock.patch('ads.events.time.monotonic', return_value=30):
+            broker.publish([2], {'type': 'b'})
+        with mock.patch('ads.events.time.monotonic', return_value=61):
+            broker.publish([3], {'type': 'c'})
+        self.assertEqual(set(broker._events), {2, 3})
+        self.assertEqual(list(broker._published), [2, 3])
+        self.assertEqual(broker.since(1, 0), ([], True))
+
+
+@override_settings(ADS_EVENTS_STREAM_SECONDS=1, ADS_EVENTS_HEARTBEAT_SECONDS=0.1)
+class ProposalEventTests(TestCase):
+    def setUp(self):
+        get_broker.cache_clear()
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.carol = User.objects.create_user(username='carol')
+        make = lambda user: Ad.objects.create(user=user, title='t', description='d',
+                                              category='Дом', condition='new')
+        self.a, self.b, self.c = make(self.alice), make(self.bob), make(self.carol)
+
+    def propose(self, sender, receiver):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ExchangeProposal.objects.create(ad_sender=sender, ad_receiver=receiver)
+
+    def types(self, user):
+        return [e['type'] for e in get_broker().since(user.pk, 0)[0]]
+
+    def test_create_and_accept_notify_both_sides(self):
+        ab = self.propose(self.a, self.b)
+        self.propose(self.c, self.b)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.accept_proposal(ab.pk, self.bob)
+        self.assertEqual(self.types(self.alice), ['proposal.created', 'proposal.accepted'])
+        self.assertEqual(self.types(self.carol), ['proposal.created', 'proposal.rejected'])
+        self.assertEqual(self.types(self.bob), ['proposal.created', 'proposal.created',
+                                                'proposal.accepted', 'proposal.rejected'])
+
+    def test_uncommitted_change_is_not_published(self):
+        ab = self.propose(self.a, self.b)
+        services.reject_proposal(ab.pk, self.bob)  # on_commit не выполняется
+        self.assertEqual(self.types(self.alice), ['proposal.created'])
+
+    def test_long_poll(self):
+        url = reverse('proposal_events_poll')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.alice)
+        start = self.client.get(url).json()['last_event_id']
+        ab = self.propose(self.a, self.b)
+        r = self.client.get(url, {'since': start, 'timeout': 0}).json()
+        self.assertEqual([e['proposal'] for e in r['events']], [ab.pk])
+        r = self.client.get(url, {'since': r['last_event_id'], 'timeout': 0}).json()
+        self.assertEqual(r['events'], [])
+
+    async def test_sse_replays_after_last_event_id(self):
+        ab = await ExchangeProposal.objects.acreate(ad_sender=self.a, ad_receiver=self.b)
+        get_broker().publish([self.alice.pk], {'type': 'proposal.accepted',
+                                               'proposal': ab.pk})
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('proposal_events'),
+                                               headers={'Last-Event-ID': '0'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('event: proposal.accepted', body)
+        self.assertIn(': keepalive', body)
+
+    def test_stream_requires_asgi(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('proposal_events')).status_code, 400)
+        page = self.client.get(reverse('proposal_list'))
+        self.assertContains(page, reverse('proposal_events_poll'))
+        self.assertNotContains(page, 'EventSource(')
+
+    async def test_asgi_page_uses_stream(self):
+        await self.async_client.aforce_login(self.alice)
+        page = await self.async_client.get(reverse('proposal_list'))
+        self.assertContains(page, 'EventSource(')
+        with self.settings(ADS_EVENTS_SSE=False):
+            page = await self.async_client.get(reverse('proposal_list'))
+            self.assertNotContains(page, 'EventSource(')
+            response = await self.async_client.get(reverse('proposal_events'))
+            self.assertEqual(response.status_code, 400)
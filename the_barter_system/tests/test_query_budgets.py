@@ -0,0 +1,96 @@
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ads.models import Ad, ExchangeProposal
+
+from .query_budget import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.seq = count()
+        self.alice = User.objects.create_user(username='alice')
+        self.ad = self.make_ad(self.alice)
+        self.other_ad = self.make_ad()
+        self.proposal = ExchangeProposal.objects.create(
+            ad_sender=self.ad, ad_receiver=self.other_ad)
+
+    def make_ad(self, user=None):
+        n = next(self.seq)
+        user = user or User.objects.create_user(username=f'user{n}')
+        return Ad.objects.create(user=user, title=f'Ad{n}', description='d',
+                                 category=f'Cat{n % 3}', condition='new')
+
+    def grow(self, n=8):
+        def add_rows():
+            for _ in range(n):
+                sender, receiver = self.make_ad(self.alice), self.make_ad()
+                ExchangeProposal.objects.create(ad_sender=sender,
+                                                ad_receiver=receiver)
+                ExchangeProposal.objects.create(ad_sender=receiver,
+                                                ad_receiver=sender)
+        return add_rows
+
+    def get(self, url):
+        return lambda: self.client.get(url)
+
+    def test_ad_list(self):
+        self.assertConstantQueries(self.get(reverse('ad_list')), self.grow())
+        self.assertQueryBudget(2, self.get(reverse('ad_list')))
+
+    def test_ad_api_list(self):
+        self.assertConstantQueries(self.get('/api/ads/'), self.grow())
+        self.assertQueryBudget(1, self.get('/api/ads/'))
+
+    def test_ad_detail(self):
+        # Объявление и список похожих.
+        self.assertQueryBudget(2, self.get(reverse('ad_detail', args=[self.ad.pk])))
+        self.assertQueryBudget(1, self.get(f'/api/ads/{self.ad.pk}/'))
+
+    def test_owner_views(self):
+        self.client.force_login(self.alice)
+        # Сессия и пользователь + одно чтение объявления.
+        self.assertQueryBudget(
+            3, self.get(reverse('ad_update', args=[self.ad.pk])))
+        self.assertQueryBudget(
+            3, self.get(reverse('ad_delete', args=[self.ad.pk])))
+
+    def test_proposal_list(self):
+        self.client.force_login(self.alice)
+        for view_type in ('all', 'sent', 'received'):
+            with self.subTest(type=view_type):
+                url = reverse('proposal_list') + f'?type={view_type}'
+                self.assertConstantQueries(self.get(url), self.grow(3))
+
+    def test_proposal_api(self):
+        self.client.force_login(self.alice)
+        self.assertConstantQueries(self.get('/api/proposals/'), self.grow())
+        self.assertQueryBudget(
+            3, self.get(f'/api/proposals/{self.proposal.pk}/'))
+
+    def test_proposal_detail(self):
+        self.client.force_login(self.alice)
+        self.assertQueryBudget(
+            3, self.get(reverse('proposal_detail', args=[self.proposal.pk])))
+
+    def test_proposal_form(self):
+        self.client.force_login(self.alice)
+        url = reverse('proposal_create', args=[self.other_ad.pk])
+        self.assertConstantQueries(self.get(url), self.grow())
+        # Сессия, пользователь, целевое объявление, выбор ad_sender,
+        # проверка FK в full_clean, INSERT и UPDATE счётчиков объявлений.
+        self.assertQueryBudget(
+            7, lambda: self.client.post(url, {'ad_sender': self.ad.pk}))
+
+    def test_proposal_api_create(self):
+        self.client.force_login(self.alice)
+        payload = {'ad_sender': self.ad.pk, 'ad_receiver': self.other_ad.pk}
+        # INSERT и UPDATE счётчиков обоих объявлений.
+        response = self.assertQueryBudget(
+            6, lambda: self.client.post('/api/proposals/', payload))
+        self.assertEqual(response.status_code, 201)
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from ads.models import Ad, ExchangeProposal
+from ads.pagination import KeysetPaginator
+from ads.views import (
+    AdListView, AdViewSet, ExchangeProposalViewSet, ProposalListView
+)
+
+from .query_plans import TEMP_SORT, QueryPlanAssertionsMixin
+
+User = get_user_model()
+
+
+class QueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """Запросы, которые строят представления, должны идти по индексам."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.ad1 = Ad.objects.create(user=self.alice, title='A1', description='d',
+                                     category='Cat1', condition='new')
+        self.ad2 = Ad.objects.create(user=self.bob, title='B1', description='d',
+                                     category='Cat2', condition='used')
+        ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=self.ad2)
+
+    def html_queryset(self, view_class, params, user=None):
+        request = RequestFactory().get('/', params)
+        request.user = user or AnonymousUser()
+        view = view_class()
+        view.setup(request)
+        return view.get_queryset()
+
+    def api_queryset(self, viewset_class, params, user=None):
+        request = APIRequestFactory().get('/', params)
+        request.user = user or AnonymousUser()
+        view = viewset_class(action='list', action_map={'get': 'list'},
+                             kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        view.request.user = request.user
+        return view.filter_queryset(view.get_queryset())
+
+    def pages(self, queryset):
+        """Первая страница и страница по курсору — так их читает пагинатор."""
+        paginator = KeysetPaginator(queryset, 10)
+        position = queryset.model(id=10 ** 9, created_at=timezone.now())
+        return [
+            paginator.page_queryset()[0],
+            paginator.page_queryset(paginator.encode_cursor(position))[0],
+            paginator.page_queryset(
+                paginator.encode_cursor(position, reverse=True))[0],
+        ]
+
+    def test_ad_list_filters(self):
+        for params in ({}, {'category': 'Cat1'}, {'condition': 'new'},
+                       {'category': 'Cat1', 'condition': 'new'}):
+            with self.subTest(params=params):
+                for qs in self.pages(self.html_queryset(AdListView, params)):
+                    self.assertIndexedPlan(qs)
+
+    def test_ad_list_search(self):
+        qs = self.html_queryset(AdListView, {'q': 'A1', 'category': 'Cat1'})
+        # Сортировка по релевантности идёт по найденным строкам, а не по
+        # всей таблице; отдельного индекса для неё не бывает.
+        self.assertIndexedPlan(qs[:10], allow=[TEMP_SORT])
+
+    def test_ad_api_filters(self):
+        for params in ({}, {'category': 'Cat1'}, {'condition': 'used'},
+                       {'user': self.alice.pk},
+                       {'category': 'Cat1', 'condition': 'new'}):
+            with self.subTest(params=params):
+                for qs in self.pages(self.api_queryset(AdViewSet, params)):
+                    self.assertIndexedPlan(qs)
+
+    def test_proposal_api_filters(self):
+        for params in ({}, {'status': 'waiting'}, {'ad_sender': self.ad1.pk},
+                       {'ad_receiver': self.ad2.pk},
+                       {'ad_sender': self.ad1.pk, 'status': 'waiting'}):
+            with self.subTest(params=params):
+                qs = self.api_queryset(ExchangeProposalViewSet, params, self.alice)
+                for page in self.pages(qs):
+                    self.assertIndexedPlan(page)
+
+    def test_proposal_list_view(self):
+        # Списки «мои предложения» фильтруются по владельцу объявления через
+        # JOIN, поэтому сортировка идёт по предложениям одного пользователя:
+        # временное B-дерево здесь ограничено его данными, но полного скана
+        # быть не должно.
+        for params in ({'type': 'all'}, {'type': 'sent'}, {'type': 'received'},
+                       {'type': 'all', 'status': 'waiting'},
+                       {'type': 'sent', 'receiver': 'bob'}):
+            with self.subTest(params=params):
+                qs = self.html_queryset(ProposalListView, params, self.alice)
+                for page in self.pages(qs):
+                    self.assertIndexedPlan(page, allow=[TEMP_SORT])
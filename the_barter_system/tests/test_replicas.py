@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ads.models import Ad
+from ads.replicas import STICKY_COOKIE, ReplicaRouter, RequestState, _state
+
+User = get_user_model()
+
+
+@override_settings(ADS_READ_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def in_request(self, fn):
+        state = RequestState()
+        state.use_replica = True
+        token = _state.set(state)
+        try:
+            return fn(state)
+        finally:
+            _state.reset(token)
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Ad))
+
+    def test_safe_request_reads_from_replica(self):
+        self.assertEqual(self.in_request(lambda s: self.router.db_for_read(Ad)), 'replica')
+        self.assertIsNone(self.in_request(lambda s: self.router.db_for_read(User)))
+
+    def test_write_returns_request_to_primary(self):
+        def write_then_read(state):
+            self.assertEqual(self.router.db_for_write(Ad), 'default')
+            self.assertTrue(state.wrote)
+            return self.router.db_for_read(Ad)
+        self.assertIsNone(self.in_request(write_then_read))
+
+
+@override_settings(ADS_READ_REPLICAS=['replica'])
+class ReplicaIntegrationTests(TransactionTestCase):
+    """
+    Основная база и «реплика» — два разных файла SQLite без репликации.
+    Реплика подключается в setUpClass, поэтому в databases она попадает
+    там же: тест-раннер не должен создавать для неё тестовую базу.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        primary = connections.settings['default']
+        replica = connections.configure_settings({
+            'default': primary,
+            'replica': {
+                'ENGINE': primary['ENGINE'],
+                'NAME': str(Path(cls.replica_dir) / 'replica.sqlite3'),
+                'OPTIONS': primary['OPTIONS'],
+            },
+        })['replica']
+        connections.settings['replica'] = replica
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.ad = Ad.objects.create(user=self.alice, title='Свежая', description='d',
+                                    category='Дом', condition='new')
+        # Отставшая реплика: та же строка со старым заголовком.
+        User.objects.using('replica').create(pk=self.alice.pk, username='alice')
+        Ad.objects.using('replica').create(pk=self.ad.pk, user_id=self.alice.pk,
+                                           title='Устаревшая', description='d',
+                                           category='Дом', condition='new')
+        self.client.force_login(self.alice)
+
+    def title(self):
+        return self.client.get(f'/api/ads/{self.ad.pk}/').json()['title']
+
+    def test_api_reads_stick_to_primary_after_write(self):
+        self.assertEqual(self.title(), 'Устаревшая')
+
+        r = self.client.post('/api/ads/', {'title': 'Новая', 'description': 'd',
+                                           'category': 'Дом', 'condition': 'new'})
+        self.assertEqual(r.status_code, 201)
+        self.assertIn(STICKY_COOKIE, r.cookies)
+        self.assertEqual(self.title(), 'Свежая')
+
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertEqual(self.title(), 'Устаревшая')
+
+    def test_html_list_reads_from_replica(self):
+        response = self.client.get(reverse('ad_list'))
+        self.assertContains(response, 'Устаревшая')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
@@ -0,0 +1,90 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ads import services
+from ads.cache import GLOBAL, _version_key, get_cache
+from ads.models import Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        self.lamp = Ad.objects.create(user=self.alice, title='Лампа', description='d',
+                                      category='Дом', condition='new')
+        self.guitar = Ad.objects.create(user=self.bob, title='Гитара', description='d',
+                                        category='Музыка', condition='used')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, len(ctx.captured_queries)
+
+    def test_anonymous_list_is_served_from_cache(self):
+        url = reverse('ad_list') + '?category=&q='
+        first, _ = self.get(url)
+        second, queries = self.get(reverse('ad_list'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.content, first.content)
+
+        self.lamp.title = 'Торшер'
+        self.lamp.save()
+        third, queries = self.get(url)
+        self.assertGreater(queries, 0)
+        self.assertContains(third, 'Торшер')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_login(self.alice)
+        self.get('/api/ads/')
+        _, queries = self.get('/api/ads/')
+        self.assertGreater(queries, 0)
+
+    def test_api_list_uses_category_version(self):
+        url = '/api/ads/?category=Дом'
+        self.get(url)
+        self.guitar.title = 'Укулеле'
+        self.guitar.save()
+        _, queries = self.get(url)
+        self.assertEqual(queries, 0)
+
+        self.lamp.condition = 'used'
+        self.lamp.save()
+        response, queries = self.get(url)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.json()['results'][0]['condition'], 'used')
+
+    def test_ownership_swap_invalidates_detail(self):
+        url = reverse('ad_detail', kwargs={'pk': self.lamp.pk})
+        self.assertContains(self.get(url)[0], 'alice')
+        proposal = ExchangeProposal.objects.create(ad_sender=self.guitar,
+                                                   ad_receiver=self.lamp)
+        services.accept_proposal(proposal.pk, self.alice)
+        self.assertContains(self.get(url)[0], 'bob')
+
+    def test_evicted_version_does_not_revive_old_pages(self):
+        self.get('/api/ads/')
+        get_cache().delete(_version_key(GLOBAL))
+        _, queries = self.get('/api/ads/')
+        self.assertGreater(queries, 0)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }
+        }):
+            url = reverse('ad_detail', kwargs={'pk': self.guitar.pk})
+            self.get(url)
+            self.assertEqual(self.get(url)[1], 0)
+            self.guitar.title = 'Укулеле'
+            self.guitar.save()
+            self.assertContains(self.get(url)[0], 'Укулеле')
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ads.models import Ad
+from ads.search import IContainsBackend, get_search_backend, search_ads
+
+User = get_user_model()
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bike = Ad.objects.create(
+            user=self.alice, title='Горный велосипед', description='Почти новый',
+            category='Спорт', condition='used'
+        )
+        self.lamp = Ad.objects.create(
+            user=self.alice, title='Лампа', description='Подойдёт к велосипеду',
+            category='Дом', condition='new'
+        )
+        self.sofa = Ad.objects.create(
+            user=self.alice, title='Диван', description='Раскладной',
+            category='Дом', condition='used'
+        )
+
+    def search(self, query):
+        return list(search_ads(Ad.objects.all(), query))
+
+    def test_title_match_ranks_above_description_match(self):
+        self.assertEqual(self.search('велосипед'), [self.bike, self.lamp])
+
+    def test_prefix_and_case_insensitive(self):
+        self.assertEqual(self.search('ДИВ'), [self.sofa])
+
+    def test_index_follows_save_and_delete(self):
+        self.sofa.title = 'Кресло'
+        self.sofa.save()
+        self.assertEqual(self.search('диван'), [])
+        self.assertEqual(self.search('кресло'), [self.sofa])
+        self.sofa.delete()
+        self.assertEqual(self.search('кресло'), [])
+
+    def test_rebuild_restores_index(self):
+        backend = get_search_backend()
+        backend.remove([self.bike.pk, self.lamp.pk, self.sofa.pk])
+        self.assertEqual(self.search('лампа'), [])
+        backend.rebuild()
+        self.assertEqual(self.search('лампа'), [self.lamp])
+
+    @override_settings(ADS_SEARCH_BACKEND='ads.search.IContainsBackend')
+    def test_backend_from_settings(self):
+        self.assertIsInstance(get_search_backend(), IContainsBackend)
+        self.assertEqual(self.search('Раскладной'), [self.sofa])
+
+    def test_html_and_api_use_backend(self):
+        r = self.client.get(reverse('ad_list') + '?q=велосипед')
+        self.assertEqual(list(r.context['ads']), [self.bike, self.lamp])
+        r2 = self.client.get('/api/ads/?search=велосипед')
+        ids = [row['id'] for row in r2.json()['results']]
+        self.assertEqual(ids, [self.bike.pk, self.lamp.pk])
@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ads import services, similarity
+from ads.models import Ad, SimilarAd, SimilarityBuild
+
+User = get_user_model()
+
+
+class VectorizeTests(SimpleTestCase):
+    def test_rows_are_normalized_and_ranked_by_shared_terms(self):
+        ids, matrix = similarity.vectorize([
+            (1, 'Горный велосипед', 'алюминиевая рама', 'Спорт'),
+            (2, 'Велосипед детский', 'рама стальная', 'Спорт'),
+            (3, 'Диван', 'раскладной', 'Мебель'),
+        ])
+        self.assertEqual(ids.tolist(), [1, 2, 3])
+        scores = (matrix @ matrix.T).toarray()
+        self.assertAlmostEqual(float(scores[0, 0]), 1.0, places=5)
+        self.assertGreater(scores[0, 1], 0.2)
+        self.assertEqual(scores[0, 2], 0)
+
+    def test_top_neighbours_excludes_self_and_weak_matches(self):
+        ids, matrix = similarity.vectorize([
+            (1, 'велосипед', 'рама', 'Спорт'),
+            (2, 'велосипед', 'рама', 'Спорт'),
+            (3, 'велосипед', 'диван', 'Мебель'),
+            (4, 'кресло', 'диван', 'Мебель'),
+        ])
+        rows = range(4)
+        lists = list(similarity.top_neighbours(matrix @ matrix.T, rows, 2, 0.05))
+        cols, vals = lists[0]
+        self.assertEqual(cols.tolist(), [1, 2])
+        self.assertGreater(vals[0], vals[1])
+        self.assertNotIn(0, lists[3][0].tolist())
+
+
+@override_settings(ADS_SIMILAR_COUNT=2)
+class SimilarAdsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.bike = self.make_ad('Горный велосипед', 'рама алюминий', 'Спорт')
+        self.kids_bike = self.make_ad('Детский велосипед', 'рама сталь', 'Спорт')
+        self.sofa = self.make_ad('Диван', 'раскладной угловой', 'Мебель')
+        self.chair = self.make_ad('Кресло', 'угловой раскладной', 'Мебель')
+
+    def make_ad(self, title, description, category):
+        return Ad.objects.create(user=self.user, title=title, description=description,
+                                 category=category, condition='used')
+
+    def neighbours(self, ad):
+        return list(SimilarAd.objects.filter(ad=ad).order_by('rank')
+                    .values_list('similar_id', flat=True))
+
+    def test_full_build(self):
+        record = similarity.build()
+        self.assertTrue(record.full)
+        self.assertEqual(self.neighbours(self.bike), [self.kids_bike.pk])
+        self.assertEqual(self.neighbours(self.sofa), [self.chair.pk])
+
+    def test_refresh_indexes_new_and_edited_ads(self):
+        similarity.build()
+        new_bike = self.make_ad('Велосипед горный', 'рама алюминий', 'Спорт')
+        record = similarity.refresh()
+        self.assertFalse(record.full)
+        self.assertEqual(self.neighbours(new_bike)[0], self.bike.pk)
+        self.assertEqual(self.neighbours(self.bike)[0], new_bike.pk)
+
+        self.chair.title, self.chair.description = 'Самокат', 'колёса'
+        self.chair.category = 'Спорт'
+        self.chair.save()
+        similarity.refresh()
+        self.assertNotIn(self.chair.pk, self.neighbours(self.sofa))
+        self.assertNotIn(self.sofa.pk, self.neighbours(self.chair))
+        self.assertEqual(SimilarityBuild.objects.count(), 3)
+
+    def test_refresh_without_changes_keeps_lists(self):
+        similarity.build()
+        before = list(SimilarAd.objects.values_list('ad', 'similar', 'rank'))
+        self.assertEqual(similarity.refresh().updated, 0)
+        self.assertEqual(list(SimilarAd.objects.values_list('ad', 'similar', 'rank')),
+                         before)
+
+    @override_settings(ADS_SIMILAR_COUNT=1)
+    def test_soft_deleted_ad_leaves_lists(self):
+        similarity.build()
+        # Последний id: его строка в списках раньше выходила за векторы.
+        services.delete_ads([self.chair])
+        self.assertFalse(SimilarAd.objects.filter(similar=self.chair).exists())
+        self.assertEqual(self.neighbours(self.chair), [])
+
+        self.bike.title = 'Горный велосипед новый'
+        self.bike.save()
+        similarity.refresh()
+        self.assertEqual(self.neighbours(self.bike), [self.kids_bike.pk])
+        self.assertNotIn(self.chair.pk, SimilarAd.objects.values_list('similar', flat=True))
+
+    @override_settings(ADS_SIMILAR_COUNT=1)
+    def test_refresh_skips_lists_of_hidden_ads(self):
+        similarity.build()
+        # Скрыто в обход delete_ads: строки SimilarAd остались.
+        Ad.objects.filter(pk=self.chair.pk).update(deleted_at=timezone.now())
+        self.bike.title = 'Горный велосипед новый'
+        self.bike.save()
+        similarity.refresh()
+        self.assertEqual(self.neighbours(self.bike), [self.kids_bike.pk])
+        self.assertEqual(self.neighbours(self.sofa), [self.chair.pk])
+
+    def test_save_without_listed_changes_skips_neighbour_lookup(self):
+        similarity.build()
+        ad = Ad.objects.get(pk=self.bike.pk)
+        ad.description = 'рама карбон'
+        with CaptureQueriesContext(connection) as queries:
+            ad.save()
+        self.assertFalse(any('ads_similarad' in q['sql'] for q in queries.captured_queries))
+        ad.title = 'Горный велосипед новый'
+        with CaptureQueriesContext(connection) as queries:
+            ad.save()
+        self.assertTrue(any('ads_similarad' in q['sql'] for q in queries.captured_queries))
+
+    def test_command(self):
+        call_command('build_similar_ads', '--full', stdout=open('/dev/null', 'w'))
+        self.assertTrue(SimilarAd.objects.exists())
+
+    def test_detail_page_and_api(self):
+        similarity.build()
+        response = self.client.get(reverse('ad_detail', args=[self.bike.pk]))
+        self.assertContains(response, 'Детский велосипед')
+        self.assertNotContains(response, 'Диван')
+
+        data = self.client.get(f'/api/ads/{self.bike.pk}/similar/').json()
+        self.assertEqual([row['ad']['id'] for row in data], [self.kids_bike.pk])
+        self.assertEqual(data[0]['ad']['user'], 'alice')
+        self.assertEqual(self.client.get('/api/ads/999999/similar/').status_code, 404)
+
+    def test_cached_page_follows_neighbour_changes(self):
+        similarity.build()
+        url = reverse('ad_detail', args=[self.bike.pk])
+        self.assertContains(self.client.get(url), 'Детский велосипед')
+
+        self.kids_bike.title = 'Велосипед для детей'
+        self.kids_bike.save()
+        self.assertContains(self.client.get(url), 'Велосипед для детей')
+
+        services.delete_ads([self.kids_bike])
+        self.assertNotContains(self.client.get(url), 'Велосипед для детей')
+
+    def test_rebuild_changes_etag(self):
+        url = reverse('ad_detail', args=[self.bike.pk])
+        etag = self.client.get(url).headers['ETag']
+        similarity.build()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Детский велосипед')
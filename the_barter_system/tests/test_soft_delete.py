@@ -0,0 +1,77 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ads import purge
+from ads.models import Ad, AdPurge, CategoryFacet, ExchangeProposal
+
+from .factories import make_ad
+
+User = get_user_model()
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.bike = make_ad(self.alice, 'Велосипед')
+        self.offers = [make_ad(self.bob, f'Самокат {n}') for n in range(5)]
+        self.proposals = [ExchangeProposal.objects.create(ad_sender=ad, ad_receiver=self.bike)
+                          for ad in self.offers]
+
+    def facet_count(self):
+        return CategoryFacet.objects.get(category='Спорт', condition='used').count
+
+    def test_delete_view_hides_ad_and_its_proposals(self):
+        self.client.login(username='alice', password='pass')
+        response = self.client.post(reverse('ad_delete', args=[self.bike.pk]))
+        self.assertRedirects(response, reverse('ad_list'))
+
+        self.assertTrue(Ad.all_objects.filter(pk=self.bike.pk).exists())
+        self.assertFalse(Ad.objects.filter(pk=self.bike.pk).exists())
+        self.assertEqual(self.client.get(reverse('ad_detail', args=[self.bike.pk])).status_code, 404)
+        self.assertNotContains(self.client.get(reverse('ad_list')), 'Велосипед')
+        self.assertEqual(self.client.get('/api/proposals/').json()['results'], [])
+        self.assertEqual(ExchangeProposal.all_objects.count(), 5)
+        self.assertEqual(self.facet_count(), 5)
+        self.assertEqual(AdPurge.objects.get().proposals_total, None)
+
+    def test_api_destroy_is_soft(self):
+        self.client.login(username='alice', password='pass')
+        self.assertEqual(self.client.delete(f'/api/ads/{self.bike.pk}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/ads/{self.bike.pk}/').status_code, 404)
+        self.assertTrue(AdPurge.objects.filter(ad_id=self.bike.pk).exists())
+
+    def test_purge_removes_rows_in_batches(self):
+        self.client.login(username='alice', password='pass')
+        self.client.post(reverse('ad_delete', args=[self.bike.pk]))
+        self.assertEqual(purge.process_pending(batch_size=2), 1)
+
+        self.assertFalse(Ad.all_objects.filter(pk=self.bike.pk).exists())
+        self.assertEqual(ExchangeProposal.all_objects.count(), 0)
+        row = AdPurge.objects.get()
+        self.assertEqual((row.proposals_total, row.proposals_deleted), (5, 5))
+        self.assertIsNotNone(row.finished_at)
+        # Фасет уменьшен один раз — при мягком удалении.
+        self.assertEqual(self.facet_count(), 5)
+        self.assertEqual(purge.process_pending(), 0)
+
+    def test_interrupted_purge_resumes(self):
+        self.client.login(username='alice', password='pass')
+        self.client.post(reverse('ad_delete', args=[self.bike.pk]))
+        with mock.patch.object(purge.time, 'sleep', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                purge.process_pending(batch_size=2, pause=1)
+        self.assertEqual(AdPurge.objects.get().proposals_deleted, 2)
+        self.assertEqual(ExchangeProposal.all_objects.count(), 3)
+
+        out = io.StringIO()
+        call_command('purge_ads', '--status', stdout=out)
+        self.assertIn(f'объявление {self.bike.pk}: предложений удалено 2 из 5', out.getvalue())
+        call_command('purge_ads', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(ExchangeProposal.all_objects.count(), 0)
+        self.assertFalse(Ad.all_objects.filter(pk=self.bike.pk).exists())
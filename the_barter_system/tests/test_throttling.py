@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ads import throttling
+from ads.models import Ad
+
+User = get_user_model()
+
+
+@override_settings(ADS_THROTTLE_RATES={'search': '2/min', 'proposal_create': '1/min',
+                                       'write': '3/min'})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttling.get_cache().clear()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.ad1 = Ad.objects.create(user=self.alice, title='Велосипед', description='d',
+                                     category='Спорт', condition='used')
+        self.ad2 = Ad.objects.create(user=self.bob, title='Самокат', description='d',
+                                     category='Спорт', condition='new')
+
+    def search(self, query):
+        return self.client.get(reverse('ad_list'), {'q': query})
+
+    def test_search_is_limited_across_html_and_api(self):
+        self.assertEqual(self.search('велосипед').status_code, 200)
+        self.assertEqual(self.client.get('/api/ads/', {'search': 'самокат'}).status_code, 200)
+
+        response = self.search('мяч')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        response = self.client.get('/api/ads/', {'search': 'мяч'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # Без поиска лимит не действует.
+        self.assertEqual(self.client.get(reverse('ad_list')).status_code, 200)
+
+    def test_async_search_shares_the_limit(self):
+        self.assertEqual(self.search('велосипед').status_code, 200)
+        url = reverse('async_ad_list')
+        self.assertEqual(self.client.get(url, {'q': 'самокат'}).status_code, 200)
+        self.assertEqual(self.client.get(url, {'q': 'мяч'}).status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_forwarded_for_does_not_open_new_buckets(self):
+        for n in range(2):
+            self.client.get(reverse('ad_list'), {'q': f'a{n}'},
+                            HTTP_X_FORWARDED_FOR=f'10.0.0.{n}')
+        response = self.client.get(reverse('ad_list'), {'q': 'b'},
+                                   HTTP_X_FORWARDED_FOR='10.0.0.99')
+        self.assertEqual(response.status_code, 429)
+
+    def test_bucket_refills_and_rejections_are_free(self):
+        now = throttling.time.time_ns()
+        with mock.patch.object(throttling.time, 'time_ns', return_value=now):
+            self.search('a'), self.search('b')
+            for _ in range(5):
+                self.assertEqual(self.search('c').status_code, 429)
+        # Через интервал — ровно один маркер, отказы его не съели.
+        later = now + 30 * 10 ** 9
+        with mock.patch.object(throttling.time, 'time_ns', return_value=later):
+            self.assertEqual(self.search('d').status_code, 200)
+            self.assertEqual(self.search('e').status_code, 429)
+
+    def test_users_have_separate_buckets(self):
+        self.client.login(username='alice', password='pass')
+        self.search('a'), self.search('b')
+        self.assertEqual(self.search('c').status_code, 429)
+        self.client.login(username='bob', password='pass')
+        self.assertEqual(self.search('c').status_code, 200)
+
+    def test_proposal_creation_is_limited_in_both_views(self):
+        self.client.login(username='alice', password='pass')
+        response = self.client.post('/api/proposals/', {
+            'ad_sender': self.ad1.pk, 'ad_receiver': self.ad2.pk, 'comment': 'x'})
+        self.assertEqual(response.status_code, 201)
+        url = reverse('proposal_create', kwargs={'pk': self.ad2.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {'ad_sender': self.ad1.pk, 'comment': 'y'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_api_writes_share_a_bucket(self):
+        self.client.login(username='alice', password='pass')
+        url = f'/api/ads/{self.ad1.pk}/'
+        for _ in range(3):
+            response = self.client.patch(url, {'title': 'Новый'},
+                                         content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.patch(url, {'title': 'Новый'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so Server-Timing covers the whole chain; removes itself from the
+    # chain unless ADS_PROFILING is on.
+    'ads.profiling.ProfilingMiddleware',
+    'ads.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ads.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'the_barter_system.urls'
@@ -84,9 +90,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Write lock at BEGIN: concurrent transactions queue up instead
+            # of failing to upgrade a read snapshot mid-transaction.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # File-backed so concurrency tests can open several connections.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Read replicas: comma-separated SQLite paths in DATABASE_REPLICAS become
+# aliases replica_1..N. Under test they mirror the default test database.
+DATABASE_REPLICAS = [
+    path for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path
+]
+for number, path in enumerate(DATABASE_REPLICAS, 1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+ADS_READ_REPLICAS = [f'replica_{n}' for n in range(1, len(DATABASE_REPLICAS) + 1)]
+# After a write, the user's reads stay on the primary for this many seconds.
+ADS_PRIMARY_STICKY_SECONDS = 10
+DATABASE_ROUTERS = ['ads.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,7 +156,130 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# "ads_images" holds fetched ad pictures and their thumbnails; point it at an
+# object storage backend (e.g. django-storages S3) in production.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'ads_images': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': MEDIA_ROOT / 'ads'},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Any backend with add/incr works for the versioned page cache in
+# ads.cache: locmem, FileBasedCache, RedisCache, memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'barter',
+    }
+}
+ADS_CACHE_ALIAS = 'default'
+# Proposal counters only bump the ads' own pages, so cached list pages
+# may show stale counters for up to this many seconds.
+ADS_CACHE_TIMEOUT = 300
+
+# Full-text search backend for ads (dotted path). None picks one by DB vendor:
+# SQLite FTS5, PostgreSQL tsvector, icontains fallback for anything else.
+ADS_SEARCH_BACKEND = None
+
+# Pub/sub for proposal events (dotted path). The default in-memory broker
+# only reaches clients of the same process.
+ADS_EVENT_BROKER = 'ads.events.InMemoryBroker'
+# The proposals page streams events over SSE only under ASGI; under WSGI,
+# or with ADS_EVENTS_SSE = False, it long-polls and /proposals/events/
+# answers 400.
+ADS_EVENTS_SSE = True
+ADS_EVENTS_STREAM_SECONDS = 300
+ADS_EVENTS_HEARTBEAT_SECONDS = 15
+ADS_EVENTS_POLL_SECONDS = 25
+# The in-memory broker forgets a user's buffered events after this long
+# without new ones; keep it well above the clients' reconnect gap.
+ADS_EVENTS_BUFFER_SECONDS = 3600
+
+# Barter cycles: longest chain (in ads) and the node budget of one search.
+ADS_CYCLE_MAX_LENGTH = 5
+ADS_CYCLE_SEARCH_BUDGET = 50000
+
+# Similar ads (TF-IDF, see ads.similarity): neighbours kept per ad, the
+# lowest cosine similarity worth showing, and the document frequency above
+# which a term is ignored.
+ADS_SIMILAR_COUNT = 10
+ADS_SIMILAR_MIN_SCORE = 0.05
+ADS_SIMILAR_MAX_DF = 0.5
+
+# Ad images (see ads.images): the fetcher is a dotted path so tests can swap
+# in a local stand-in; thumbnails are generated for these widths (never
+# upscaled) by `manage.py ingest_images`.
+ADS_IMAGE_FETCHER = 'ads.images.HttpFetcher'
+ADS_IMAGE_SIZES = (160, 320, 640, 1280)
+ADS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+ADS_IMAGE_MAX_PIXELS = 40_000_000
+ADS_IMAGE_QUALITY = 82
+
+# Per-request profiling (ads.profiling.ProfilingMiddleware): Server-Timing
+# header, queries slower than the threshold logged to "ads.profiling" with
+# their origin, and cProfile dumps for a sampled fraction of requests.
+ADS_PROFILING = os.environ.get('ADS_PROFILING') == '1'
+ADS_PROFILING_SLOW_QUERY_MS = 100
+ADS_PROFILING_SAMPLE_RATE = float(os.environ.get('ADS_PROFILING_SAMPLE_RATE', '0'))
+ADS_PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Prometheus metrics (ads.metrics), scraped from /metrics: latency, status
+# and SQL-count histograms per URL name, page cache hits and proposal events.
+# With several worker processes export PROMETHEUS_MULTIPROC_DIR (an empty
+# directory, cleared on deploy) before they start, so /metrics sums the
+# values of all workers; under gunicorn also call
+# prometheus_client.multiprocess.mark_process_dead(worker.pid) in child_exit.
+ADS_METRICS = True
+# /metrics answers 403 unless the client address (REMOTE_ADDR) is in
+# ADS_METRICS_ALLOWED_IPS (addresses or networks) or the request carries
+# "Authorization: Bearer <ADS_METRICS_TOKEN>".
+ADS_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+ADS_METRICS_TOKEN = os.environ.get('ADS_METRICS_TOKEN')
+
+# Request limits (ads.throttling), "count/period" with s/min/hour/day periods;
+# a scope without a rate is not limited. Each signed-in user, or each client
+# IP for anonymous requests, gets a bucket of `count` requests refilled
+# evenly over the period. Buckets are kept in ADS_THROTTLE_CACHE_ALIAS
+# (default: ADS_CACHE_ALIAS) and rely on its atomic incr, so for limits to
+# hold across processes it must be a shared cache such as Redis or Memcached.
+ADS_THROTTLE_RATES = {
+    'search': '60/min',           # ?q= on the ad list, ?search= in the API
+    'proposal_create': '10/min',  # new exchange proposals, HTML and API
+    'write': '120/min',           # any unsafe method on the API viewsets
+}
+ADS_THROTTLE_CACHE_ALIAS = None
+
+REST_FRAMEWORK = {
+    # Anonymous buckets are keyed on the client IP. With 0 the address is
+    # always REMOTE_ADDR; behind N trusted reverse proxies set N, so the
+    # N-th address from the right of X-Forwarded-For is used instead.
+    # Leaving it unset would trust any client-supplied X-Forwarded-For.
+    'NUM_PROXIES': 0,
+}
+
+# Archival (manage.py archive): accepted/rejected proposals resolved longer
+# ago than this, and ads with no edits and no proposals for this long, are
+# moved to the archive tables in transactions of ADS_ARCHIVE_BATCH_SIZE rows.
+ADS_ARCHIVE_PROPOSALS_AFTER_DAYS = 90
+ADS_ARCHIVE_ADS_AFTER_DAYS = 365
+ADS_ARCHIVE_BATCH_SIZE = 1000
+
+# Deleting an ad only hides it; manage.py purge_ads (run it from cron or a
+# loop) then deletes its proposals in transactions of ADS_PURGE_BATCH_SIZE
+# rows, sleeping ADS_PURGE_PAUSE_SECONDS between them, and finally the ad.
+ADS_PURGE_BATCH_SIZE = 1000
+ADS_PURGE_PAUSE_SECONDS = 0